@@ -0,0 +1,121 @@
+"""
+JWT authentication with an in-process user cache.
+
+simplejwt's ``JWTAuthentication`` loads the full ``User`` document on every
+authenticated request. ``CachedJWTAuthentication`` keeps a small snapshot of
+each user (the fields auth checks, permission checks and ``UserSerializer``
+read) for ``JWT_USER_CACHE_TTL`` seconds and rebuilds ``request.user`` from
+it without touching MongoDB.
+
+The rebuilt user is a regular ``User`` instance with every other field
+deferred: reading one of them loads it on demand, and ``save()`` only writes
+the fields that were loaded or assigned, so a snapshot can't overwrite newer
+data. Entries are dropped when a user is saved or deleted in this process;
+other processes see the change within the TTL.
+"""
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from utils import prometheus
+
+User = get_user_model()
+
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role',
+    'is_active', 'is_staff', 'is_superuser', 'is_email_verified',
+)
+
+# Upper bound on cached users per process
+MAX_CACHED_USERS = 10000
+
+
+class UserSnapshotCache:
+    """Per-process ``{user_id: (expires_at, values)}`` map with a TTL"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, user_id, values):
+        with self._lock:
+            if len(self._entries) >= MAX_CACHED_USERS:
+                # Cheaper than LRU bookkeeping on every hit; the TTL is short anyway
+                self._entries.clear()
+            self._entries[user_id] = (time.monotonic() + self.ttl, values)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+
+user_cache = UserSnapshotCache(ttl=settings.JWT_USER_CACHE_TTL)
+
+
+def load_snapshot(user_id):
+    """Snapshot values for ``user_id`` (cached), or None if the user doesn't exist"""
+    values = user_cache.get(user_id)
+    prometheus.cache_lookup('jwt_user', values is not None)
+    if values is None:
+        values = (
+            User.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .values_list(*SNAPSHOT_FIELDS)
+            .first()
+        )
+        if values is None:
+            return None
+        user_cache.set(user_id, values)
+    return values
+
+
+def snapshot_user(user_id):
+    """
+    ``User`` for ``user_id`` built from the cached snapshot (other fields
+    deferred), or None if the user doesn't exist.
+    """
+    values = load_snapshot(user_id)
+    if values is None:
+        return None
+    return User.from_db('default', SNAPSHOT_FIELDS, values)
+
+
+def get_active_user(user_id):
+    """Snapshot user for ``user_id`` if it exists and is active, else None"""
+    user = snapshot_user(user_id)
+    return user if user is not None and user.is_active else None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that resolves the token's user from the snapshot cache"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = snapshot_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(getattr(instance, api_settings.USER_ID_FIELD))
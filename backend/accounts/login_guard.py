@@ -0,0 +1,155 @@
+"""
+Login throttling and bounded password hashing.
+
+Each login attempt is checked against two in-memory sliding windows before
+any password is hashed: attempts per client IP and failed attempts per
+account (email). Rejected attempts cost a dictionary lookup, not a PBKDF2
+run. Password checks that do go ahead run on a small thread pool with a
+bounded backlog, so a credential-stuffing burst queues (or is turned away)
+there instead of occupying every worker that serves the catalog.
+
+The windows are per process, which is enough to blunt bursts; they are not
+a global account lockout.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from utils.mongo import get_db
+from utils.network import is_trusted_proxy
+
+User = get_user_model()
+
+# Upper bound on tracked keys per limiter; expired keys are pruned first
+MAX_TRACKED_KEYS = 50000
+
+
+class LoginThrottled(Exception):
+    """Too many attempts; ``retry_after`` is in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many login attempts. Try again later.')
+        self.retry_after = retry_after
+
+
+class LoginBusy(Exception):
+    """The password hashing pool's backlog is full"""
+
+
+class SlidingWindowLimiter:
+    """At most ``limit`` hits per key within the last ``window`` seconds"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def _prune(self, hits, now):
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+
+    def retry_after(self, key):
+        """Seconds until ``key`` may try again (0 if it isn't limited)"""
+        now = time.monotonic()
+        with self._lock:
+            hits = self._hits.get(key)
+            if not hits:
+                return 0
+            self._prune(hits, now)
+            if len(hits) < self.limit:
+                return 0
+            return int(hits[0] + self.window - now) + 1
+
+    def hit(self, key):
+        now = time.monotonic()
+        with self._lock:
+            if key not in self._hits and len(self._hits) >= MAX_TRACKED_KEYS:
+                self._evict(now)
+            hits = self._hits.setdefault(key, deque())
+            self._prune(hits, now)
+            hits.append(now)
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    def _evict(self, now):
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= now - self.window]:
+            del self._hits[key]
+        if len(self._hits) >= MAX_TRACKED_KEYS:
+            # Still full of live keys: drop everything rather than grow without bound
+            self._hits.clear()
+
+
+ip_limiter = SlidingWindowLimiter(settings.LOGIN_IP_MAX_ATTEMPTS, settings.LOGIN_IP_WINDOW)
+account_limiter = SlidingWindowLimiter(settings.LOGIN_ACCOUNT_MAX_FAILURES, settings.LOGIN_ACCOUNT_WINDOW)
+
+_hash_pool = ThreadPoolExecutor(max_workers=settings.LOGIN_HASH_WORKERS, thread_name_prefix='login-hash')
+_hash_slots = threading.BoundedSemaphore(settings.LOGIN_HASH_WORKERS + settings.LOGIN_HASH_BACKLOG)
+
+_email_index_ready = False
+
+def client_ip(request):
+    """
+    Client address. X-Real-IP (set by the bundled nginx proxy) is only used
+    when the request comes from one of TRUSTED_PROXIES; anyone else could
+    rotate it to dodge the per-IP limit.
+    """
+    remote = request.META.get('REMOTE_ADDR', '')
+    forwarded = request.META.get('HTTP_X_REAL_IP')
+    if forwarded and is_trusted_proxy(remote):
+        return forwarded.strip()
+    return remote
+
+
+def _account_key(email):
+    return str(email or '').strip().lower()
+
+
+def check(ip, email):
+    """Raise LoginThrottled if the IP or the account is over its limit; counts the attempt"""
+    retry_after = max(ip_limiter.retry_after(ip), account_limiter.retry_after(_account_key(email)))
+    if retry_after:
+        raise LoginThrottled(retry_after)
+    ip_limiter.hit(ip)
+
+
+def record_failure(email):
+    account_limiter.hit(_account_key(email))
+
+
+def record_success(email):
+    account_limiter.reset(_account_key(email))
+
+
+def find_user(email):
+    """User with this email (indexed lookup), or None"""
+    global _email_index_ready
+    if not _email_index_ready:
+        get_db()[User._meta.db_table].create_indexes(User.mongo_indexes)
+        _email_index_ready = True
+    return User.objects.filter(email=email).first()
+
+
+def _dummy_check(password):
+    User().set_password(password)
+    return False
+
+
+def verify_password(user, password):
+    """
+    Check ``password`` on the bounded hashing pool. ``user`` may be None, in
+    which case a dummy hash is computed so unknown emails take as long as
+    wrong passwords. Raises LoginBusy if the backlog is full.
+    """
+    if not _hash_slots.acquire(timeout=settings.LOGIN_HASH_WAIT):
+        raise LoginBusy('Login is busy. Try again shortly.')
+    try:
+        if user is None:
+            return _hash_pool.submit(_dummy_check, password).result()
+        return _hash_pool.submit(user.check_password, password).result()
+    finally:
+        _hash_slots.release()
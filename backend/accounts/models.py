@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from pymongo import IndexModel
 
 
 class User(AbstractUser):
@@ -15,6 +16,11 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Login looks users up by email; not unique, existing data may hold duplicates
+    mongo_indexes = [
+        IndexModel('email', name='email'),
+    ]
+
     class Meta:
         db_table = 'users'
 
@@ -0,0 +1,94 @@
+"""
+Refresh token store.
+
+Issued refresh tokens live in ``refresh_tokens``, one document per session
+keyed by the SHA-256 of the token (the token itself is never stored). A
+refresh is one indexed lookup-and-delete on that key followed by an insert
+of the new token, so rotation is atomic: of two concurrent refreshes with the
+same token only one gets a new pair. A TTL index removes each document once
+its token expires (``REFRESH_TOKEN_LIFETIME`` after issue). Users can have
+any number of sessions; logout revokes one or all of them.
+"""
+import hashlib
+from datetime import datetime, timezone as dt_timezone
+from django.utils import timezone
+from pymongo import IndexModel
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from utils.mongo import get_db
+
+COLLECTION = 'refresh_tokens'
+
+INDEXES = [
+    IndexModel('expires_at', name='expires_at_ttl', expireAfterSeconds=0),
+    IndexModel('user_id', name='user_id'),
+]
+
+_indexes_ready = False
+
+
+class InvalidRefreshToken(Exception):
+    """Raised for refresh tokens that are malformed, expired, revoked or already rotated"""
+
+
+def get_collection():
+    """Return the token collection, creating its indexes once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+def hash_token(token):
+    return hashlib.sha256(str(token).encode()).hexdigest()
+
+
+def issue(user):
+    """Create and store a refresh token for ``user``. Returns the RefreshToken."""
+    refresh = RefreshToken.for_user(user)
+    get_collection().insert_one({
+        '_id': hash_token(refresh),
+        'user_id': refresh[api_settings.USER_ID_CLAIM],
+        'created_at': timezone.now(),
+        'expires_at': datetime.fromtimestamp(refresh['exp'], tz=dt_timezone.utc),
+    })
+    return refresh
+
+
+def rotate(token, get_user):
+    """
+    Exchange a stored refresh token for a new one.
+
+    ``get_user(user_id)`` returns the active user for the token's subject, or
+    None. Raises InvalidRefreshToken if the token doesn't verify, isn't
+    stored (revoked, expired or already used) or its user is gone/inactive.
+    """
+    try:
+        user_id = RefreshToken(token)[api_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        raise InvalidRefreshToken('Invalid refresh token')
+
+    # Claims the token: a concurrent rotate with the same token finds nothing
+    stored = get_collection().find_one_and_delete(
+        {'_id': hash_token(token), 'user_id': user_id}, projection={'_id': 1}
+    )
+    if stored is None:
+        raise InvalidRefreshToken('Invalid refresh token')
+
+    user = get_user(user_id)
+    if user is None:
+        raise InvalidRefreshToken('Invalid refresh token')
+    return issue(user)
+
+
+def revoke(token, user_id):
+    """Revoke one session. Returns True if the token was stored."""
+    return get_collection().delete_one({'_id': hash_token(token), 'user_id': user_id}).deleted_count == 1
+
+
+def revoke_all(user_id):
+    """Revoke every session of a user. Returns the number revoked."""
+    return get_collection().delete_many({'user_id': user_id}).deleted_count
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from .models import User
+from . import login_guard
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -56,12 +57,10 @@ class LoginSerializer(serializers.Serializer):
         password = attrs.get('password')
 
         if email and password:
-            try:
-                user = User.objects.get(email=email)
-            except User.DoesNotExist:
-                raise serializers.ValidationError('Invalid credentials')
-
-            if not user.check_password(password):
+            # Indexed lookup; the hash runs on the bounded login pool (a dummy
+            # hash for unknown emails, so both cases take as long)
+            user = login_guard.find_user(email)
+            if not login_guard.verify_password(user, password):
                 raise serializers.ValidationError('Invalid credentials')
 
             if not user.is_active:
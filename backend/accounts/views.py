@@ -2,8 +2,9 @@ from rest_framework import status, generics
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
+from . import refresh_tokens, login_guard
+from .authentication import get_active_user
 from .serializers import RegisterSerializer, LoginSerializer, UserSerializer
 
 User = get_user_model()
@@ -16,7 +17,7 @@ def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = refresh_tokens.issue(user)
         
         return Response({
             'success': True,
@@ -36,14 +37,33 @@ def register(request):
 @permission_classes([AllowAny])
 def login(request):
     """Login user"""
-    serializer = LoginSerializer(data=request.data)
-    if serializer.is_valid():
+    email = request.data.get('email')
+    ip = login_guard.client_ip(request)
+    try:
+        # Rejected attempts are turned away here, before any password hashing
+        login_guard.check(ip, email)
+        serializer = LoginSerializer(data=request.data)
+        valid = serializer.is_valid()
+    except login_guard.LoginThrottled as e:
+        response = Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    except login_guard.LoginBusy as e:
+        response = Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response['Retry-After'] = '1'
+        return response
+    
+    if valid:
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        
-        # Store refresh token
-        user.refresh_token = str(refresh)
-        user.save(update_fields=['refresh_token'])
+        login_guard.record_success(email)
+        # Stored (hashed) as a new session; the user document isn't written
+        refresh = refresh_tokens.issue(user)
         
         return Response({
             'success': True,
@@ -53,6 +73,7 @@ def login(request):
                 'refreshToken': str(refresh)
             }
         })
+    login_guard.record_failure(email)
     return Response({
         'success': False,
         'errors': serializer.errors
@@ -72,32 +93,21 @@ def refresh_token(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        refresh = RefreshToken(refresh_token)
-        user = User.objects.get(id=refresh['user_id'])
-        
-        if user.refresh_token != refresh_token:
-            return Response({
-                'success': False,
-                'message': 'Invalid refresh token'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-        
-        # Generate new tokens
-        new_refresh = RefreshToken.for_user(user)
-        user.refresh_token = str(new_refresh)
-        user.save(update_fields=['refresh_token'])
-        
-        return Response({
-            'success': True,
-            'data': {
-                'token': str(new_refresh.access_token),
-                'refreshToken': str(new_refresh)
-            }
-        })
-    except Exception as e:
+        # One indexed lookup-and-delete on the token hash, then the new token
+        new_refresh = refresh_tokens.rotate(refresh_token, get_active_user)
+    except refresh_tokens.InvalidRefreshToken:
         return Response({
             'success': False,
             'message': 'Invalid refresh token'
         }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({
+        'success': True,
+        'data': {
+            'token': str(new_refresh.access_token),
+            'refreshToken': str(new_refresh)
+        }
+    })
 
 
 @api_view(['GET'])
@@ -115,9 +125,12 @@ def get_current_user(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout(request):
-    """Logout user (clear refresh token)"""
-    request.user.refresh_token = None
-    request.user.save(update_fields=['refresh_token'])
+    """Logout user (revoke the given refresh token, or every session without one)"""
+    refresh_token = request.data.get('refreshToken')
+    if refresh_token:
+        refresh_tokens.revoke(refresh_token, request.user.id)
+    else:
+        refresh_tokens.revoke_all(request.user.id)
     
     return Response({
         'success': True,
@@ -6,3 +6,7 @@ class AdminPanelConfig(AppConfig):
     name = 'admin_panel'
 
 
+
+    def ready(self):
+        # Connects the dashboard metrics signal receivers
+        from . import metrics  # noqa: F401
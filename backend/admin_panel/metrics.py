@@ -0,0 +1,246 @@
+"""
+Incrementally maintained admin dashboard metrics.
+
+Everything the dashboard shows lives in the ``dashboard_metrics`` collection:
+
+* a ``totals`` document (user/order counts, revenue and the IDs of the last
+  few orders), bumped with ``$inc``/``$push`` when a user registers or an order
+  is fulfilled;
+* hourly and daily buckets (``hour:<YYYY-MM-DDTHH>``, ``day:<YYYY-MM-DD>``)
+  with order counts and revenue, for trend charts.
+
+The dashboard reads all of it with a single query instead of counting and
+summing ``users`` and ``orders`` on every load. ``rebuild`` recomputes the
+documents from scratch (``rebuild_dashboard_metrics`` command; the container
+entrypoint runs it with ``--if-missing`` so a database that predates the
+metrics doesn't show zeros). The dashboard itself never rebuilds.
+
+Every increment also bumps the document's ``version``. ``rebuild`` notes the
+versions before it counts and only overwrites a document whose version is
+unchanged, so an order recorded while it runs is never lost: that document
+keeps its live value and is reported as a conflict (rerun to settle it).
+Orders and users created after the rebuild started are left to the
+increments.
+"""
+from datetime import timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from pymongo import DeleteOne, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.mongo import get_db
+
+COLLECTION = 'dashboard_metrics'
+TOTALS_ID = 'totals'
+RECENT_ORDERS = 10
+REBUILD_ATTEMPTS = 3
+
+DUPLICATE_KEY_ERROR = 11000
+
+INDEXES = [
+    IndexModel([('kind', 1), ('start', 1)], name='kind_start'),
+]
+
+_indexes_ready = False
+
+
+def get_collection():
+    """Return the metrics collection, creating its indexes once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+def _cents(amount):
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1')))
+
+
+def _bucket_starts(at):
+    hour = at.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    return hour, day
+
+
+def _bucket_id(kind, start):
+    key = start.strftime('%Y-%m-%dT%H') if kind == 'hour' else start.strftime('%Y-%m-%d')
+    return f'{kind}:{key}'
+
+
+def _bucket_update(kind, start, orders, revenue_cents):
+    return UpdateOne(
+        {'_id': _bucket_id(kind, start)},
+        {
+            '$inc': {'orders': orders, 'revenue_cents': revenue_cents, 'version': 1},
+            '$setOnInsert': {'kind': kind, 'start': start},
+        },
+        upsert=True
+    )
+
+
+def record_user_registered():
+    get_collection().update_one({'_id': TOTALS_ID}, {'$inc': {'users': 1, 'version': 1}}, upsert=True)
+
+
+def record_order_fulfilled(order):
+    """Count a paid order in the totals and its hourly/daily buckets"""
+    at = (order.created_at or timezone.now()).astimezone(dt_timezone.utc)
+    hour, day = _bucket_starts(at)
+    revenue_cents = _cents(order.total)
+    get_collection().bulk_write([
+        UpdateOne(
+            {'_id': TOTALS_ID},
+            {
+                '$inc': {'orders': 1, 'revenue_cents': revenue_cents, 'version': 1},
+                '$push': {'recent_order_ids': {'$each': [order.id], '$slice': -RECENT_ORDERS}},
+            },
+            upsert=True
+        ),
+        _bucket_update('hour', hour, 1, revenue_cents),
+        _bucket_update('day', day, 1, revenue_cents),
+    ], ordered=False)
+
+
+def _series(buckets):
+    return [
+        {
+            'start': bucket['start'],
+            'orders': bucket.get('orders', 0),
+            'revenue': bucket.get('revenue_cents', 0) / 100,
+        }
+        for bucket in sorted(buckets, key=lambda bucket: bucket['start'])
+    ]
+
+
+def _read_dashboard(hour_from, day_from):
+    totals = {}
+    hourly = []
+    daily = []
+    for document in get_collection().find({'$or': [
+        {'_id': TOTALS_ID},
+        {'kind': 'hour', 'start': {'$gte': hour_from}},
+        {'kind': 'day', 'start': {'$gte': day_from}},
+    ]}):
+        if document['_id'] == TOTALS_ID:
+            totals = document
+        elif document['kind'] == 'hour':
+            hourly.append(document)
+        else:
+            daily.append(document)
+    return totals, hourly, daily
+
+
+def get_dashboard(hours=48, days=30):
+    """
+    Totals, the IDs of the recent orders (newest first) and hourly and daily
+    trends, read in one query
+    """
+    now = timezone.now()
+    hour_from, _ = _bucket_starts((now - timedelta(hours=hours)).astimezone(dt_timezone.utc))
+    _, day_from = _bucket_starts((now - timedelta(days=days)).astimezone(dt_timezone.utc))
+
+    totals, hourly, daily = _read_dashboard(hour_from, day_from)
+    return {
+        'totalUsers': totals.get('users', 0),
+        # Collection metadata count; no scan
+        'totalProducts': get_db()['products'].estimated_document_count(),
+        'totalOrders': totals.get('orders', 0),
+        'totalRevenue': totals.get('revenue_cents', 0) / 100,
+        'recentOrderIds': list(reversed(totals.get('recent_order_ids', []))),
+        'hourly': _series(hourly),
+        'daily': _series(daily),
+    }
+
+
+def is_built():
+    """Whether the totals have ever been rebuilt (not just incremented)"""
+    return get_collection().count_documents({'_id': TOTALS_ID, 'rebuilt_at': {'$exists': True}}, limit=1) > 0
+
+
+def _count(since):
+    """Users, totals and buckets for everything created before ``since``"""
+    from accounts.models import User
+    from orders.models import Order
+
+    totals = {'users': User.objects.filter(created_at__lt=since).count(), 'orders': 0, 'revenue_cents': 0}
+    buckets = {}
+    recent = []
+    for order in Order.objects.filter(created_at__lt=since).order_by('created_at'):
+        # Every order is counted; only paid ones add to revenue
+        cents = _cents(order.total) if order.payment_status == 'succeeded' else 0
+        totals['orders'] += 1
+        totals['revenue_cents'] += cents
+        at = order.created_at.astimezone(dt_timezone.utc)
+        for kind, start in zip(('hour', 'day'), _bucket_starts(at)):
+            bucket = buckets.setdefault(_bucket_id(kind, start), {'kind': kind, 'start': start, 'orders': 0, 'revenue_cents': 0})
+            bucket['orders'] += 1
+            bucket['revenue_cents'] += cents
+        recent.append(order.id)
+        recent = recent[-RECENT_ORDERS:]
+    totals['recent_order_ids'] = recent
+    return totals, buckets
+
+
+def _unchanged(document_id, version):
+    # $exists rather than None, so an upsert doesn't insert a null version
+    return {'_id': document_id, 'version': version if version is not None else {'$exists': False}}
+
+
+def _rebuild_once():
+    """One guarded rebuild pass. Returns (documents written, IDs left as they were)."""
+    collection = get_collection()
+    started = timezone.now()
+    versions = {document['_id']: document.get('version') for document in collection.find({}, {'version': 1})}
+    totals, buckets = _count(started)
+    totals['rebuilt_at'] = started
+    buckets[TOTALS_ID] = totals
+
+    # A document whose version moved (or that appeared) since it was read
+    # doesn't match, so its upsert collides on _id and is left alone
+    ids = list(buckets)
+    writes = [
+        UpdateOne(
+            _unchanged(document_id, versions.get(document_id)),
+            {'$set': buckets[document_id], '$inc': {'version': 1}},
+            upsert=True
+        )
+        for document_id in ids
+    ]
+    # Buckets with no orders left (deleted since) go, unless just incremented
+    stale = [document_id for document_id in versions if document_id not in buckets]
+    ids += stale
+    writes += [DeleteOne(_unchanged(document_id, versions[document_id])) for document_id in stale]
+    try:
+        collection.bulk_write(writes, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        conflicts = [ids[error['index']] for error in errors]
+        return len(writes) - len(conflicts), conflicts
+    return len(writes), []
+
+
+def rebuild(attempts=REBUILD_ATTEMPTS):
+    """
+    Recompute all metrics from ``users`` and ``orders``, retrying documents
+    that were incremented meanwhile. Returns (documents written, IDs that
+    still conflicted).
+    """
+    written = 0
+    conflicts = []
+    for _ in range(attempts):
+        written, conflicts = _rebuild_once()
+        if not conflicts:
+            break
+    return written, conflicts
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def count_registered_user(sender, instance, created, **kwargs):
+    if created:
+        record_user_registered()
@@ -0,0 +1,37 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from pymongo.errors import BulkWriteError
+from . import metrics
+
+
+class RebuildTests(SimpleTestCase):
+    """A rebuild never overwrites a document incremented while it counted"""
+
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        self.collection.find.return_value = [{'_id': metrics.TOTALS_ID, 'version': 4}, {'_id': 'day:2001-01-01'}]
+        patchers = [
+            mock.patch.object(metrics, 'get_collection', return_value=self.collection),
+            mock.patch.object(metrics, '_count', return_value=({'users': 1, 'orders': 0, 'revenue_cents': 0}, {})),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_writes_are_guarded_by_the_versions_read(self):
+        self.assertEqual(metrics.rebuild(), (2, []))
+        totals, stale = self.collection.bulk_write.call_args[0][0]
+        self.assertEqual(totals._filter, {'_id': metrics.TOTALS_ID, 'version': 4})
+        self.assertEqual(stale._filter, {'_id': 'day:2001-01-01', 'version': {'$exists': False}})
+
+    def test_incremented_documents_are_retried_then_reported(self):
+        conflict = BulkWriteError({'writeErrors': [{'index': 0, 'code': metrics.DUPLICATE_KEY_ERROR}]})
+        self.collection.bulk_write.side_effect = conflict
+        self.assertEqual(metrics.rebuild(), (1, [metrics.TOTALS_ID]))
+        self.assertEqual(self.collection.bulk_write.call_count, metrics.REBUILD_ATTEMPTS)
+
+    def test_dashboard_never_rebuilds(self):
+        self.collection.find.return_value = []
+        with mock.patch.object(metrics, 'get_db'), mock.patch.object(metrics, 'rebuild') as rebuild:
+            self.assertEqual(metrics.get_dashboard()['totalOrders'], 0)
+        rebuild.assert_not_called()
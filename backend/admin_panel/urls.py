@@ -3,13 +3,21 @@ from . import views
 
 urlpatterns = [
     path('stats/', views.admin_stats, name='admin-stats'),
-    path('products/', views.admin_products, name='admin-products'),  # GET all products, POST create
-    path('products/<str:product_id>/', views.update_product, name='admin-update-product'),  # PUT/PATCH/DELETE
+    path('db-stats/', views.db_stats, name='admin-db-stats'),  # Per-view DB timings (DB_INSTRUMENTATION)
+    path('profiles/', views.list_profiles, name='admin-profiles'),  # Recent ?__profile= reports (PROFILING_ENABLED)
+    path('profiles/<str:name>/', views.download_profile, name='admin-download-profile'),
+    path('products/', views.admin_products, name='admin-products'),  # GET paginated/filtered products, POST create
+    path('products/bulk-update/', views.bulk_update_products, name='admin-bulk-update-products'),  # Filter + patch, one update_many
+    path('products/import/', views.import_products, name='admin-import-products'),  # CSV/JSONL upsert by SKU
+    path('products/export/', views.export_products, name='admin-export-products'),  # Streams CSV/JSONL
+    path('products/<str:product_id>/', views.update_product, name='admin-update-product'),  # PUT/PATCH, DELETE archives
+    path('products/<str:product_id>/restore/', views.restore_product, name='admin-restore-product'),  # Un-archive
     path('keys/', views.add_digital_keys, name='admin-add-keys'),
     path('orders/', views.get_all_orders, name='admin-orders'),
     path('orders/<int:order_id>/status/', views.update_order_status, name='admin-update-order-status'),
     path('promo-codes/', views.create_promo_code, name='admin-create-promo'),
     path('promo-codes/list/', views.get_promo_codes, name='admin-promo-codes'),
+    path('promo-codes/bulk/', views.bulk_create_promo_codes, name='admin-bulk-promo-codes'),  # Streams CSV
 ]
 
 
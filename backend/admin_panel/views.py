@@ -1,14 +1,25 @@
+import io
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Sum, Count
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.utils.text import get_valid_filename
 from products.models import Product
+from products.inventory import increment_stock, get_available_map
+from products.listing import query_products
+from products import catalog_io, archival
 from orders.models import Order, DigitalKey, PromoCode
-from accounts.models import User
-from products.serializers import ProductSerializer
-from orders.serializers import OrderSerializer, PromoCodeSerializer
+from products.serializers import ProductSerializer, BulkProductUpdateSerializer
+from products.bulk_update import bulk_update, BulkUpdateError
+from orders.serializers import OrderSerializer, PromoCodeSerializer, BulkPromoCodeSerializer
+from orders.bulk_promos import create_codes, csv_lines, delete_codes
+from . import metrics
 from utils.encryption import encrypt_key
+from utils import profiling
+from utils.db_instrumentation import view_stats
 
 
 def is_admin(user):
@@ -26,29 +37,99 @@ def admin_stats(request):
             'message': 'Access denied. Admin privileges required.'
         }, status=status.HTTP_403_FORBIDDEN)
     
-    total_users = User.objects.count()
-    total_products = Product.objects.count()
-    total_orders = Order.objects.count()
-    total_revenue = Order.objects.filter(payment_status='succeeded').aggregate(
-        total=Sum('total')
-    )['total'] or 0
-    
-    recent_orders = Order.objects.select_related('user').prefetch_related('order_items__product')[:10]
-    
+    # Counts, revenue and trends are maintained incrementally; one read
+    dashboard = metrics.get_dashboard()
+    ids = dashboard['recentOrderIds']
+    by_id = {
+        order.id: order
+        for order in Order.objects.filter(id__in=ids).select_related('user').prefetch_related('order_items__product')
+    }
+    recent_orders = [by_id[order_id] for order_id in ids if order_id in by_id]
+
     return Response({
         'success': True,
         'data': {
             'stats': {
-                'totalUsers': total_users,
-                'totalProducts': total_products,
-                'totalOrders': total_orders,
-                'totalRevenue': float(total_revenue)
+                'totalUsers': dashboard['totalUsers'],
+                'totalProducts': dashboard['totalProducts'],
+                'totalOrders': dashboard['totalOrders'],
+                'totalRevenue': dashboard['totalRevenue']
             },
-            'recentOrders': OrderSerializer(recent_orders, many=True).data
+            'recentOrders': OrderSerializer(recent_orders, many=True).data,
+            'trends': {
+                'hourly': dashboard['hourly'],
+                'daily': dashboard['daily']
+            }
+        }
+    })
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def db_stats(request):
+    """Per-view request and database timings of this process; DELETE resets them"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    if request.method == 'DELETE':
+        view_stats.reset()
+        return Response({
+            'success': True,
+            'message': 'DB stats reset'
+        })
+
+    return Response({
+        'success': True,
+        'data': {
+            'enabled': settings.DB_INSTRUMENTATION,
+            'views': view_stats.snapshot()
+        }
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_profiles(request):
+    """Recent request profiles, newest first"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    return Response({
+        'success': True,
+        'data': {
+            'enabled': settings.PROFILING_ENABLED,
+            'sampleRate': settings.PROFILE_SAMPLE_RATE,
+            'profiles': profiling.recent_profiles()
         }
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_profile(request, name):
+    """Download a .prof (cProfile) or .html (pyinstrument) report"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+
+    path = profiling.profile_path(name)
+    if path is None:
+        return Response({
+            'success': False,
+            'message': 'Profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
 def admin_products(request):
@@ -60,12 +141,19 @@ def admin_products(request):
         }, status=status.HTTP_403_FORBIDDEN)
     
     if request.method == 'GET':
-        # Get all products, not just active ones
-        products = Product.objects.all().order_by('-created_at')
-        serializer = ProductSerializer(products, many=True)
+        # All products (not just active ones); filters, search, sort and
+        # pagination run in MongoDB and only the requested page is loaded
+        products, pagination = query_products(request.query_params)
+        # Stock comes from the key inventory counters, loaded in one query
+        serializer = ProductSerializer(
+            products, many=True, context={'key_inventory': get_available_map(products)}
+        )
         return Response({
             'success': True,
-            'data': {'products': serializer.data}
+            'data': {
+                'products': serializer.data,
+                'pagination': pagination
+            }
         })
     
     elif request.method == 'POST':
@@ -83,6 +171,132 @@ def admin_products(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_products(request):
+    """Upsert products by SKU from an uploaded CSV or JSONL feed"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({
+            'success': False,
+            'message': 'Upload the feed as "file"'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    fmt = request.data.get('fileType') or catalog_io.detect_format(upload.name)
+    if fmt not in catalog_io.FORMATS:
+        return Response({
+            'success': False,
+            'message': f'fileType must be one of: {", ".join(catalog_io.FORMATS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Parsed straight from the upload stream, one row at a time
+    lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    report = catalog_io.import_products(
+        catalog_io.read_rows(lines, fmt),
+        dry_run=str(request.data.get('dryRun', '')).lower() in ('1', 'true', 'yes')
+    )
+    if report['aborted']:
+        return Response({
+            'success': False,
+            'message': f'The feed could not be read past row {report["errors"][-1]["row"]}',
+            'data': {'report': report}
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'success': True,
+        'data': {'report': report}
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_products(request):
+    """Stream the catalog as CSV or JSONL (?fileType=csv|jsonl, ?includeArchived=true)"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    fmt = request.query_params.get('fileType', 'csv')
+    if fmt not in catalog_io.FORMATS:
+        return Response({
+            'success': False,
+            'message': f'fileType must be one of: {", ".join(catalog_io.FORMATS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    include_archived = request.query_params.get('includeArchived', '').lower() in ('1', 'true', 'yes')
+    response = StreamingHttpResponse(
+        catalog_io.export_products(fmt, include_archived=include_archived), content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def restore_product(request, product_id):
+    """Restore an archived product (it stays inactive until reactivated)"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    from bson import ObjectId
+    if not ObjectId.is_valid(product_id) or not archival.restore(product_id):
+        return Response({
+            'success': False,
+            'message': 'Archived product not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'message': 'Product restored successfully'
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_update_products(request):
+    """Apply one field patch (price, discount, isActive, featured) to every product matching a filter"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = BulkProductUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        matched, modified = bulk_update(
+            serializer.validated_data['filter'],
+            serializer.validated_data['patch'],
+            allow_all=serializer.validated_data['all']
+        )
+    except BulkUpdateError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'success': True,
+        'data': {'matched': matched, 'modified': modified}
+    })
+
+
 @api_view(['PUT', 'PATCH', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def update_product(request, product_id):
@@ -108,11 +322,12 @@ def update_product(request, product_id):
         }, status=status.HTTP_404_NOT_FOUND)
     
     if request.method == 'DELETE':
-        # Delete product (hard delete)
-        product.delete()
+        # Archive (soft delete): one update, keeps order history intact.
+        # Archived products are hard-deleted later by purge_archived_products
+        archival.archive(product.pk)
         return Response({
             'success': True,
-            'message': 'Product deleted successfully'
+            'message': 'Product archived successfully'
         })
     
     # Update product (PUT or PATCH)
@@ -169,15 +384,14 @@ def add_digital_keys(request):
             )
             created_count += 1
     
-    # Update product stock
-    product.stock += created_count
-    product.save()
+    # Update the (product, region) key counter atomically
+    product_stock = increment_stock(product.pk, region, created_count)
     
     return Response({
         'success': True,
         'data': {
             'keysAdded': created_count,
-            'productStock': product.stock
+            'productStock': product_stock
         }
     }, status=status.HTTP_201_CREATED)
 
@@ -257,6 +471,45 @@ def create_promo_code(request):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_create_promo_codes(request):
+    """Generate a campaign of single-use promo codes, streamed back as CSV"""
+    if not is_admin(request.user):
+        return Response({
+            'success': False,
+            'message': 'Access denied. Admin privileges required.'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = BulkPromoCodeSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    fields = dict(serializer.validated_data)
+    count = fields.pop('count')
+    length = fields.pop('length')
+    prefix = fields.pop('prefix')
+    
+    # Every code is inserted before the response starts, so a failed chunk
+    # is a 500 (with the partial campaign removed), never a truncated CSV
+    chunks = []
+    try:
+        for chunk in create_codes(count, length=length, prefix=prefix, **fields):
+            chunks.append(chunk)
+    except Exception:
+        delete_codes(chunks)
+        raise
+    
+    response = StreamingHttpResponse(csv_lines(chunks, fields['campaign']), content_type='text/csv')
+    response['Content-Disposition'] = content_disposition_header(
+        True, get_valid_filename(f'promo-codes-{fields["campaign"]}.csv')
+    )
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_promo_codes(request):
@@ -22,6 +22,19 @@ fi
 echo "Running migrations..."
 python manage.py migrate --noinput
 
+if [ "$USE_MONGODB" = "True" ]; then
+    echo "Ensuring MongoDB indexes..."
+    python manage.py ensure_indexes
+    echo "Seeding dashboard metrics..."
+    python manage.py rebuild_dashboard_metrics --if-missing
+fi
+
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    # Samples from a previous run would be added to this one's
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 echo "Collecting static files..."
 python manage.py collectstatic --noinput || true
 
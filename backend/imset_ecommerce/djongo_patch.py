@@ -1,10 +1,70 @@
 """
 Djongo compatibility patch for pymongo 4.x
 This patch fixes the NotImplementedError when checking database connection truthiness
-and JSONField issues where MongoDB returns Python objects instead of JSON strings
+and JSONField issues where MongoDB returns Python objects instead of JSON strings.
+It also runs ORDER BY as a native, index-hinted sort (see utils.ordering),
+and makes boolean filters compare against a parameter ("is_active" = %s),
+since djongo can't parse a bare boolean column as a WHERE condition.
 """
 import sys
 
+
+def _native_order_converter(OrderConverter):
+    """OrderConverter subclass that can be built from columns and hints a sort index"""
+    from utils.ordering import sort_hint, sort_indexes
+
+    class NativeOrderConverter(OrderConverter):
+        def __init__(self, query, columns):
+            self.query = query
+            self.columns = columns
+
+        def to_mongo(self):
+            # Only reached for find() queries; aggregations swap in djongo's AggOrderConverter
+            spec = super().to_mongo()
+            query = self.query
+            if all(getattr(column, 'table', None) == query.left_table for column in self.columns):
+                query_filter = query.where.to_mongo()['filter'] if query.where else {}
+                hint = sort_hint(sort_indexes(query.db, query.left_table), query_filter, spec['sort'])
+                if hint:
+                    spec['hint'] = hint
+            return spec
+
+    return NativeOrderConverter
+
+
+def _patch_select(original_select, NativeOrderConverter):
+    """
+    Wrap djongo's SELECT handler: an ORDER BY djongo can't parse is split off,
+    the rest of the statement is parsed and the ordering is attached as a
+    native sort. Orderings that aren't plain columns of the queried table
+    still raise rather than return unsorted rows.
+    """
+    from sqlparse import parse as sqlparse
+    from utils.ordering import SortColumn, split_order_by
+
+    def patched_select(self, sm):
+        try:
+            query = original_select(self, sm)
+        except Exception:
+            split = split_order_by(str(sm))
+            if split is None:
+                raise
+            order_by, sql = split
+            query = original_select(self, sqlparse(sql)[0])
+            if any(table not in (None, query.left_table) for table, _, _ in order_by):
+                raise
+            columns = [SortColumn(query.left_table, column, column, direction) for _, column, direction in order_by]
+        else:
+            if query.order is None:
+                return query
+            columns = query.order.columns
+        query.order = NativeOrderConverter(query, columns)
+        return query
+
+    patched_select.native_order = True
+    return patched_select
+
+
 def apply_djongo_patch():
     """Apply patches to djongo to fix pymongo 4.x compatibility issues"""
     try:
@@ -29,31 +89,22 @@ def apply_djongo_patch():
         
         djongo.base.DatabaseWrapper._close = patched_close
         
-        # Also patch cursor to handle ORDER BY issues
+        # filter(is_active=True) is emitted as 'WHERE "products"."is_active"'
+        # unless the backend declines bare conditions; djongo fails to parse it
+        try:
+            from djongo.operations import DatabaseOperations
+            DatabaseOperations.conditional_expression_supported_in_where_clause = lambda self, expression: False
+        except Exception:
+            pass  # If patching fails, continue anyway
+        
+        # Serve ORDER BY natively instead of dropping it (see utils.ordering)
         try:
-            import djongo.cursor
             import djongo.sql2mongo.query
+            from djongo.sql2mongo.converters import OrderConverter
             
-            # Patch to handle ORDER BY more gracefully
-            original_parse = djongo.sql2mongo.query.Query.parse
-            
-            def patched_parse(self):
-                """Patched parse to handle ORDER BY"""
-                try:
-                    return original_parse(self)
-                except Exception as e:
-                    error_msg = str(e)
-                    if 'ORDER BY' in error_msg or 'Unknown keyword' in error_msg:
-                        # For queries with ORDER BY, try without it
-                        # This is a workaround for djongo limitations
-                        if hasattr(self, 'statement'):
-                            # Remove ORDER BY clause if present
-                            import re
-                            self.statement = re.sub(r'\s+ORDER\s+BY\s+[^\s]+(?:\s+ASC|\s+DESC)?', '', str(self.statement), flags=re.IGNORECASE)
-                            return original_parse(self)
-                    raise
-            
-            djongo.sql2mongo.query.Query.parse = patched_parse
+            Query = djongo.sql2mongo.query.Query
+            if not getattr(Query.FUNC_MAP['SELECT'], 'native_order', False):
+                Query.FUNC_MAP['SELECT'] = _patch_select(Query.FUNC_MAP['SELECT'], _native_order_converter(OrderConverter))
         except Exception:
             pass  # If patching fails, continue anyway
         
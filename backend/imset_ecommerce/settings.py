@@ -43,9 +43,14 @@ INSTALLED_APPS = [
     'orders',
     'payments',
     'admin_panel',
+    'utils',  # Management commands (utils/management/commands)
 ]
 
 MIDDLEWARE = [
+    'utils.prometheus.MetricsMiddleware',  # No-op unless METRICS_ENABLED
+    'utils.tracing.TracingMiddleware',  # No-op unless TRACING_ENABLED
+    'utils.profiling.ProfilingMiddleware',  # No-op unless PROFILING_ENABLED
+    'utils.db_instrumentation.DBInstrumentationMiddleware',  # No-op unless DB_INSTRUMENTATION
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -119,6 +124,9 @@ else:
         }
     }
 
+# Connection pool size of the shared pymongo client used for native queries
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '50'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -171,7 +179,7 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -206,6 +214,84 @@ STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', '')
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY', '')
 STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
 
+# Stock reservations (seconds a checkout holds stock, and how long finished
+# reservation documents are kept before the TTL index removes them)
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', '900'))
+STOCK_RESERVATION_PURGE_AFTER = int(os.getenv('STOCK_RESERVATION_PURGE_AFTER', '86400'))
+
+# Seconds a checkout's Idempotency-Key (or cart hash) keeps returning the same intent
+PAYMENT_INTENT_IDEMPOTENCY_TTL = int(os.getenv('PAYMENT_INTENT_IDEMPOTENCY_TTL', '600'))
+
+# Seconds each process keeps its in-memory promo code map before reloading it
+PROMO_CACHE_TTL = int(os.getenv('PROMO_CACHE_TTL', '60'))
+
+# Seconds each process reuses a user snapshot when authenticating JWT requests
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '30'))
+
+# Login throttling (per process): attempts per client IP and failures per account
+LOGIN_IP_MAX_ATTEMPTS = int(os.getenv('LOGIN_IP_MAX_ATTEMPTS', '20'))
+LOGIN_IP_WINDOW = int(os.getenv('LOGIN_IP_WINDOW', '60'))
+LOGIN_ACCOUNT_MAX_FAILURES = int(os.getenv('LOGIN_ACCOUNT_MAX_FAILURES', '5'))
+LOGIN_ACCOUNT_WINDOW = int(os.getenv('LOGIN_ACCOUNT_WINDOW', '900'))
+
+# Proxies (IPs or CIDR networks, comma-separated) whose X-Real-IP header is
+# trusted for the client address, e.g. the bundled nginx container, and whose
+# traceparent header may force tracing. Requests from anywhere else are
+# throttled by REMOTE_ADDR
+TRUSTED_PROXIES = [proxy.strip() for proxy in os.getenv('TRUSTED_PROXIES', '').split(',') if proxy.strip()]
+
+# Password hashing pool for logins: worker threads, queued checks beyond them,
+# and seconds a login waits for a slot before getting a 503
+LOGIN_HASH_WORKERS = int(os.getenv('LOGIN_HASH_WORKERS', '2'))
+LOGIN_HASH_BACKLOG = int(os.getenv('LOGIN_HASH_BACKLOG', '8'))
+LOGIN_HASH_WAIT = float(os.getenv('LOGIN_HASH_WAIT', '2'))
+
+# Per-request Mongo/ORM counts and timings (Server-Timing header, per-view
+# totals at /api/admin/db-stats/); requests slower than SLOW_REQUEST_MS are
+# logged to the slow_requests logger, in SLOW_REQUEST_LOG if set
+DB_INSTRUMENTATION = os.getenv('DB_INSTRUMENTATION', 'False') == 'True'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+SLOW_REQUEST_LOG = os.getenv('SLOW_REQUEST_LOG', '')
+
+# Prometheus metrics at /api/metrics; scrapers must send "Bearer METRICS_TOKEN"
+# (required when enabled).
+# With several workers, PROMETHEUS_MULTIPROC_DIR must point to a directory
+# they share so scrapes aggregate all of them. Per-product stock is only
+# exported for the METRICS_LOW_STOCK_SERIES lowest pools
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_LOW_STOCK_SERIES = int(os.getenv('METRICS_LOW_STOCK_SERIES', '20'))
+
+# Request tracing: spans for views, Mongo commands, Stripe, mail and key
+# encryption for a TRACE_SAMPLE_RATE share of requests, appended to TRACE_FILE
+# (rotated to TRACE_FILE.1 once it reaches TRACE_FILE_MAX_MB)
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'False') == 'True'
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0.1'))
+TRACE_FILE = os.getenv('TRACE_FILE', str(BASE_DIR / 'traces.jsonl'))
+TRACE_FILE_MAX_MB = int(os.getenv('TRACE_FILE_MAX_MB', '100'))
+
+# Request profiling: admins add ?__profile=cprofile|pyinstrument to a request,
+# and PROFILE_SAMPLE_RATE of all requests are profiled with cProfile. Reports
+# are written to PROFILE_DIR (newest PROFILE_KEEP kept), see /api/admin/profiles/
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '50'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': (
+            {'class': 'logging.FileHandler', 'filename': SLOW_REQUEST_LOG}
+            if SLOW_REQUEST_LOG else {'class': 'logging.StreamHandler'}
+        ),
+    },
+    'loggers': {
+        'slow_requests': {'handlers': ['slow_requests'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
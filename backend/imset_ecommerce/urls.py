@@ -6,6 +6,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
+from utils.prometheus import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -15,6 +16,7 @@ urlpatterns = [
     path('api/payments/', include('payments.urls')),
     path('api/admin/', include('admin_panel.urls')),
     path('api/health/', lambda request: JsonResponse({'status': 'OK', 'message': 'IMSET E-commerce API is running'})),
+    path('api/metrics', metrics_view),
 ]
 
 if settings.DEBUG:
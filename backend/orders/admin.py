@@ -1,26 +1,48 @@
 from django.contrib import admin
+from utils.admin import LargeCollectionAdmin
 from .models import Order, OrderItem, DigitalKey, PromoCode
 
 
+class KeyRegionFilter(admin.SimpleListFilter):
+    """Region filter fed by the small key_inventory collection instead of DISTINCT over every key"""
+    title = 'region'
+    parameter_name = 'region'
+
+    def lookups(self, request, model_admin):
+        from products.inventory import get_collection
+        return [(region, region) for region in sorted(get_collection().distinct('region'))]
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(region=self.value())
+
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    # Raw ID inputs: a select would load every product and key into the form
+    raw_id_fields = ('product', 'digital_key')
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeCollectionAdmin):
     list_display = ('id', 'user', 'total', 'status', 'payment_status', 'created_at')
     list_filter = ('status', 'payment_status', 'created_at')
-    search_fields = ('user__email', 'payment_intent_id')
+    list_prefetch_related = ('user',)
+    search_fields = ('=payment_intent_id', 'user__email')
+    raw_id_fields = ('user', 'promo_code')
     inlines = [OrderItemInline]
     readonly_fields = ('created_at', 'updated_at')
 
 
 @admin.register(DigitalKey)
-class DigitalKeyAdmin(admin.ModelAdmin):
+class DigitalKeyAdmin(LargeCollectionAdmin):
     list_display = ('id', 'product', 'is_used', 'region', 'created_at')
-    list_filter = ('is_used', 'region', 'created_at')
+    list_filter = ('is_used', KeyRegionFilter, 'created_at')
+    list_prefetch_related = ('product',)
     search_fields = ('product__title',)
+    raw_id_fields = ('product', 'order', 'user')
     readonly_fields = ('created_at',)
 
 
@@ -5,4 +5,6 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
 
-
+    def ready(self):
+        # Connect the promo engine's cache invalidation signals
+        from . import promotions  # noqa: F401
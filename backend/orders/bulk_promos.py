@@ -0,0 +1,154 @@
+"""
+Bulk generation and import of single-use promo codes.
+
+Codes are drawn from ``secrets`` and mapped onto a 32-character alphabet
+without look-alike characters, so a million codes take well under a second to
+generate. They are written with unordered ``insert_many`` in chunks; codes
+that collide with the unique ``code`` index are dropped and (when generating)
+replaced with fresh ones. Each function yields the codes actually inserted,
+chunk by chunk; ``csv_lines`` turns those chunks into CSV text. A caller
+that has to hand back all or nothing (the admin endpoint) collects every
+chunk first and removes what it wrote with ``delete_codes`` if a chunk fails.
+
+Generation is refused unless the code space is ``CODE_SPACE_HEADROOM`` times
+the requested count, which keeps collisions (and retries) rare and makes
+sure the loop can always finish.
+"""
+import csv
+import io
+import secrets
+from pymongo.errors import BulkWriteError
+from utils.mongo import get_db, allocate_ids, model_document
+from .models import PromoCode
+
+# 32 symbols (no 0/O, 1/I) so every random byte maps uniformly with ``& 31``
+ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+_BYTE_TO_SYMBOL = bytes(ord(ALPHABET[byte & 31]) for byte in range(256))
+
+DEFAULT_LENGTH = 12
+MIN_LENGTH = 8
+MAX_LENGTH = 30
+DEFAULT_CHUNK_SIZE = 10000
+CODE_SPACE_HEADROOM = 1000
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class PromoGenerationError(Exception):
+    """Raised when the requested codes can't be generated (length or code space)"""
+
+
+def check_code_space(count, length=DEFAULT_LENGTH, prefix=''):
+    """Raise PromoGenerationError unless ``count`` codes of ``length`` fit with headroom"""
+    max_length = min(MAX_LENGTH, PromoCode._meta.get_field('code').max_length - len(prefix))
+    if not MIN_LENGTH <= length <= max_length:
+        raise PromoGenerationError(f'Code length must be between {MIN_LENGTH} and {max_length}')
+    if len(ALPHABET) ** length < count * CODE_SPACE_HEADROOM:
+        raise PromoGenerationError(f'{count} codes need a longer code than {length} characters')
+
+
+def generate_codes(count, length=DEFAULT_LENGTH, prefix=''):
+    """Return ``count`` distinct random codes"""
+    check_code_space(count, length, prefix)
+    codes = set()
+    while len(codes) < count:
+        missing = count - len(codes)
+        raw = secrets.token_bytes(missing * length).translate(_BYTE_TO_SYMBOL).decode('ascii')
+        codes.update(prefix + raw[i:i + length] for i in range(0, len(raw), length))
+    return list(codes)
+
+
+def _insert_chunk(collection, template, codes):
+    """Insert one chunk, returning the codes that were actually written"""
+    ids = allocate_ids(PromoCode._meta.db_table, len(codes))
+    documents = []
+    for promo_id, code in zip(ids, codes):
+        document = dict(template)
+        document['id'] = promo_id
+        document['code'] = code
+        documents.append(document)
+
+    try:
+        collection.insert_many(documents, ordered=False)
+        return codes
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        rejected = {documents[error['index']]['code'] for error in errors}
+        return [code for code in codes if code not in rejected]
+
+
+def _template(**fields):
+    fields.setdefault('usage_limit', 1)
+    fields.setdefault('is_active', True)
+    return model_document(PromoCode(code='', **fields))
+
+
+def create_codes(count, length=DEFAULT_LENGTH, prefix='', chunk_size=DEFAULT_CHUNK_SIZE, **fields):
+    """
+    Generate and insert ``count`` new codes sharing ``fields`` (discount,
+    validity, campaign, ...). Yields lists of inserted codes per chunk.
+    """
+    check_code_space(count, length, prefix)
+    collection = get_db()[PromoCode._meta.db_table]
+    template = _template(**fields)
+    remaining = count
+    while remaining > 0:
+        codes = generate_codes(min(chunk_size, remaining), length=length, prefix=prefix)
+        inserted = _insert_chunk(collection, template, codes)
+        remaining -= len(inserted)
+        if inserted:
+            yield inserted
+
+
+def import_codes(codes, chunk_size=DEFAULT_CHUNK_SIZE, **fields):
+    """
+    Insert externally generated ``codes`` sharing ``fields``. Codes already
+    present are skipped. Yields lists of inserted codes per chunk.
+    """
+    collection = get_db()[PromoCode._meta.db_table]
+    template = _template(**fields)
+    chunk = []
+    seen = set()
+    for code in codes:
+        code = code.strip().upper()
+        if not code or code in seen:
+            continue
+        seen.add(code)
+        chunk.append(code)
+        if len(chunk) >= chunk_size:
+            inserted = _insert_chunk(collection, template, chunk)
+            if inserted:
+                yield inserted
+            chunk = []
+    if chunk:
+        inserted = _insert_chunk(collection, template, chunk)
+        if inserted:
+            yield inserted
+
+
+def delete_codes(chunks, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Remove codes inserted by an interrupted run, given its chunks"""
+    collection = get_db()[PromoCode._meta.db_table]
+    codes = [code for chunk in chunks for code in chunk]
+    for start in range(0, len(codes), chunk_size):
+        collection.delete_many({'code': {'$in': codes[start:start + chunk_size]}})
+
+
+def csv_lines(chunks, campaign):
+    """CSV text for chunks of inserted codes: the header, then one piece per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+
+    def take():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writerow(['code', 'campaign'])
+    yield take()
+    for chunk in chunks:
+        writer.writerows([code, campaign] for code in chunk)
+        yield take()
@@ -0,0 +1,56 @@
+"""
+One order per payment intent.
+
+Stripe retries webhooks and can deliver the same event twice at once, so
+the webhook inserts its order row before touching stock or keys. The unique
+``payment_intent_id`` index on ``orders`` (``Order.mongo_indexes``, built by
+``ensure_indexes``) lets exactly one delivery insert it; the others get a
+DuplicateKeyError and stop without side effects.
+
+If fulfillment fails after the claim, ``release_order`` undoes it: the
+claimed keys go back to the pool and the order's items and row are
+deleted. The webhook then answers with an error, and Stripe's retry finds no
+order and starts over, instead of leaving a paid order stuck in
+``processing``.
+"""
+from pymongo.errors import DuplicateKeyError
+from utils.mongo import get_db, allocate_ids, model_document
+from .models import DigitalKey, Order, OrderItem
+
+
+def claim_order(order):
+    """
+    Insert the unsaved ``order`` and set its ID.
+
+    Returns False, leaving ``order`` unsaved, if an order for the same
+    payment intent already exists.
+    """
+    table = Order._meta.db_table
+    document = model_document(order)
+    order.pk = allocate_ids(table, 1)[0]
+    document[Order._meta.pk.column] = order.pk
+    try:
+        get_db()[table].insert_one(document)
+    except DuplicateKeyError:
+        order.pk = None
+        return False
+    order._state.adding = False
+    return True
+
+
+def release_order(order, key_ids):
+    """
+    Undo a fulfillment that failed part way: unclaim ``key_ids`` (including
+    ones already attached to the order) and delete the order's items and the
+    order itself. Stock counters are the caller's to give back.
+    """
+    db = get_db()
+    if key_ids:
+        db[DigitalKey._meta.db_table].update_many(
+            {'id': {'$in': list(key_ids)}},
+            {'$set': {'is_used': False, 'used_at': None, 'user_id': None, 'order_id': None}}
+        )
+    db[OrderItem._meta.db_table].delete_many({'order_id': order.pk})
+    db[Order._meta.db_table].delete_one({Order._meta.pk.column: order.pk})
+    order.pk = None
+    order._state.adding = True
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promocode',
+            name='campaign',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=100),
+        ),
+    ]
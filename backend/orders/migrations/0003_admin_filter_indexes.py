@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_promocode_campaign'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['payment_status'], name='orders_payment_050188_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='digitalkey',
+            index=models.Index(fields=['is_used', 'region'], name='digital_key_is_used_91af3f_idx'),
+        ),
+    ]
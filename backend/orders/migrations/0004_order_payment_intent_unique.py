@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 16:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0003_admin_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='orders_payment_a868c2_idx',
+        ),
+    ]
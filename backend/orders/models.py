@@ -1,6 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from pymongo import IndexModel
 from products.models import Product
 
 
@@ -48,12 +49,19 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Indexes Meta can't express; built by ensure_indexes. One order per
+    # payment intent (unique instead of a plain Meta index, so a duplicate
+    # build fails the command rather than a migration).
+    mongo_indexes = [
+        IndexModel('payment_intent_id', name='payment_intent_id_unique', unique=True),
+    ]
+
     class Meta:
         db_table = 'orders'
         indexes = [
             models.Index(fields=['user', '-created_at']),
-            models.Index(fields=['payment_intent_id']),
             models.Index(fields=['status']),
+            models.Index(fields=['payment_status']),
         ]
 
     def __str__(self):
@@ -70,12 +78,18 @@ class DigitalKey(models.Model):
     region = models.CharField(max_length=50)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Only the keys still on sale, for allocation (utils.repository.claim_keys)
+    mongo_indexes = [
+        IndexModel([('product_id', 1), ('region', 1)], name='unused_keys', partialFilterExpression={'is_used': False}),
+    ]
+
     class Meta:
         db_table = 'digital_keys'
         indexes = [
             models.Index(fields=['product', 'is_used']),
             models.Index(fields=['order']),
             models.Index(fields=['user']),
+            models.Index(fields=['is_used', 'region']),  # Admin changelist filters
         ]
 
     def __str__(self):
@@ -101,6 +115,7 @@ class PromoCode(models.Model):
     is_active = models.BooleanField(default=True)
     applicable_products = models.ManyToManyField(Product, blank=True)
     applicable_categories = models.JSONField(default=list, blank=True)
+    campaign = models.CharField(max_length=100, blank=True, default='', db_index=True)  # Set on bulk-generated codes
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -0,0 +1,205 @@
+"""
+In-process promo code engine.
+
+Active promo codes are loaded into a per-process map and precompiled: money
+values become Decimals and applicability becomes frozensets of product IDs
+and categories, so evaluating a code against a cart needs no database access.
+The map is reloaded after ``PROMO_CACHE_TTL`` seconds and dropped whenever a
+PromoCode (or its applicable products) changes in this process. Only the
+usage counter (reserved at checkout, see ``orders.redemptions``) touches the
+database; a code whose counter changed is evicted so it is read again.
+
+Bulk-generated campaign codes (hundreds of thousands of single-use codes)
+are not preloaded; they are looked up one at a time on first use and kept in
+a bounded LRU alongside the map.
+"""
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal, ROUND_HALF_UP
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from utils import prometheus
+from .models import PromoCode
+
+CENT = Decimal('0.01')
+
+# Maximum number of individually looked-up campaign codes kept per process
+LOOKUP_CACHE_SIZE = 10000
+
+
+def _money(value):
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class CompiledPromo:
+    """Immutable snapshot of a promo code, ready for fast evaluation"""
+    __slots__ = (
+        'id', 'code', 'discount_type', 'discount_value', 'min_purchase', 'max_discount',
+        'valid_from', 'valid_until', 'usage_limit', 'used_count', 'product_ids', 'categories',
+    )
+
+    def __init__(self, promo, product_ids):
+        self.id = promo.id
+        self.code = promo.code
+        self.discount_type = promo.discount_type
+        self.discount_value = _money(promo.discount_value)
+        self.min_purchase = _money(promo.min_purchase) or Decimal('0.00')
+        self.max_discount = _money(promo.max_discount)
+        self.valid_from = promo.valid_from
+        self.valid_until = promo.valid_until
+        self.usage_limit = promo.usage_limit
+        self.used_count = promo.used_count or 0
+        self.product_ids = frozenset(product_ids)
+        self.categories = frozenset(promo.applicable_categories or [])
+
+    def is_valid_at(self, now):
+        """True if ``now`` falls inside the validity window"""
+        if self.valid_from and now < self.valid_from:
+            return False
+        if self.valid_until and now > self.valid_until:
+            return False
+        return True
+
+    @property
+    def is_exhausted(self):
+        """True if the (cached) usage count has reached the limit"""
+        return bool(self.usage_limit) and self.used_count >= self.usage_limit
+
+    def applies_to(self, product):
+        """True if the promo covers this product (no restrictions means the whole cart)"""
+        if not self.product_ids and not self.categories:
+            return True
+        return str(product.pk) in self.product_ids or product.category in self.categories
+
+    def discount_for(self, lines, subtotal):
+        """
+        Discount for priced cart lines. ``min_purchase`` applies to the whole
+        cart; the discount itself only to the lines the promo covers.
+        """
+        if subtotal < self.min_purchase:
+            return Decimal('0.00')
+
+        eligible = sum((line.total for line in lines if self.applies_to(line.product)), Decimal('0'))
+        if not eligible:
+            return Decimal('0.00')
+
+        if self.discount_type == 'percentage':
+            discount = _money(eligible * self.discount_value / 100)
+            if self.max_discount:
+                discount = min(discount, self.max_discount)
+        else:
+            discount = self.discount_value
+
+        return min(discount, _money(eligible))
+
+
+class PromoEngine:
+    """Per-process map of active promo codes, keyed by upper-case code"""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._codes = {}
+        self._expires_at = 0.0
+        self._lookups = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # Applicable products for every code in one query on the M2M table
+        through = PromoCode.applicable_products.through
+        product_ids = {}
+        for promo_id, product_id in through.objects.values_list('promocode_id', 'product_id'):
+            product_ids.setdefault(promo_id, []).append(str(product_id))
+
+        codes = {}
+        # Campaign codes are looked up on demand. djongo can't reliably filter
+        # on booleans, so is_active is checked here
+        regular = Q(campaign='') | Q(campaign__isnull=True)
+        for promo in PromoCode.objects.filter(regular):
+            if promo.is_active is False:
+                continue
+            codes[promo.code.upper()] = CompiledPromo(promo, product_ids.get(promo.id, ()))
+        return codes
+
+    def _lookup(self, code):
+        """Single indexed lookup for codes outside the preloaded map (cached, LRU)"""
+        with self._lock:
+            if code in self._lookups:
+                self._lookups.move_to_end(code)
+                prometheus.cache_lookup('promo', True)
+                return self._lookups[code]
+
+        prometheus.cache_lookup('promo', False)
+        promo = PromoCode.objects.filter(code=code).first()
+        compiled = None
+        if promo is not None and promo.is_active is not False:
+            compiled = CompiledPromo(promo, [str(p.pk) for p in promo.applicable_products.all()])
+
+        with self._lock:
+            self._lookups[code] = compiled
+            if len(self._lookups) > LOOKUP_CACHE_SIZE:
+                self._lookups.popitem(last=False)
+        return compiled
+
+    def _codes_map(self):
+        if time.monotonic() >= self._expires_at:
+            with self._lock:
+                if time.monotonic() >= self._expires_at:
+                    self._codes = self._load()
+                    self._lookups.clear()
+                    self._expires_at = time.monotonic() + self.ttl
+        return self._codes
+
+    def get(self, code, now=None, check_window=True):
+        """
+        Return the CompiledPromo for an active code valid at ``now``, or None.
+        ``check_window=False`` skips the validity window (for intents that
+        were priced while the code was still valid).
+        """
+        if not code:
+            return None
+        code = code.strip().upper()
+        codes = self._codes_map()
+        if code in codes:
+            prometheus.cache_lookup('promo', True)
+            promo = codes[code]
+        else:
+            promo = self._lookup(code)
+        if promo is None:
+            return None
+        if check_window and not promo.is_valid_at(now or timezone.now()):
+            return None
+        return promo
+
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        self._expires_at = 0.0
+
+    def evict(self, code):
+        """Drop one code (e.g. after its usage count changed); the next lookup reads it again"""
+        code = code.strip().upper()
+        with self._lock:
+            if code in self._codes:
+                self._codes = {key: promo for key, promo in self._codes.items() if key != code}
+            self._lookups.pop(code, None)
+
+
+engine = PromoEngine(ttl=settings.PROMO_CACHE_TTL)
+
+
+@receiver(post_save, sender=PromoCode)
+@receiver(post_delete, sender=PromoCode)
+def invalidate_on_promo_change(sender, **kwargs):
+    engine.invalidate()
+
+
+@receiver(m2m_changed, sender=PromoCode.applicable_products.through)
+def invalidate_on_applicability_change(sender, **kwargs):
+    engine.invalidate()
@@ -0,0 +1,119 @@
+"""
+Promo code usage and redemption ledger.
+
+A use is reserved when the payment intent is created, before the customer
+is charged the discounted amount: ``reserve_use`` is a single conditional
+``$inc`` on the promo code document (``used_count < usage_limit``), so
+concurrent checkouts can't go over the limit and no locks are needed. The
+use travels with the checkout's stock reservation (``orders.reservations``)
+and is given back with ``release_use`` if the hold is cancelled or expires.
+
+At fulfillment the code is redeemed once per payment intent. Every attempt
+is recorded in ``promo_redemptions`` keyed by payment intent ID, which makes
+webhook retries idempotent: a second attempt returns the first outcome
+without touching the counter again. A use that was reserved is only
+recorded; one whose hold expired before payment is counted again then.
+"""
+import logging
+from django.utils import timezone
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+from utils.mongo import get_db
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'promo_redemptions'
+
+PENDING = 'pending'
+REDEEMED = 'redeemed'
+REJECTED = 'rejected'
+
+INDEXES = [
+    IndexModel([('promo_id', 1), ('created_at', -1)], name='promo_created_at'),
+]
+
+_indexes_ready = False
+
+
+def get_collection():
+    """Return the ledger collection, creating its indexes once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+_WITHIN_LIMIT = [
+    {'usage_limit': None},
+    {'usage_limit': 0},
+    {'$expr': {'$lt': ['$used_count', '$usage_limit']}},
+]
+
+
+def _forget_cached(code):
+    # The in-process engine caches used_count; reload this code on next use
+    from .promotions import engine
+    engine.evict(code)
+
+
+def reserve_use(promo):
+    """Count one use of ``promo`` if it is under its usage limit. Returns True if counted."""
+    result = get_db()['promo_codes'].update_one(
+        {'id': promo.id, '$or': _WITHIN_LIMIT},
+        {'$inc': {'used_count': 1}}
+    )
+    _forget_cached(promo.code)
+    return result.modified_count == 1
+
+
+def release_use(promo_id, code):
+    """Give back a use reserved by ``reserve_use`` (cancelled or expired checkout)"""
+    get_db()['promo_codes'].update_one(
+        {'id': promo_id, 'used_count': {'$gt': 0}},
+        {'$inc': {'used_count': -1}}
+    )
+    _forget_cached(code)
+
+
+def _outcome(record):
+    # A pending record belongs to an attempt that is running (or crashed after
+    # counting); treat it as redeemed rather than counting the code twice
+    return record['status'] != REJECTED
+
+
+def redeem(promo, payment_intent_id, user_id, order_id=None, discount=None, reserved=False):
+    """
+    Redeem ``promo`` (a CompiledPromo or PromoCode) for a payment intent.
+
+    ``reserved`` means the checkout's reservation already counted the use.
+    Returns True if the redemption counts (now or in an earlier attempt) and
+    False if the usage limit was already reached.
+    """
+    ledger = get_collection()
+    existing = ledger.find_one({'_id': payment_intent_id}, {'status': 1})
+    if existing:
+        return _outcome(existing)
+
+    now = timezone.now()
+    try:
+        ledger.insert_one({
+            '_id': payment_intent_id,
+            'promo_id': promo.id,
+            'code': promo.code,
+            'user_id': str(user_id),
+            'order_id': order_id,
+            'discount': str(discount) if discount is not None else None,
+            'status': PENDING,
+            'created_at': now,
+        })
+    except DuplicateKeyError:
+        return _outcome(ledger.find_one({'_id': payment_intent_id}, {'status': 1}))
+
+    status = REDEEMED if reserved or reserve_use(promo) else REJECTED
+
+    ledger.update_one({'_id': payment_intent_id}, {'$set': {'status': status, 'redeemed_at': timezone.now()}})
+    if status == REJECTED:
+        logger.warning(f'Promo code {promo.code} reached its usage limit; not redeemed for {payment_intent_id}')
+    return status == REDEEMED
@@ -0,0 +1,166 @@
+"""
+Time-limited stock reservations taken when a payment intent is created.
+
+Each reservation is one document in ``stock_reservations``. Creating it takes
+keys from the ``(product, region)`` counters in ``products.inventory`` (one
+conditional ``$inc`` per line, O(1) per line), so concurrent buyers can't both
+hold the last keys. The quote's promo code use is reserved with the stock
+(``orders.redemptions.reserve_use``). A successful payment converts the hold
+into an allocation; failed, cancelled or expired holds are released and their
+stock and promo use are returned.
+
+Expired holds are released by ``release_expired``: one per checkout, so the
+request path does a bounded amount of work, and in batches by the
+``release_expired_reservations`` command (run it from cron to clear a
+backlog). A TTL index on ``purge_at`` removes finished documents some time
+after they expire.
+"""
+import logging
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from pymongo import IndexModel, ReturnDocument
+from products.inventory import decrement_stock, increment_stock
+from utils.mongo import get_db
+from . import redemptions
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = 'stock_reservations'
+
+HELD = 'held'
+CONVERTED = 'converted'
+RELEASED = 'released'
+
+INDEXES = [
+    IndexModel('purge_at', expireAfterSeconds=0, name='purge_at_ttl'),
+    IndexModel([('status', 1), ('expires_at', 1)], name='status_expires_at'),
+]
+
+_indexes_ready = False
+
+
+class InsufficientStock(Exception):
+    """Raised when a cart line can't be reserved"""
+
+    def __init__(self, product_title):
+        self.product_title = product_title
+        super().__init__(f'Insufficient stock for {product_title}')
+
+
+class PromoLimitReached(Exception):
+    """Raised when the quote's promo code has no uses left"""
+
+    def __init__(self, code):
+        self.code = code
+        super().__init__(f'Promo code {code} has reached its usage limit')
+
+
+def get_collection():
+    """Return the reservations collection, creating its indexes once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+def _restock(lines):
+    for line in lines:
+        increment_stock(line['product_id'], line['region'], line['quantity'])
+
+
+def _return_holds(reservation):
+    _restock(reservation['lines'])
+    if reservation.get('promo_id'):
+        redemptions.release_use(reservation['promo_id'], reservation['promo_code'])
+
+
+def reserve(quote, user_id, reservation_id=None):
+    """
+    Hold stock for every line of a priced quote, and one use of its promo code.
+
+    Returns the reservation ID. Raises InsufficientStock if one of the lines
+    can't be covered, or PromoLimitReached if the code has no uses left
+    (after returning any units already held).
+    """
+    reservation_id = reservation_id or uuid.uuid4().hex
+    held = []
+
+    for line in quote.lines:
+        entry = {'product_id': line.product.pk, 'region': line.product.region, 'quantity': line.quantity}
+        if decrement_stock(entry['product_id'], entry['region'], entry['quantity']) is None:
+            _restock(held)
+            raise InsufficientStock(line.product.title)
+        held.append(entry)
+
+    promo_id = quote.promo.id if quote.promo else None
+    if promo_id is not None and not redemptions.reserve_use(quote.promo):
+        _restock(held)
+        raise PromoLimitReached(quote.promo.code)
+
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.STOCK_RESERVATION_TTL)
+    get_collection().insert_one({
+        '_id': reservation_id,
+        'user_id': str(user_id),
+        'lines': held,
+        'promo_id': promo_id,
+        'promo_code': quote.promo.code if quote.promo else None,
+        'status': HELD,
+        'created_at': now,
+        'expires_at': expires_at,
+        'purge_at': expires_at + timedelta(seconds=settings.STOCK_RESERVATION_PURGE_AFTER),
+    })
+    return reservation_id
+
+
+def convert(reservation_id):
+    """
+    Turn a held reservation into an allocation.
+
+    Returns the reservation document, or None if it doesn't exist or was
+    already released/converted (the caller must then take stock itself).
+    """
+    if not reservation_id:
+        return None
+    return get_collection().find_one_and_update(
+        {'_id': reservation_id, 'status': HELD},
+        {'$set': {'status': CONVERTED, 'converted_at': timezone.now()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def release(reservation_id):
+    """Release a held reservation and return its stock and promo use. Returns True if released."""
+    if not reservation_id:
+        return False
+    reservation = get_collection().find_one_and_update(
+        {'_id': reservation_id, 'status': HELD},
+        {'$set': {'status': RELEASED, 'released_at': timezone.now()}}
+    )
+    if reservation is None:
+        return False
+    _return_holds(reservation)
+    return True
+
+
+def release_expired(limit=100):
+    """Release up to ``limit`` expired holds. Returns the number released."""
+    collection = get_collection()
+    released = 0
+    while released < limit:
+        reservation = collection.find_one_and_update(
+            {'status': HELD, 'expires_at': {'$lte': timezone.now()}},
+            {'$set': {'status': RELEASED, 'released_at': timezone.now()}}
+        )
+        if reservation is None:
+            break
+        _return_holds(reservation)
+        released += 1
+
+    if released:
+        logger.info(f'Released {released} expired stock reservation(s)')
+    return released
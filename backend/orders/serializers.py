@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from products.serializers import ProductSerializer
 from .models import Order, OrderItem, DigitalKey, PromoCode
+from .bulk_promos import PromoGenerationError, check_code_space
 
 
 class DigitalKeySerializer(serializers.ModelSerializer):
@@ -38,3 +39,28 @@ class PromoCodeSerializer(serializers.ModelSerializer):
         read_only_fields = ('created_at', 'used_count')
 
 
+
+
+class BulkPromoCodeSerializer(serializers.Serializer):
+    """Parameters for generating a campaign of single-use promo codes"""
+    count = serializers.IntegerField(min_value=1, max_value=1000000)
+    campaign = serializers.CharField(max_length=100)
+    prefix = serializers.CharField(max_length=20, required=False, default='')
+    length = serializers.IntegerField(min_value=8, max_value=30, required=False, default=12)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    discount_type = serializers.ChoiceField(choices=PromoCode.DISCOUNT_TYPE_CHOICES)
+    discount_value = serializers.DecimalField(max_digits=10, decimal_places=2)
+    min_purchase = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, default=0)
+    max_discount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True, default=None)
+    valid_until = serializers.DateTimeField()
+    usage_limit = serializers.IntegerField(min_value=1, required=False, default=1)
+
+    def validate_prefix(self, value):
+        return value.strip().upper()
+
+    def validate(self, data):
+        try:
+            check_code_space(data['count'], data['length'], data['prefix'])
+        except PromoGenerationError as e:
+            raise serializers.ValidationError({'length': str(e)})
+        return data
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase
+from . import redemptions
+
+
+class PromoUseTests(SimpleTestCase):
+    def setUp(self):
+        self.promo_codes = mock.Mock()
+        patchers = [
+            mock.patch.object(redemptions, 'get_db', return_value={'promo_codes': self.promo_codes}),
+            mock.patch.object(redemptions, '_forget_cached'),
+        ]
+        self.forget_cached = [patcher.start() for patcher in patchers][1]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.promo = SimpleNamespace(id=7, code='SAVE10')
+
+    def test_reserve_is_conditional_on_the_usage_limit(self):
+        self.promo_codes.update_one.return_value = mock.Mock(modified_count=1)
+        self.assertTrue(redemptions.reserve_use(self.promo))
+        query, update = self.promo_codes.update_one.call_args[0]
+        self.assertEqual(query['id'], 7)
+        self.assertIn({'$expr': {'$lt': ['$used_count', '$usage_limit']}}, query['$or'])
+        self.assertEqual(update, {'$inc': {'used_count': 1}})
+        self.forget_cached.assert_called_once_with('SAVE10')
+
+    def test_exhausted_code_is_not_counted(self):
+        self.promo_codes.update_one.return_value = mock.Mock(modified_count=0)
+        self.assertFalse(redemptions.reserve_use(self.promo))
+
+    def test_release_never_goes_below_zero(self):
+        redemptions.release_use(7, 'SAVE10')
+        query, update = self.promo_codes.update_one.call_args[0]
+        self.assertEqual(query, {'id': 7, 'used_count': {'$gt': 0}})
+        self.assertEqual(update, {'$inc': {'used_count': -1}})
+        self.forget_cached.assert_called_once_with('SAVE10')
+
+
+class BulkPromoExportTests(SimpleTestCase):
+    """The bulk endpoint inserts every code before it answers"""
+
+    def post(self, campaign='spring'):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from admin_panel import views
+
+        request = APIRequestFactory().post('/', {
+            'count': 3, 'campaign': campaign, 'discount_type': 'percentage',
+            'discount_value': '10', 'valid_until': '2030-01-01T00:00:00Z',
+        }, format='json')
+        force_authenticate(request, user=SimpleNamespace(is_authenticated=True, role='admin'))
+        return views.bulk_create_promo_codes(request)
+
+    def test_failed_chunk_removes_the_codes_already_written(self):
+        def chunks(*args, **kwargs):
+            yield ['A', 'B']
+            raise RuntimeError('insert failed')
+
+        with mock.patch('admin_panel.views.create_codes', side_effect=chunks), \
+                mock.patch('admin_panel.views.delete_codes') as delete_codes:
+            with self.assertRaises(RuntimeError):
+                self.post()
+        delete_codes.assert_called_once_with([['A', 'B']])
+
+    def test_campaign_name_cannot_break_the_header(self):
+        with mock.patch('admin_panel.views.create_codes', return_value=iter([['A']])):
+            response = self.post('x"\r\nSet-Cookie: a=b')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="promo-codes-xSet-Cookie_ab.csv"')
+        self.assertEqual(b''.join(response.streaming_content), b'code,campaign\nA,"x""\r\nSet-Cookie: a=b"\n')
@@ -0,0 +1,164 @@
+"""
+Idempotent payment intent creation.
+
+Checkout requests are keyed by the client's ``Idempotency-Key`` header or,
+when it is missing, by a hash of the user and cart. The first request claims
+the key in the short-lived ``payment_intent_keys`` collection (TTL-indexed on
+``expires_at``) and stores the created intent; repeats get the cached client
+secret back without another Stripe round trip. A repeat that arrives while
+the first request is still running is refused at once (409 with
+``Retry-After``) instead of holding a worker until it finishes. The key is
+also passed to Stripe so retried API calls can't create a second intent.
+"""
+import hashlib
+import json
+import uuid
+from datetime import timedelta
+import stripe
+from django.conf import settings
+from django.utils import timezone
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+from utils import prometheus, tracing
+from utils.mongo import get_db
+
+COLLECTION = 'payment_intent_keys'
+
+PENDING = 'pending'
+READY = 'ready'
+
+# Seconds a client is told to wait before repeating an in-progress checkout
+RETRY_AFTER = 1
+
+INDEXES = [
+    IndexModel('expires_at', expireAfterSeconds=0, name='expires_at_ttl'),
+    IndexModel('payment_intent_id', name='payment_intent_id'),
+]
+
+_indexes_ready = False
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is in use by another request or was used for a different cart"""
+
+
+class CheckoutInProgress(IdempotencyConflict):
+    """Raised when the request that claimed the key hasn't finished yet"""
+
+
+def get_stripe_client():
+    """
+    Return the Stripe client used to create intents.
+
+    Anything exposing ``PaymentIntent.create(**params)`` works, so tests can
+    pass a stub to ``create_intent`` or patch this function.
+    """
+    return stripe
+
+
+def get_collection():
+    """Return the idempotency collection, creating its indexes once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+def cart_fingerprint(items, promo_code):
+    """Stable hash of a cart, independent of line order"""
+    lines = sorted(
+        (str(item.get('productId')), str(item.get('quantity'))) for item in items
+    )
+    payload = json.dumps({'items': lines, 'promo': (promo_code or '').strip().upper()})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def resolve_key(user_id, header_key, fingerprint):
+    """
+    Return ``(key, derived)`` for a request. Client keys are scoped to the
+    user so two users can't collide on the same header value.
+    """
+    if header_key:
+        raw = f'{user_id}:key:{header_key.strip()}'
+        derived = False
+    else:
+        raw = f'{user_id}:cart:{fingerprint}'
+        derived = True
+    return hashlib.sha256(raw.encode()).hexdigest(), derived
+
+
+def claim(key, user_id, fingerprint, derived):
+    """
+    Claim a key for this request.
+
+    Returns None when the claim succeeded (the caller must create the intent),
+    or the cached response data when an earlier request already completed.
+    Raises IdempotencyConflict if the key belongs to a different cart, or
+    CheckoutInProgress if the earlier request is still running.
+    """
+    collection = get_collection()
+    now = timezone.now()
+    try:
+        collection.insert_one({
+            '_id': key,
+            'user_id': str(user_id),
+            'fingerprint': fingerprint,
+            'derived': derived,
+            'nonce': uuid.uuid4().hex,
+            'status': PENDING,
+            'created_at': now,
+            'expires_at': now + timedelta(seconds=settings.PAYMENT_INTENT_IDEMPOTENCY_TTL),
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+
+    record = collection.find_one({'_id': key})
+    if record is None:
+        # The earlier request failed and gave the key back; try again
+        return claim(key, user_id, fingerprint, derived)
+    if record['fingerprint'] != fingerprint:
+        raise IdempotencyConflict('Idempotency-Key was already used for a different cart')
+    if record['status'] == READY:
+        return record['response']
+    raise CheckoutInProgress('A checkout with this key is already in progress')
+
+
+def complete(key, payment_intent_id, response):
+    """Store the created intent so repeats can reuse it"""
+    get_collection().update_one(
+        {'_id': key},
+        {'$set': {'status': READY, 'payment_intent_id': payment_intent_id, 'response': response}}
+    )
+
+
+def abandon(key):
+    """Give a claimed key back after a failure so the client can retry"""
+    get_collection().delete_one({'_id': key, 'status': PENDING})
+
+
+def forget_intent(payment_intent_id):
+    """
+    Drop cart-derived keys for a finished intent, so buying the same cart
+    again starts a new checkout. Client-supplied keys are kept until they expire.
+    """
+    get_collection().delete_many({'payment_intent_id': payment_intent_id, 'derived': True})
+
+
+def stripe_idempotency_key(key):
+    """Key passed to Stripe for a claimed checkout"""
+    record = get_collection().find_one({'_id': key}, {'nonce': 1, 'derived': 1})
+    if record and record.get('derived'):
+        # Cart-derived keys repeat whenever the same cart is bought again, so
+        # scope them to this claim; Stripe keeps keys for 24 hours.
+        return f'{key}:{record["nonce"]}'
+    return key
+
+
+def create_intent(key, client=None, **params):
+    """Create a PaymentIntent, passing the idempotency key through to Stripe"""
+    client = client or get_stripe_client()
+    with prometheus.external_call('stripe', 'PaymentIntent.create'), tracing.span('stripe PaymentIntent.create'):
+        return client.PaymentIntent.create(idempotency_key=stripe_idempotency_key(key), **params)
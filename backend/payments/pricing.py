@@ -0,0 +1,156 @@
+"""
+Cart pricing shared by checkout and payment fulfillment
+"""
+import json
+from decimal import Decimal, ROUND_HALF_UP
+from products.models import Product
+from orders.promotions import engine as promo_engine
+
+TAX_RATE = Decimal('0.10')  # 10% tax
+CENT = Decimal('0.01')
+
+# Quote totals stored in payment intent metadata
+TOTAL_FIELDS = ('subtotal', 'tax', 'discount', 'total')
+
+
+class PricingError(Exception):
+    """Raised when a cart cannot be priced (unknown product, invalid quantity, promo limits)"""
+
+
+def to_money(value):
+    """Convert a price-like value to a Decimal rounded to cents"""
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def unit_price(product):
+    """Price of one unit after the product discount"""
+    price = to_money(product.price or 0)
+    discount = Decimal(product.discount or 0)
+    return to_money(price * (100 - discount) / 100)
+
+
+def load_products(product_ids):
+    """Load all products for a cart in a single $in query, keyed by string ID"""
+    from bson import ObjectId
+
+    object_ids = []
+    for product_id in set(str(pid) for pid in product_ids):
+        if ObjectId.is_valid(product_id):
+            object_ids.append(ObjectId(product_id))
+
+    if not object_ids:
+        return {}
+
+    return {str(product.pk): product for product in Product.objects.filter(pk__in=object_ids)}
+
+
+class PricedLine:
+    """A single priced cart line"""
+    __slots__ = ('product', 'quantity', 'unit_price', 'total')
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.unit_price = unit_price(product)
+        self.total = self.unit_price * quantity
+
+    @property
+    def product_id(self):
+        return str(self.product.pk)
+
+
+class Quote:
+    """Priced cart: lines, subtotal, promo discount, tax and total"""
+
+    def __init__(self, lines, promo=None):
+        self.lines = lines
+        self.promo = promo
+        self.subtotal = to_money(sum((line.total for line in lines), Decimal('0')))
+        self.discount = promo.discount_for(lines, self.subtotal) if promo else Decimal('0.00')
+        self.tax = to_money(self.subtotal * TAX_RATE)
+        self.total = to_money(self.subtotal + self.tax - self.discount)
+
+    @property
+    def amount_cents(self):
+        """Total in the smallest currency unit (for Stripe)"""
+        return int(self.total * 100)
+
+    def metadata_items(self):
+        """Cart lines in the compact form stored in payment intent metadata"""
+        return [
+            {'productId': line.product_id, 'quantity': line.quantity, 'price': str(line.unit_price)}
+            for line in self.lines
+        ]
+
+    def metadata_totals(self):
+        """Totals in payment intent metadata form, so fulfillment charges what was quoted"""
+        return {field: str(getattr(self, field)) for field in TOTAL_FIELDS}
+
+
+def price_cart(items, promo_code=None, strict=True, products=None):
+    """
+    Price a cart of ``{'productId': ..., 'quantity': ...}`` items.
+
+    In strict mode (checkout) unknown/inactive products and exhausted promo
+    codes raise PricingError. Non-strict mode (fulfillment of an already paid
+    intent) skips unknown products and does not re-check limits. Stock is not
+    checked here: the checkout reservation takes it atomically from the key
+    inventory counters.
+    ``products`` may be passed to reuse an already loaded ``{id: Product}`` map.
+    """
+    if products is None:
+        products = load_products(item.get('productId') for item in items)
+
+    lines = []
+    for item in items:
+        product_id = str(item.get('productId'))
+        try:
+            quantity = int(item.get('quantity', 0))
+        except (ValueError, TypeError):
+            quantity = 0
+
+        if quantity < 1:
+            if strict:
+                raise PricingError(f'Invalid quantity for product {product_id}')
+            continue
+
+        product = products.get(product_id)
+        if product is None or (strict and product.is_active is False):
+            if strict:
+                raise PricingError(f'Product {product_id} not found or inactive')
+            continue
+
+        lines.append(PricedLine(product, quantity))
+
+    # Evaluated against the in-memory promo map; no database access
+    promo = promo_engine.get(promo_code, check_window=strict)
+    if strict and promo and promo.is_exhausted:
+        raise PricingError('Promo code has reached usage limit')
+
+    return Quote(lines, promo)
+
+
+def quoted_cart(metadata):
+    """
+    The quote a payment intent was created with, from its metadata.
+
+    Products and the promo are loaded again, but unit prices and totals are
+    the ones the customer paid, even if a price or promo changed since.
+    Intents created before totals were stored get totals computed from their
+    quoted unit prices.
+    """
+    items = json.loads(metadata['orderItems'])
+    quote = price_cart(items, metadata.get('promoCode'), strict=False)
+
+    prices = {str(item.get('productId')): item.get('price') for item in items}
+    for line in quote.lines:
+        if prices.get(line.product_id) is not None:
+            line.unit_price = to_money(prices[line.product_id])
+            line.total = line.unit_price * line.quantity
+    if not all(metadata.get(field) for field in TOTAL_FIELDS):
+        return Quote(quote.lines, quote.promo)
+    for field in TOTAL_FIELDS:
+        setattr(quote, field, to_money(metadata[field]))
+    return quote
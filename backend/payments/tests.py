@@ -0,0 +1,144 @@
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase
+from pymongo.errors import DuplicateKeyError
+from . import intents
+
+
+class CartFingerprintTests(SimpleTestCase):
+    def test_ignores_line_order_and_promo_case(self):
+        first = intents.cart_fingerprint(
+            [{'productId': 'a', 'quantity': 1}, {'productId': 'b', 'quantity': 2}], 'save10'
+        )
+        second = intents.cart_fingerprint(
+            [{'productId': 'b', 'quantity': 2}, {'productId': 'a', 'quantity': 1}], ' SAVE10 '
+        )
+        self.assertEqual(first, second)
+
+    def test_changes_with_quantity(self):
+        self.assertNotEqual(
+            intents.cart_fingerprint([{'productId': 'a', 'quantity': 1}], None),
+            intents.cart_fingerprint([{'productId': 'a', 'quantity': 2}], None),
+        )
+
+
+class ResolveKeyTests(SimpleTestCase):
+    def test_client_keys_are_scoped_to_the_user(self):
+        key, derived = intents.resolve_key(1, 'abc', 'fingerprint')
+        other, _ = intents.resolve_key(2, 'abc', 'fingerprint')
+        self.assertFalse(derived)
+        self.assertNotEqual(key, other)
+
+    def test_missing_header_derives_the_key_from_the_cart(self):
+        key, derived = intents.resolve_key(1, None, 'fingerprint')
+        self.assertTrue(derived)
+        self.assertEqual(key, intents.resolve_key(1, '', 'fingerprint')[0])
+
+
+class ClaimTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        patcher = mock.patch.object(intents, 'get_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def duplicate(self, record):
+        self.collection.insert_one.side_effect = [DuplicateKeyError('duplicate'), None]
+        self.collection.find_one.return_value = record
+
+    def test_first_request_claims_the_key(self):
+        self.assertIsNone(intents.claim('key', 1, 'fingerprint', False))
+        document = self.collection.insert_one.call_args[0][0]
+        self.assertEqual((document['_id'], document['status']), ('key', intents.PENDING))
+
+    def test_completed_key_returns_the_cached_response(self):
+        self.duplicate({'fingerprint': 'fingerprint', 'status': intents.READY, 'response': {'paymentIntentId': 'pi_1'}})
+        self.assertEqual(intents.claim('key', 1, 'fingerprint', False), {'paymentIntentId': 'pi_1'})
+
+    def test_key_used_for_another_cart_conflicts(self):
+        self.duplicate({'fingerprint': 'other', 'status': intents.READY, 'response': {}})
+        with self.assertRaises(intents.IdempotencyConflict):
+            intents.claim('key', 1, 'fingerprint', False)
+
+    def test_in_flight_key_is_refused_without_waiting(self):
+        self.duplicate({'fingerprint': 'fingerprint', 'status': intents.PENDING})
+        with self.assertRaises(intents.CheckoutInProgress):
+            intents.claim('key', 1, 'fingerprint', False)
+        self.collection.find_one.assert_called_once()
+
+    def test_abandoned_key_is_claimed_again(self):
+        self.duplicate(None)
+        self.assertIsNone(intents.claim('key', 1, 'fingerprint', False))
+        self.assertEqual(self.collection.insert_one.call_count, 2)
+
+
+class CreateIntentTests(SimpleTestCase):
+    def create(self, record):
+        client = SimpleNamespace(PaymentIntent=mock.Mock())
+        collection = mock.Mock()
+        collection.find_one.return_value = record
+        with mock.patch.object(intents, 'get_collection', return_value=collection):
+            intents.create_intent('key', client=client, amount=100, currency='usd')
+        return client.PaymentIntent.create.call_args.kwargs
+
+    def test_client_key_is_passed_to_stripe(self):
+        params = self.create({'derived': False, 'nonce': 'n'})
+        self.assertEqual(params['idempotency_key'], 'key')
+        self.assertEqual(params['amount'], 100)
+
+    def test_derived_key_is_scoped_to_the_claim(self):
+        self.assertEqual(self.create({'derived': True, 'nonce': 'n'})['idempotency_key'], 'key:n')
+
+
+class FulfillmentFailureTests(SimpleTestCase):
+    """A failure after the order is claimed is undone so Stripe's retry starts over"""
+
+    def setUp(self):
+        from . import views
+
+        self.views = views
+        product = SimpleNamespace(pk='p1', region='EU', title='Game')
+        self.line = SimpleNamespace(product=product, quantity=2, unit_price=10)
+        quote = SimpleNamespace(lines=[self.line], promo=None, subtotal=20, tax=2, total=22, discount=0)
+        user = SimpleNamespace(id=1, email='a@example.com')
+        targets = {
+            'quoted_cart': mock.Mock(return_value=quote),
+            'Order': mock.Mock(),
+            'OrderItem': mock.Mock(),
+            'increment_stock': mock.Mock(),
+            'decrement_stock': mock.Mock(),
+            'reservations': mock.Mock(),
+            'fulfillment': mock.Mock(),
+            'repository': mock.Mock(),
+            'dashboard_metrics': mock.Mock(),
+        }
+        for name, value in targets.items():
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mocks = targets
+        targets['Order'].objects.filter.return_value.exists.return_value = False
+        targets['fulfillment'].claim_order.return_value = True
+        targets['repository'].claim_keys.return_value = [{'id': 5, 'encrypted_key': 'x'}, {'id': 6, 'encrypted_key': 'y'}]
+        targets['OrderItem'].objects.create.side_effect = RuntimeError('write failed')
+        patcher = mock.patch('accounts.models.User.objects')
+        patcher.start().get.return_value = user
+        self.addCleanup(patcher.stop)
+        self.intent = {'id': 'pi_1', 'metadata': {'userId': '1', 'reservationId': 'r1'}}
+
+    def test_held_units_and_keys_are_given_back(self):
+        self.mocks['reservations'].convert.return_value = {'_id': 'r1'}
+        with self.assertRaises(RuntimeError):
+            self.views.handle_successful_payment(self.intent)
+        self.mocks['increment_stock'].assert_called_once_with('p1', 'EU', 2)
+        order, key_ids = self.mocks['fulfillment'].release_order.call_args[0]
+        self.assertEqual(key_ids, [5, 6])
+        self.mocks['dashboard_metrics'].record_order_fulfilled.assert_not_called()
+
+    def test_units_taken_after_an_expired_hold_are_given_back(self):
+        self.mocks['reservations'].convert.return_value = None
+        self.mocks['decrement_stock'].return_value = 3
+        with self.assertRaises(RuntimeError):
+            self.views.handle_successful_payment(self.intent)
+        self.mocks['increment_stock'].assert_called_once_with('p1', 'EU', 2)
+        self.mocks['fulfillment'].release_order.assert_called_once()
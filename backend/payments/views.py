@@ -8,10 +8,15 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from products.models import Product
-from orders.models import Order, OrderItem, DigitalKey, PromoCode
-from utils.encryption import encrypt_key
+from orders.models import Order, OrderItem
+from orders import fulfillment, reservations, redemptions
+from products.inventory import decrement_stock, increment_stock
+from admin_panel import metrics as dashboard_metrics
+from utils import prometheus, repository, tracing
+from utils.encryption import encrypt_key, decrypt_key
 from utils.email import send_digital_keys_email, send_order_confirmation_email
+from . import intents
+from .pricing import price_cart, quoted_cart, PricingError
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
@@ -29,72 +34,75 @@ def create_payment_intent(request):
             'message': 'Cart items are required'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Calculate totals
-    subtotal = 0
-    order_items = []
+    # Repeated requests (double-clicks, client retries) reuse the first intent
+    fingerprint = intents.cart_fingerprint(items, promo_code)
+    key, derived = intents.resolve_key(
+        request.user.id, request.headers.get('Idempotency-Key'), fingerprint
+    )
+    try:
+        cached = intents.claim(key, request.user.id, fingerprint, derived)
+    except intents.IdempotencyConflict as e:
+        headers = {'Retry-After': str(intents.RETRY_AFTER)} if isinstance(e, intents.CheckoutInProgress) else None
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_409_CONFLICT, headers=headers)
 
-    for item in items:
-        try:
-            product = Product.objects.get(id=item['productId'], is_active=True)
-        except Product.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': f"Product {item['productId']} not found or inactive"
-            }, status=status.HTTP_400_BAD_REQUEST)
+    if cached is not None:
+        return Response({
+            'success': True,
+            'data': cached
+        })
 
-        # Check stock
-        if product.stock < item['quantity']:
-            return Response({
-                'success': False,
-                'message': f'Insufficient stock for {product.title}'
-            }, status=status.HTTP_400_BAD_REQUEST)
+    response = _start_checkout(request, items, promo_code, key)
+    if response.status_code == status.HTTP_200_OK:
+        data = response.data['data']
+        intents.complete(key, data['paymentIntentId'], data)
+    else:
+        intents.abandon(key)
+    return response
 
-        item_price = float(product.price) * (1 - product.discount / 100)
-        item_total = item_price * item['quantity']
-        subtotal += item_total
 
-        order_items.append({
-            'product': str(product.id),
-            'quantity': item['quantity'],
-            'price': item_price
-        })
+def _start_checkout(request, items, promo_code, key):
+    """Price the cart, reserve stock and create the Stripe payment intent"""
+    try:
+        quote = price_cart(items, promo_code)
+    except PricingError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
 
-    # Apply promo code if provided
-    discount = 0
-    if promo_code:
-        try:
-            promo = PromoCode.objects.get(
-                code=promo_code.upper(),
-                is_active=True
-            )
-            
-            if promo.usage_limit and promo.used_count >= promo.usage_limit:
-                return Response({
-                    'success': False,
-                    'message': 'Promo code has reached usage limit'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            if subtotal >= float(promo.min_purchase):
-                if promo.discount_type == 'percentage':
-                    discount = (subtotal * float(promo.discount_value)) / 100
-                    if promo.max_discount:
-                        discount = min(discount, float(promo.max_discount))
-                else:
-                    discount = float(promo.discount_value)
-        except PromoCode.DoesNotExist:
-            pass
-
-    tax = subtotal * 0.1  # 10% tax
-    total = subtotal + tax - discount
+    # Return one abandoned checkout's stock per checkout: each checkout takes
+    # at most one hold, so this keeps pace with abandonment at a bounded cost.
+    # The release_expired_reservations command clears any backlog.
+    try:
+        reservations.release_expired(limit=1)
+    except Exception as e:
+        print(f'Error releasing expired reservations: {e}')
+
+    try:
+        reservation_id = reservations.reserve(quote, request.user.id)
+    except (reservations.InsufficientStock, reservations.PromoLimitReached) as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
 
     # Create payment intent
     try:
-        payment_intent = stripe.PaymentIntent.create(
-            amount=int(total * 100),  # Convert to cents
+        payment_intent = intents.create_intent(
+            key,
+            amount=quote.amount_cents,
             currency='usd',
             metadata={
                 'userId': str(request.user.id),
-                'orderItems': json.dumps(order_items)
+                'orderItems': json.dumps(quote.metadata_items()),
+                'promoCode': quote.promo.code if quote.promo else '',
+                'reservationId': reservation_id,
+                **quote.metadata_totals(),
+                # Fulfillment (in the webhook) continues the checkout's trace
+                'traceId': tracing.current_trace_id() or ''
             }
         )
 
@@ -103,10 +111,12 @@ def create_payment_intent(request):
             'data': {
                 'clientSecret': payment_intent.client_secret,
                 'paymentIntentId': payment_intent.id,
-                'amount': total
+                'amount': float(quote.total),
+                'reservationExpiresIn': settings.STOCK_RESERVATION_TTL
             }
         })
     except Exception as e:
+        reservations.release(reservation_id)
         return Response({
             'success': False,
             'message': str(e)
@@ -130,9 +140,23 @@ def stripe_webhook(request):
         return HttpResponse(status=400)
 
     # Handle the event
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        handle_successful_payment(payment_intent)
+    with prometheus.webhook(event['type']):
+        if event['type'] == 'payment_intent.succeeded':
+            payment_intent = event['data']['object']
+            with tracing.trace(
+                'fulfillment',
+                trace_id=payment_intent['metadata'].get('traceId') or None,
+                webhook_trace_id=tracing.current_trace_id(),
+                payment_intent_id=payment_intent['id'],
+            ):
+                handle_successful_payment(payment_intent)
+            intents.forget_intent(payment_intent['id'])
+        elif event['type'] == 'payment_intent.canceled':
+            # Failed attempts can be retried on the same intent, so only a cancelled
+            # intent releases its hold early; otherwise it expires on its own
+            payment_intent = event['data']['object']
+            reservations.release(payment_intent['metadata'].get('reservationId'))
+            intents.forget_intent(payment_intent['id'])
 
     return JsonResponse({'received': True})
 
@@ -142,7 +166,6 @@ def handle_successful_payment(payment_intent):
     from accounts.models import User
     
     user_id = payment_intent['metadata']['userId']
-    order_items_data = json.loads(payment_intent['metadata']['orderItems'])
 
     try:
         user = User.objects.get(id=user_id)
@@ -150,63 +173,119 @@ def handle_successful_payment(payment_intent):
         print(f'User {user_id} not found')
         return
 
-    # Calculate totals
-    subtotal = 0
-    populated_items = []
+    # Stripe retries webhooks; an intent is only fulfilled once
+    if Order.objects.filter(payment_intent_id=payment_intent['id']).exists():
+        return
+
+    # The prices and totals quoted at checkout (products loaded in one query)
+    quote = quoted_cart(payment_intent['metadata'])
+
+    # Claim the intent before touching stock: a concurrent delivery of the same
+    # event loses on the unique payment_intent_id index and stops here
+    order = Order(
+        user=user,
+        payment_intent_id=payment_intent['id'],
+        payment_status='succeeded',
+        status='processing',
+        subtotal=quote.subtotal,
+        tax=quote.tax,
+        total=quote.total,
+        promo_code_id=quote.promo.id if quote.promo else None,
+        discount=quote.discount,
+        keys_delivered=False
+    )
+    if not fulfillment.claim_order(order):
+        return
 
-    for item_data in order_items_data:
+    # A failure from here on is undone (keys, stock, items and the order row)
+    # and re-raised, so Stripe's retry of this webhook (it gets a 500) claims
+    # and fulfills the order from scratch instead of finding it claimed
+    owed = {}
+    key_ids = []
+    try:
+        keys_for_email = _fulfill_order(
+            order, user, quote, payment_intent['metadata'].get('reservationId'), owed, key_ids
+        )
+    except Exception:
         try:
-            product = Product.objects.get(id=item_data['productId'])
-        except Product.DoesNotExist:
-            continue
+            for line in owed.values():
+                increment_stock(line.product.pk, line.product.region, line.quantity)
+            fulfillment.release_order(order, key_ids)
+        except Exception as e:
+            print(f'Error undoing fulfillment of {payment_intent["id"]}: {e}')
+        raise
 
-        item_price = float(product.price) * (1 - product.discount / 100)
-        item_total = item_price * item_data['quantity']
-        subtotal += item_total
+    # Keep the admin dashboard totals and time series up to date
+    try:
+        dashboard_metrics.record_order_fulfilled(order)
+    except Exception as e:
+        print(f'Error updating dashboard metrics: {e}')
 
-        # Find available digital keys
-        available_keys = DigitalKey.objects.filter(
-            product=product,
-            is_used=False,
-            order__isnull=True,
-            region=product.region
-        )[:item_data['quantity']]
+    # Send email with keys
+    if keys_for_email:
+        try:
+            send_digital_keys_email(user.email, order.id, keys_for_email)
+            send_order_confirmation_email(user.email, order.id, quote.total)
+            order.keys_delivered = True
+            order.save()
+        except Exception as e:
+            print(f'Error sending email: {e}')
 
-        if available_keys.count() < item_data['quantity']:
-            print(f'Insufficient keys for product {product.title}')
-            continue
 
-        # Mark keys as used
-        key_to_assign = available_keys.first()
-        for key in available_keys:
-            key.is_used = True
-            key.save()
+def _fulfill_order(order, user, quote, reservation_id, owed, key_ids):
+    """
+    Take stock and keys for a claimed order, create its items and complete it.
+    Returns the decrypted keys to email.
+
+    Fills ``owed`` (quote line index -> line whose units were taken from the
+    inventory counters) and ``key_ids`` (claimed keys) as it goes, so the
+    caller can give them back if anything fails.
+    """
+    populated_items = []
+
+    # Keys were held when the intent was created
+    reservation = reservations.convert(reservation_id)
+    if reservation is not None:
+        owed.update(enumerate(quote.lines))
+
+    for index, line in enumerate(quote.lines):
+        product = line.product
+
+        # Keys were taken from the inventory counter when the reservation was
+        # created; if the hold expired in the meantime, take them now
+        if reservation is None:
+            if decrement_stock(product.pk, product.region, line.quantity) is None:
+                print(f'Insufficient keys for product {product.title}')
+                continue
+            owed[index] = line
+
+        # Claim unused keys atomically (native find_one_and_update per key)
+        claimed_keys = repository.claim_keys(product.pk, product.region, line.quantity, user.id)
+
+        if len(claimed_keys) < line.quantity:
+            print(f'Key inventory counter for {product.title} is ahead of its keys')
+            repository.release_keys([key['id'] for key in claimed_keys])
+            # Give back the units this line took (held or just decremented)
+            increment_stock(product.pk, product.region, line.quantity)
+            del owed[index]
+            continue
 
+        key_ids.extend(key['id'] for key in claimed_keys)
         populated_items.append({
             'product': product,
-            'quantity': item_data['quantity'],
-            'price': item_price,
-            'digital_key': key_to_assign
+            'quantity': line.quantity,
+            'price': line.unit_price,
+            'digital_key': claimed_keys[0],
+            'key_ids': [key['id'] for key in claimed_keys]
         })
 
-        # Update product stock
-        product.stock -= item_data['quantity']
-        product.save()
-
-    tax = subtotal * 0.1
-    total = subtotal + tax
-
-    # Create order
-    order = Order.objects.create(
-        user=user,
-        payment_intent_id=payment_intent['id'],
-        payment_status='succeeded',
-        status='completed',
-        subtotal=subtotal,
-        tax=tax,
-        total=total,
-        keys_delivered=False
-    )
+    # Record the promo redemption; the use was counted with the stock hold at
+    # checkout (and is counted again here only if that hold expired)
+    if quote.promo:
+        redemptions.redeem(
+            quote.promo, order.payment_intent_id, user.id, order_id=order.id, discount=quote.discount,
+            reserved=bool(reservation and reservation.get('promo_id') == quote.promo.id)
+        )
 
     # Create order items and assign keys
     keys_for_email = []
@@ -216,18 +295,16 @@ def handle_successful_payment(payment_intent):
             product=item_data['product'],
             quantity=item_data['quantity'],
             price=item_data['price'],
-            digital_key=item_data['digital_key']
+            digital_key_id=item_data['digital_key']['id']
         )
         
-        # Update key with order and user
+        # Attach the claimed keys to the order (one update)
         if item_data['digital_key']:
-            item_data['digital_key'].order = order
-            item_data['digital_key'].user = user
-            item_data['digital_key'].save()
+            repository.assign_keys(item_data['key_ids'], order.id)
             
             # Decrypt key for email
             try:
-                decrypted_key = decrypt_key(item_data['digital_key'].encrypted_key)
+                decrypted_key = decrypt_key(item_data['digital_key']['encrypted_key'])
                 keys_for_email.append({
                     'productName': item_data['product'].title,
                     'key': decrypted_key
@@ -235,15 +312,9 @@ def handle_successful_payment(payment_intent):
             except Exception as e:
                 print(f'Error decrypting key for email: {e}')
 
-    # Send email with keys
-    if keys_for_email:
-        try:
-            send_digital_keys_email(user.email, order.id, keys_for_email)
-            send_order_confirmation_email(user.email, order.id, total)
-            order.keys_delivered = True
-            order.save()
-        except Exception as e:
-            print(f'Error sending email: {e}')
+    order.status = 'completed'
+    order.save(update_fields=['status', 'updated_at'])
+    return keys_for_email
 
 
 @api_view(['POST'])
@@ -259,7 +330,8 @@ def verify_payment(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        with prometheus.external_call('stripe', 'PaymentIntent.retrieve'), tracing.span('stripe PaymentIntent.retrieve'):
+            payment_intent = stripe.PaymentIntent.retrieve(payment_intent_id)
 
         if payment_intent.status != 'succeeded':
             return Response({
@@ -0,0 +1,107 @@
+"""
+Product archival (soft delete) and batched hard purge.
+
+Deleting a product through the ORM makes Django's collector walk reviews,
+digital keys, order items and promo links one document at a time, and it
+takes the order history with it. Instead, ``archive`` is a single update that
+stamps ``archived_at`` and deactivates the product, so it leaves the catalog
+immediately and stays resolvable from past orders.
+
+``purge`` (run from the ``purge_archived_products`` command) hard-deletes
+archived products later with native ``delete_many`` calls per collection,
+in ``_id`` batches so huge key pools don't turn into one long-running
+delete. Sold keys and order items are never removed; a product that still
+has them keeps its (archived) document.
+"""
+from bson import ObjectId
+from django.utils import timezone
+from orders.models import DigitalKey, OrderItem, PromoCode
+from .inventory import COLLECTION as KEY_INVENTORY_COLLECTION
+from .models import Product, Review
+from utils.mongo import get_db
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _object_id(product_id):
+    return product_id if isinstance(product_id, ObjectId) else ObjectId(str(product_id))
+
+
+def archive(product_id):
+    """Archive (soft-delete) a product. Returns False if it doesn't exist or is already archived."""
+    now = timezone.now()
+    result = get_db()[Product._meta.db_table].update_one(
+        {'_id': _object_id(product_id), 'archived_at': None},
+        {'$set': {'archived_at': now, 'is_active': False, 'updated_at': now}}
+    )
+    return result.modified_count == 1
+
+
+def restore(product_id):
+    """Bring an archived product back (inactive, so it can be reviewed before reactivating)"""
+    result = get_db()[Product._meta.db_table].update_one(
+        {'_id': _object_id(product_id), 'archived_at': {'$ne': None}},
+        {'$set': {'archived_at': None, 'updated_at': timezone.now()}}
+    )
+    return result.modified_count == 1
+
+
+def _delete_in_batches(collection, query, batch_size):
+    """delete_many over ``query`` in ``_id`` batches. Returns the number of deleted documents."""
+    deleted = 0
+    while True:
+        ids = [document['_id'] for document in collection.find(query, {'_id': 1}).limit(batch_size)]
+        if not ids:
+            return deleted
+        deleted += collection.delete_many({'_id': {'$in': ids}}).deleted_count
+
+
+def purge_product(product_id, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Hard-delete an archived product's dependent data and, if no order
+    references it, the product itself. Returns per-collection delete counts.
+    """
+    db = get_db()
+    product_id = _object_id(product_id)
+    promo_links = PromoCode.applicable_products.through._meta.db_table
+
+    counts = {
+        # Unsold keys only; sold keys belong to order history
+        'digital_keys': _delete_in_batches(
+            db[DigitalKey._meta.db_table], {'product_id': product_id, 'order_id': None}, batch_size
+        ),
+        'reviews': _delete_in_batches(db[Review._meta.db_table], {'product_id': product_id}, batch_size),
+        promo_links: db[promo_links].delete_many({'product_id': product_id}).deleted_count,
+        KEY_INVENTORY_COLLECTION: db[KEY_INVENTORY_COLLECTION].delete_many({'product_id': product_id}).deleted_count,
+        'products': 0,
+    }
+
+    referenced = (
+        db[OrderItem._meta.db_table].find_one({'product_id': product_id}, {'_id': 1})
+        or db[DigitalKey._meta.db_table].find_one({'product_id': product_id}, {'_id': 1})
+    )
+    if not referenced:
+        counts['products'] = db[Product._meta.db_table].delete_one(
+            {'_id': product_id, 'archived_at': {'$ne': None}}
+        ).deleted_count
+    return counts
+
+
+def purge(older_than, batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """
+    Purge every product archived before ``older_than``. Returns
+    ``(products examined, totals per collection)``.
+    """
+    cursor = get_db()[Product._meta.db_table].find(
+        {'archived_at': {'$ne': None, '$lt': older_than}}, {'_id': 1}
+    )
+    if limit:
+        cursor = cursor.limit(limit)
+
+    examined = 0
+    totals = {}
+    for document in cursor:
+        examined += 1
+        for collection, count in purge_product(document['_id'], batch_size=batch_size).items():
+            totals[collection] = totals.get(collection, 0) + count
+    return examined, totals
@@ -0,0 +1,89 @@
+"""
+Bulk product updates by filter.
+
+A seasonal sale (say 20% off every RPG) is one ``update_many`` on the
+products collection instead of a PATCH per product. The filter uses the same
+parameters as the admin listing (``products.listing.build_match``) plus
+explicit product IDs. The patch is converted to db values through the model
+fields, and ``updated_at`` is bumped in the same write.
+
+``update_many`` bypasses ``post_save``, so ``products_bulk_updated`` is sent
+once per bulk update for anything that caches product data to invalidate.
+"""
+from bson import ObjectId
+from django.dispatch import Signal
+from django.utils import timezone
+from .listing import build_match
+from .models import Product
+from utils.mongo import get_db
+
+# Sent once after each bulk update with ``query``, ``fields`` (patched field
+# names) and ``count`` (documents matched)
+products_bulk_updated = Signal()
+
+# Patch key -> Product field
+PATCH_FIELDS = {
+    'price': 'price',
+    'discount': 'discount',
+    'isActive': 'is_active',
+    'featured': 'featured',
+}
+
+
+class BulkUpdateError(Exception):
+    """Raised for an empty patch or a filter that would match the whole catalog by accident"""
+
+
+def build_query(filters):
+    """MongoDB filter for listing-style filters plus an optional ``ids`` list"""
+    query = build_match(filters)
+    ids = filters.get('ids')
+    if ids:
+        query['_id'] = {'$in': [ObjectId(str(product_id)) for product_id in ids]}
+    return query
+
+
+def matches_catalog(query):
+    """
+    Whether ``query`` selects the whole live catalog: no filter besides the
+    archived default that ``build_match`` always adds
+    """
+    return set(query) <= {'archived_at'} and query.get('archived_at') is None
+
+
+def build_update(patch, now=None):
+    """``$set`` document for a patch of PATCH_FIELDS keys, db-prepared like an ORM save"""
+    from django.db import connection
+
+    update = {}
+    for key, field_name in PATCH_FIELDS.items():
+        if key in patch:
+            field = Product._meta.get_field(field_name)
+            update[field.column] = field.get_db_prep_save(patch[key], connection)
+    if not update:
+        raise BulkUpdateError(f'Patch at least one of: {", ".join(PATCH_FIELDS)}')
+
+    updated_at = Product._meta.get_field('updated_at')
+    update[updated_at.column] = updated_at.get_db_prep_save(now or timezone.now(), connection)
+    return update
+
+
+def bulk_update(filters, patch, allow_all=False):
+    """
+    Apply ``patch`` to every product matching ``filters`` with one update_many.
+
+    An empty filter is rejected unless ``allow_all`` is set. Returns
+    ``(matched, modified)`` counts.
+    """
+    query = build_query(filters)
+    if matches_catalog(query) and not allow_all:
+        raise BulkUpdateError('Refusing to update every product without "all": true')
+
+    update = build_update(patch)
+    result = get_db()[Product._meta.db_table].update_many(query, {'$set': update})
+
+    products_bulk_updated.send(
+        sender=Product, query=query, fields=[PATCH_FIELDS[key] for key in PATCH_FIELDS if key in patch],
+        count=result.matched_count
+    )
+    return result.matched_count, result.modified_count
@@ -0,0 +1,328 @@
+"""
+Streaming bulk product import/export (CSV or JSONL).
+
+Supplier feeds are parsed row by row, validated, and written as unordered
+``bulk_write`` upserts keyed on ``sku`` in chunks, so a feed with tens of
+thousands of rows never sits in memory and needs one round trip per chunk
+instead of one ORM save per product. Rows that fail validation, or that
+MongoDB rejects when their chunk is written, are reported with their row
+number and skipped; the rest of the feed is still imported. A feed that
+can't be read any further (bad encoding, malformed CSV) is reported at the
+row where it broke and the import stops there (``aborted`` in the report).
+
+Prices are the stored (base) prices, not the x3.2 display prices the API
+returns. The exporter writes the same columns, so an export can be edited and
+fed back in; archived products are left out unless asked for.
+"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+from pymongo import IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+from .models import Product
+from utils.mongo import get_db, model_document
+
+FORMATS = ('csv', 'jsonl')
+
+# Feed column -> Product field, in export order
+COLUMNS = {
+    'sku': 'sku',
+    'title': 'title',
+    'description': 'description',
+    'price': 'price',
+    'productType': 'product_type',
+    'platform': 'platform',
+    'region': 'region',
+    'category': 'category',
+    'images': 'images',
+    'featured': 'featured',
+    'discount': 'discount',
+    'isActive': 'is_active',
+}
+REQUIRED = ('sku', 'title', 'price', 'productType', 'platform', 'category')
+
+DEFAULT_CHUNK_SIZE = 1000
+# Errors kept in the import report; the total is always counted
+MAX_REPORTED_ERRORS = 100
+
+_CHOICES = {
+    'product_type': {value for value, _ in Product.PRODUCT_TYPE_CHOICES},
+    'platform': {value for value, _ in Product.PLATFORM_CHOICES},
+    'category': {value for value, _ in Product.CATEGORY_CHOICES},
+}
+
+COLLECTION = Product._meta.db_table
+INDEXES = [
+    # Partial so products without a SKU don't collide
+    IndexModel('sku', name='sku_unique', unique=True, partialFilterExpression={'sku': {'$gt': ''}}),
+]
+
+_indexes_ready = False
+
+
+def get_collection():
+    """Return the products collection, creating the unique SKU index once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+def detect_format(filename, default='csv'):
+    """Guess the feed format from a file name"""
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson'):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(lines, fmt):
+    """
+    Parse an iterable of text lines into row dicts, lazily. If the feed
+    can't be decoded or parsed further, the last row is an ``__error__``
+    row marked ``__fatal__``.
+    """
+    rows = _parse_rows(lines, fmt)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except (UnicodeDecodeError, csv.Error) as e:
+            yield {'__error__': f'Unreadable feed: {e}', '__fatal__': True}
+            return
+        yield row
+
+
+def _parse_rows(lines, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(lines)
+    elif fmt == 'jsonl':
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {'__error__': f'Invalid JSON: {e}'}
+            yield row if isinstance(row, dict) else {'__error__': 'Expected a JSON object'}
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def _to_images(value):
+    if isinstance(value, list):
+        return [str(image) for image in value]
+    value = str(value).strip()
+    if value.startswith('['):
+        return json.loads(value)
+    # CSV feeds list image URLs separated by '|'
+    return [image.strip() for image in value.split('|') if image.strip()]
+
+
+def validate_row(row):
+    """
+    Convert a feed row to Product field values.
+
+    Returns ``(fields, errors)``. Only columns present in the row are
+    returned, so an upsert never blanks fields the feed doesn't carry.
+    """
+    if '__error__' in row:
+        return None, [row['__error__']]
+
+    errors = []
+    for column in REQUIRED:
+        if _is_blank(row.get(column)):
+            errors.append(f'{column} is required')
+    if errors:
+        return None, errors
+
+    fields = {}
+    for column, field in COLUMNS.items():
+        if column not in row or (_is_blank(row[column]) and column not in REQUIRED):
+            continue
+        value = row[column]
+        try:
+            if field == 'price':
+                value = Decimal(str(value).strip()).quantize(Decimal('0.01'))
+                if value < 0:
+                    raise ValueError('must not be negative')
+            elif field == 'discount':
+                value = int(value)
+                if not 0 <= value <= 100:
+                    raise ValueError('must be between 0 and 100')
+            elif field in ('featured', 'is_active'):
+                value = _to_bool(value)
+            elif field == 'images':
+                value = _to_images(value)
+            else:
+                value = str(value).strip()
+                if field in _CHOICES and value not in _CHOICES[field]:
+                    raise ValueError(f'"{value}" is not a valid choice')
+        except (ValueError, TypeError, InvalidOperation) as e:
+            errors.append(f'{column}: {e}')
+            continue
+        fields[field] = value
+
+    if len(fields.get('sku', '')) > 100:
+        errors.append('sku: at most 100 characters')
+    if len(fields.get('title', '')) > 255:
+        errors.append('title: at most 255 characters')
+    return (None, errors) if errors else (fields, [])
+
+
+def _upsert(fields):
+    """Upsert for one validated row: feed columns are set, the rest only on insert"""
+    # Same column names and db values (Decimal128, JSON, auto_now) the ORM writes
+    document = model_document(Product(**fields))
+    columns = {Product._meta.get_field(field).column for field in fields}
+    columns.add('updated_at')
+
+    to_set = {column: value for column, value in document.items() if column in columns}
+    on_insert = {column: value for column, value in document.items() if column not in columns}
+    return UpdateOne({'sku': fields['sku']}, {'$set': to_set, '$setOnInsert': on_insert}, upsert=True)
+
+
+def import_products(rows, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Validate ``rows`` and upsert them by SKU in chunks of ``chunk_size``.
+
+    Returns a report dict with row, created, updated, invalid and failed
+    (rejected by MongoDB) counts, ``aborted`` (the feed became unreadable;
+    rows before it are still written), plus the first ``MAX_REPORTED_ERRORS``
+    errors as ``{'row': data row number (1-based), 'sku': ..., 'errors': [...]}``.
+    """
+    collection = get_collection()
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'invalid': 0, 'failed': 0, 'aborted': False, 'errors': []}
+    chunk = []
+    chunk_rows = []
+    seen = set()
+
+    def add_error(row_number, sku, errors):
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'sku': sku, 'errors': errors})
+
+    def flush():
+        if not chunk:
+            return
+        if not dry_run:
+            try:
+                result = collection.bulk_write(chunk, ordered=False)
+                report['created'] += result.upserted_count
+                report['updated'] += result.matched_count
+            except BulkWriteError as e:
+                # Unordered: every operation without a write error was applied
+                report['created'] += e.details.get('nUpserted', 0)
+                report['updated'] += e.details.get('nMatched', 0)
+                for error in e.details.get('writeErrors', []):
+                    report['failed'] += 1
+                    row_number, sku = chunk_rows[error['index']]
+                    add_error(row_number, sku, [error.get('errmsg', 'Write failed')])
+        chunk.clear()
+        chunk_rows.clear()
+        seen.clear()
+
+    for row_number, row in enumerate(rows, start=1):
+        if row.get('__fatal__'):
+            report['aborted'] = True
+            # Always reported, even past MAX_REPORTED_ERRORS
+            report['errors'].append({'row': row_number, 'sku': None, 'errors': [row['__error__']]})
+            break
+        report['rows'] += 1
+        fields, errors = validate_row(row)
+        if errors:
+            report['invalid'] += 1
+            add_error(row_number, row.get('sku'), errors)
+            continue
+
+        # A SKU repeated within one unordered chunk could race its own upsert
+        if fields['sku'] in seen:
+            flush()
+        seen.add(fields['sku'])
+        chunk.append(_upsert(fields))
+        chunk_rows.append((row_number, fields['sku']))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return report
+
+
+def _plain(value):
+    """Convert stored values (Decimal128, datetimes, ObjectIds) to export-friendly ones"""
+    if hasattr(value, 'to_decimal'):
+        return str(value.to_decimal())
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, str) and value.startswith('['):
+        # JSON columns may be stored serialized
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _export_row(document):
+    row = {}
+    for column, field in COLUMNS.items():
+        row[column] = _plain(document.get(Product._meta.get_field(field).column))
+    return row
+
+
+def export_products(fmt, query=None, batch_size=DEFAULT_CHUNK_SIZE, include_archived=False):
+    """
+    Yield the catalog as CSV or JSONL text, a batch of rows at a time.
+
+    Reads the products collection directly with a projection of the export
+    columns, in ``_id`` order, so memory use doesn't grow with the catalog.
+    Archived products are only exported with ``include_archived``.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported format: {fmt}')
+    query = dict(query or {})
+    if not include_archived:
+        query['archived_at'] = None
+
+    projection = {Product._meta.get_field(field).column: 1 for field in COLUMNS.values()}
+    cursor = get_db()[Product._meta.db_table].find(
+        query, projection, batch_size=batch_size
+    ).sort('_id', 1)
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(COLUMNS)) if fmt == 'csv' else None
+    if writer:
+        writer.writeheader()
+
+    rows = 0
+    for document in cursor:
+        row = _export_row(document)
+        if writer:
+            if isinstance(row['images'], list):
+                row['images'] = '|'.join(row['images'])
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, default=str))
+            buffer.write('\n')
+        rows += 1
+        if rows % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
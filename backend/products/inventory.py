@@ -0,0 +1,274 @@
+"""
+Atomic key inventory counters.
+
+Sellable stock is the number of unused, unallocated ``DigitalKey`` rows per
+``(product, region)``. Instead of counting ``digital_keys`` on every request,
+one counter document per pair is kept in ``key_inventory`` and changed with
+single ``$inc`` updates: keys are added on ingest, taken when a checkout
+reserves them (or at fulfillment if the hold expired) and given back when a
+hold is released. Decrements are conditional on ``available >= quantity``, so
+concurrent checkouts can't lose updates or oversell.
+
+``reconcile`` rebuilds every counter from ``digital_keys`` with one
+aggregation (used by the ``reconcile_key_inventory`` command). Each write
+is conditional on the value read before the aggregation ran, so a counter
+that a checkout or ingest changes meanwhile keeps its live value. Counters
+that don't exist yet (keys loaded before the counters, a fresh database) are
+seeded from the same data, for just those pairs, the first time they are read or
+changed, so existing stock never reads as sold out.
+"""
+from django.utils import timezone
+from pymongo import IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.mongo import get_db
+
+COLLECTION = 'key_inventory'
+
+INDEXES = [
+    IndexModel('product_id', name='product_id'),
+    # Lowest pools first, for the Prometheus low-stock series
+    IndexModel('available', name='available'),
+]
+
+_indexes_ready = False
+
+
+def _to_object_id(product_id):
+    from bson import ObjectId
+    return product_id if isinstance(product_id, ObjectId) else ObjectId(str(product_id))
+
+
+def counter_id(product_id, region):
+    """Counter document ID for a (product, region) pair"""
+    return f'{product_id}:{region}'
+
+
+def get_collection():
+    """Return the counters collection, creating its indexes once per process"""
+    global _indexes_ready
+    collection = get_db()[COLLECTION]
+    if not _indexes_ready:
+        collection.create_indexes(INDEXES)
+        _indexes_ready = True
+    return collection
+
+
+def seed_missing(pairs):
+    """
+    Create the counters that don't exist yet for ``(product_id, region)``
+    pairs: unused keys minus the keys held by active reservations, as
+    ``reconcile`` computes them. Existing counters are left alone, and a
+    concurrent seed of the same pair can't double count. Returns the number
+    of counters created.
+    """
+    pairs = {counter_id(product_id, region): (_to_object_id(product_id), region) for product_id, region in pairs}
+    collection = get_collection()
+    existing = {counter['_id'] for counter in collection.find({'_id': {'$in': list(pairs)}}, {'_id': 1})}
+    missing = {key: pair for key, pair in pairs.items() if key not in existing}
+    if not missing:
+        return 0
+
+    from orders.reservations import COLLECTION as RESERVATIONS, HELD
+
+    db = get_db()
+    selectors = [{'product_id': product_id, 'region': region} for product_id, region in missing.values()]
+    available = dict.fromkeys(missing, 0)
+    keys = db['digital_keys'].aggregate([
+        {'$match': {'is_used': False, 'order_id': None, '$or': selectors}},
+        {'$group': {'_id': {'product_id': '$product_id', 'region': '$region'}, 'count': {'$sum': 1}}},
+    ])
+    for row in keys:
+        available[counter_id(row['_id']['product_id'], row['_id']['region'])] += row['count']
+    # Keys held by active checkouts are still unused in digital_keys
+    for reservation in db[RESERVATIONS].find({'status': HELD, 'lines': {'$elemMatch': {'$or': selectors}}}, {'lines': 1}):
+        for line in reservation['lines']:
+            key = counter_id(line['product_id'], line['region'])
+            if key in available:
+                available[key] -= line['quantity']
+
+    now = timezone.now()
+    writes = [
+        UpdateOne(
+            {'_id': key},
+            {'$setOnInsert': {'product_id': product_id, 'region': region, 'available': max(available[key], 0), 'updated_at': now}},
+            upsert=True
+        )
+        for key, (product_id, region) in missing.items()
+    ]
+    try:
+        return collection.bulk_write(writes, ordered=False).upserted_count
+    except BulkWriteError as e:
+        # Another process created some of them first
+        return e.details.get('nUpserted', 0)
+
+
+def _take(product_id, region, quantity):
+    return get_collection().find_one_and_update(
+        {'_id': counter_id(product_id, region), 'available': {'$gte': quantity}},
+        {'$inc': {'available': -quantity}, '$set': {'updated_at': timezone.now()}},
+        projection={'available': 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def decrement_stock(product_id, region, quantity):
+    """
+    Take ``quantity`` keys if at least that many are available.
+
+    Returns the new available count, or None if there weren't enough keys.
+    Nothing is changed in that case.
+    """
+    counter = _take(product_id, region, quantity)
+    if counter is None and seed_missing([(product_id, region)]):
+        counter = _take(product_id, region, quantity)
+    return counter['available'] if counter else None
+
+
+def increment_stock(product_id, region, quantity):
+    """
+    Add ``quantity`` available keys. Returns the new count.
+
+    Callers add keys (or give held ones back) before calling this, so a
+    missing counter is seeded from ``digital_keys`` (which already counts
+    them) instead of being incremented.
+    """
+    counter = get_collection().find_one_and_update(
+        {'_id': counter_id(product_id, region)},
+        {'$inc': {'available': quantity}, '$set': {'updated_at': timezone.now()}},
+        projection={'available': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        seed_missing([(product_id, region)])
+        return get_available(product_id, region)
+    return counter['available']
+
+
+def get_available(product_id, region):
+    """Available keys for one (product, region) pair"""
+    collection = get_collection()
+    counter = collection.find_one({'_id': counter_id(product_id, region)}, {'available': 1})
+    if counter is None and seed_missing([(product_id, region)]):
+        counter = collection.find_one({'_id': counter_id(product_id, region)}, {'available': 1})
+    return counter['available'] if counter else 0
+
+
+def get_available_map(products):
+    """
+    Available keys in each product's own region, keyed by string product ID.
+    Loads the counters for all given products in a single query.
+    """
+    products = list(products)
+    if not products:
+        return {}
+
+    available = load_counters({counter_id(product.pk, product.region): (product.pk, product.region) for product in products})
+    return {
+        str(product.pk): available.get(counter_id(product.pk, product.region), 0)
+        for product in products
+    }
+
+
+def load_counters(pairs):
+    """
+    ``{counter_id: available}`` for ``pairs`` (``{counter_id: (product_id, region)}``)
+    in one query, seeding the counters that don't exist yet
+    """
+    collection = get_collection()
+    available = {
+        counter['_id']: counter['available']
+        for counter in collection.find({'_id': {'$in': list(pairs)}}, {'available': 1})
+    }
+    missing = [pair for key, pair in pairs.items() if key not in available]
+    if missing and seed_missing(missing):
+        available.update(
+            (counter['_id'], counter['available'])
+            for counter in collection.find({'_id': {'$in': [counter_id(*pair) for pair in missing]}}, {'available': 1})
+        )
+    return available
+
+
+def reconcile(sync_product_stock=True):
+    """
+    Recompute every counter from ``digital_keys`` in one aggregation.
+
+    Keys held by active checkout reservations are subtracted (via
+    ``$unionWith``) so held stock isn't sold twice. A counter is only
+    overwritten if it still holds the value read before the aggregation;
+    one changed by a concurrent ``$inc`` is skipped (rerun to settle it).
+    When ``sync_product_stock`` is set, the legacy ``products.stock`` field
+    is refreshed with the sum of each product's counters afterwards.
+    Returns (counters computed, counters skipped).
+    """
+    from orders.reservations import COLLECTION as RESERVATIONS, HELD
+
+    db = get_db()
+    collection = get_collection()
+    # Read first: a counter still at this value after the aggregation wasn't
+    # changed while it ran
+    current = {counter['_id']: counter['available'] for counter in collection.find({}, {'available': 1})}
+    pipeline = [
+        {'$match': {'is_used': False, 'order_id': None}},
+        {'$project': {'product_id': 1, 'region': 1, 'count': {'$literal': 1}}},
+        {'$unionWith': {
+            'coll': RESERVATIONS,
+            'pipeline': [
+                {'$match': {'status': HELD}},
+                {'$unwind': '$lines'},
+                {'$project': {
+                    'product_id': '$lines.product_id',
+                    'region': '$lines.region',
+                    'count': {'$multiply': ['$lines.quantity', -1]},
+                }},
+            ],
+        }},
+        {'$group': {
+            '_id': {'product_id': '$product_id', 'region': '$region'},
+            'available': {'$sum': '$count'},
+        }},
+    ]
+
+    now = timezone.now()
+    updates = []
+    seeds = []
+    computed = {}
+    for row in db['digital_keys'].aggregate(pipeline, allowDiskUse=True):
+        product_id = row['_id']['product_id']
+        region = row['_id']['region']
+        key = counter_id(product_id, region)
+        computed[key] = max(row['available'], 0)
+        if key not in current:
+            # Seeded concurrently from the same data if it exists by now
+            seeds.append(UpdateOne(
+                {'_id': key},
+                {'$setOnInsert': {'product_id': product_id, 'region': region, 'available': computed[key], 'updated_at': now}},
+                upsert=True
+            ))
+    # Pairs with no keys left at all don't appear in the aggregation
+    for key, available in current.items():
+        target = computed.get(key, 0)
+        if available != target:
+            updates.append(UpdateOne(
+                {'_id': key, 'available': available},
+                {'$set': {'available': target, 'updated_at': now}}
+            ))
+
+    skipped = 0
+    if updates:
+        skipped = len(updates) - collection.bulk_write(updates, ordered=False).matched_count
+    if seeds:
+        collection.bulk_write(seeds, ordered=False)
+
+    if sync_product_stock:
+        product_totals = {
+            row['_id']: row['stock']
+            for row in collection.aggregate([{'$group': {'_id': '$product_id', 'stock': {'$sum': '$available'}}}])
+        }
+        db['products'].update_many({'_id': {'$nin': list(product_totals)}}, {'$set': {'stock': 0}})
+        if product_totals:
+            db['products'].bulk_write([
+                UpdateOne({'_id': product_id}, {'$set': {'stock': total}})
+                for product_id, total in product_totals.items()
+            ], ordered=False)
+
+    return len(computed), skipped
@@ -0,0 +1,148 @@
+"""
+Paginated, filterable product listing for the admin panel.
+
+Filtering, search, sorting and pagination run in MongoDB: a sorted, skipped
+and limited query returns the IDs of the requested page (so the sort can
+walk an index and stop at the page), a separate count returns the total,
+and only that page is loaded through the ORM and serialized. The low-stock
+filter joins the key inventory counters in an aggregation, so it never pulls
+the catalog into Python.
+"""
+import re
+from .inventory import COLLECTION as KEY_INVENTORY_COLLECTION
+from .models import Product
+from utils.mongo import get_db
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+DEFAULT_LOW_STOCK_THRESHOLD = 5
+
+# Query parameter -> products column, for equality filters
+FILTER_FIELDS = {
+    'productType': 'product_type',
+    'platform': 'platform',
+    'category': 'category',
+    'region': 'region',
+}
+
+# Sort parameter (optionally prefixed with '-') -> products column
+SORT_FIELDS = {
+    'createdAt': 'created_at',
+    'updatedAt': 'updated_at',
+    'price': 'price',
+    'title': 'title',
+}
+DEFAULT_SORT = '-createdAt'
+
+
+def _int_param(params, name, default, minimum, maximum=None):
+    try:
+        value = int(params.get(name, default))
+    except (ValueError, TypeError):
+        value = default
+    value = max(minimum, value)
+    return min(maximum, value) if maximum is not None else value
+
+
+def _bool_param(params, name):
+    value = params.get(name)
+    if value is None or value == '':
+        return None
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def build_match(params):
+    """MongoDB filter for the equality, active/archived and search parameters"""
+    match = {}
+    for param, column in FILTER_FIELDS.items():
+        value = params.get(param)
+        if value:
+            match[column] = value
+
+    # Archived products are listed only when asked for
+    match['archived_at'] = {'$ne': None} if _bool_param(params, 'archived') else None
+
+    active = _bool_param(params, 'active')
+    if active is True:
+        # Documents written before is_active existed count as active
+        match['is_active'] = {'$ne': False}
+    elif active is False:
+        match['is_active'] = False
+
+    search = (params.get('search') or '').strip()
+    if search:
+        pattern = {'$regex': re.escape(search), '$options': 'i'}
+        match['$or'] = [{'title': pattern}, {'sku': pattern}]
+    return match
+
+
+def build_sort(value):
+    """Sort spec for a ``sort`` parameter such as ``-createdAt``; ``_id`` breaks ties"""
+    value = value or DEFAULT_SORT
+    descending = value.startswith('-')
+    column = SORT_FIELDS.get(value.lstrip('-'), SORT_FIELDS[DEFAULT_SORT.lstrip('-')])
+    return {column: -1 if descending else 1, '_id': -1 if descending else 1}
+
+
+def _low_stock_stages(threshold):
+    """Join each product's own (product, region) counter and keep those at or below ``threshold``"""
+    return [
+        {'$lookup': {
+            'from': KEY_INVENTORY_COLLECTION,
+            'let': {'counter_id': {'$concat': [{'$toString': '$_id'}, ':', '$region']}},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', '$$counter_id']}}},
+                {'$project': {'available': 1}},
+            ],
+            'as': 'key_counter',
+        }},
+        {'$match': {'$expr': {
+            '$lte': [{'$ifNull': [{'$arrayElemAt': ['$key_counter.available', 0]}, 0]}, threshold]
+        }}},
+    ]
+
+
+def query_products(params):
+    """
+    Run the admin listing for request query ``params``.
+
+    Supported parameters: ``page``, ``limit``, ``productType``, ``platform``,
+    ``category``, ``region``, ``active``, ``archived``, ``lowStock`` (with optional
+    ``lowStockThreshold``), ``search`` (title or SKU) and ``sort``. Returns
+    ``(products, pagination)`` where ``products`` is the ordered page of
+    Product instances.
+    """
+    page = _int_param(params, 'page', 1, 1)
+    limit = _int_param(params, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+
+    collection = get_db()[Product._meta.db_table]
+    match = build_match(params)
+    sort = build_sort(params.get('sort'))
+    skip = (page - 1) * limit
+
+    if _bool_param(params, 'lowStock'):
+        threshold = _int_param(params, 'lowStockThreshold', DEFAULT_LOW_STOCK_THRESHOLD, 0)
+        low_stock = _low_stock_stages(threshold)
+        page_ids = collection.aggregate([
+            {'$match': match}, {'$sort': sort}, *low_stock,
+            {'$skip': skip}, {'$limit': limit}, {'$project': {'_id': 1}},
+        ])
+        counted = next(collection.aggregate([{'$match': match}, *low_stock, {'$count': 'count'}]), None)
+        total = counted['count'] if counted else 0
+    else:
+        page_ids = collection.find(match, {'_id': 1}).sort(list(sort.items())).skip(skip).limit(limit)
+        total = collection.count_documents(match)
+    ids = [document['_id'] for document in page_ids]
+
+    products = []
+    if ids:
+        by_id = {product.pk: product for product in Product.objects.filter(pk__in=ids)}
+        products = [by_id[product_id] for product_id in ids if product_id in by_id]
+
+    pagination = {
+        'page': page,
+        'limit': limit,
+        'total': total,
+        'pages': (total + limit - 1) // limit,
+    }
+    return products, pagination
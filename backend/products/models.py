@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
+from pymongo import IndexModel, TEXT
 
 # Import ObjectIdField from djongo for MongoDB compatibility
 # This project uses djongo, so ObjectIdField should be available
@@ -46,6 +47,9 @@ class Product(models.Model):
         ('Gift Card', 'Gift Card'),
     ]
     
+    # Supplier/external ID; bulk imports upsert on it. Indexed (unique when
+    # set) by products.catalog_io.INDEXES, not db_index
+    sku = models.CharField(max_length=100, blank=True, null=True)
     title = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -62,9 +66,17 @@ class Product(models.Model):
         default=0,
         validators=[MinValueValidator(0), MaxValueValidator(100)]
     )
+    # Set when the product is archived (soft-deleted); see products.archival.
+    # No migration: the index is built by ensure_indexes (db_index fields)
+    archived_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Catalog search (utils.repository); built by ensure_indexes
+    mongo_indexes = [
+        IndexModel([('title', TEXT), ('description', TEXT)], name='search_text', weights={'title': 5, 'description': 1}),
+    ]
+
     class Meta:
         db_table = 'products'
         indexes = [
@@ -62,6 +62,17 @@ def get_product_id_from_instance(instance):
     return None
 
 
+def apply_key_inventory(representation, context):
+    """
+    Replace the stored stock with the live key inventory counter when the
+    view supplied one (``context['key_inventory']``, keyed by product ID).
+    """
+    key_inventory = context.get('key_inventory')
+    if key_inventory is not None and representation.get('_id') is not None:
+        representation['stock'] = key_inventory.get(representation['_id'], 0)
+    return representation
+
+
 class ProductSerializer(serializers.ModelSerializer):
     _id = serializers.SerializerMethodField(read_only=True)
     productType = serializers.CharField(source='product_type', required=False, allow_blank=True)
@@ -73,7 +84,7 @@ class ProductSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Product
-        fields = ('_id', 'title', 'description', 'price', 'productType', 'platform', 
+        fields = ('_id', 'sku', 'title', 'description', 'price', 'productType', 'platform', 
                   'region', 'category', 'images', 'isDigital', 'isActive', 'stock', 
                   'featured', 'discount', 'createdAt')
         read_only_fields = ('createdAt', '_id', 'isDigital', 'isActive')
@@ -105,7 +116,7 @@ class ProductSerializer(serializers.ModelSerializer):
         if 'price' in representation and representation['price'] is not None:
             representation['price'] = float(representation['price']) * 3.2
         
-        return representation
+        return apply_key_inventory(representation, self.context)
     
     def create(self, validated_data):
         """Handle productType to product_type mapping"""
@@ -187,7 +198,7 @@ class ProductListSerializer(serializers.ModelSerializer):
             except (ValueError, TypeError):
                 representation['price'] = 0.0
         
-        return representation
+        return apply_key_inventory(representation, self.context)
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -276,3 +287,40 @@ class ReviewListSerializer(serializers.ModelSerializer):
             '_id': obj.user.id,
             'name': obj.user.get_full_name() or obj.user.username,
         }
+
+
+class BulkProductFilterSerializer(serializers.Serializer):
+    """Products a bulk update applies to (same filters as the admin listing)"""
+    ids = serializers.ListField(child=serializers.CharField(), required=False)
+    productType = serializers.ChoiceField(choices=Product.PRODUCT_TYPE_CHOICES, required=False)
+    platform = serializers.ChoiceField(choices=Product.PLATFORM_CHOICES, required=False)
+    category = serializers.ChoiceField(choices=Product.CATEGORY_CHOICES, required=False)
+    region = serializers.CharField(max_length=50, required=False)
+    active = serializers.BooleanField(required=False, allow_null=True, default=None)
+    search = serializers.CharField(required=False, allow_blank=True)
+
+    def validate_ids(self, value):
+        from bson import ObjectId
+        invalid = [product_id for product_id in value if not ObjectId.is_valid(product_id)]
+        if invalid:
+            raise serializers.ValidationError(f'Invalid product IDs: {", ".join(invalid[:10])}')
+        return value
+
+
+class BulkProductPatchSerializer(serializers.Serializer):
+    """Fields a bulk update can change"""
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    discount = serializers.IntegerField(min_value=0, max_value=100, required=False)
+    isActive = serializers.BooleanField(required=False)
+    featured = serializers.BooleanField(required=False)
+
+
+class BulkProductUpdateSerializer(serializers.Serializer):
+    filter = BulkProductFilterSerializer()
+    patch = BulkProductPatchSerializer()
+    all = serializers.BooleanField(required=False, default=False)
+
+    def validate_patch(self, value):
+        if not value:
+            raise serializers.ValidationError('Patch at least one of: price, discount, isActive, featured')
+        return value
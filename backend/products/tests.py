@@ -0,0 +1,135 @@
+import io
+from unittest import mock
+from django.test import SimpleTestCase
+from . import bulk_update, catalog_io, inventory
+
+
+class DecrementStockTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = mock.Mock()
+        for target, value in (('get_collection', self.collection), ('seed_missing', 0)):
+            patcher = mock.patch.object(inventory, target, return_value=value)
+            setattr(self, target, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_decrement_is_conditional_on_available_stock(self):
+        self.collection.find_one_and_update.return_value = {'available': 3}
+        self.assertEqual(inventory.decrement_stock('p1', 'EU', 2), 3)
+        query, update = self.collection.find_one_and_update.call_args[0]
+        self.assertEqual(query, {'_id': 'p1:EU', 'available': {'$gte': 2}})
+        self.assertEqual(update['$inc'], {'available': -2})
+
+    def test_insufficient_stock_changes_nothing(self):
+        self.collection.find_one_and_update.return_value = None
+        self.assertIsNone(inventory.decrement_stock('p1', 'EU', 2))
+        self.collection.find_one_and_update.assert_called_once()
+
+    def test_missing_counter_is_seeded_and_retried(self):
+        self.seed_missing.return_value = 1
+        self.collection.find_one_and_update.side_effect = [None, {'available': 4}]
+        self.assertEqual(inventory.decrement_stock('p1', 'EU', 1), 4)
+        self.seed_missing.assert_called_once_with([('p1', 'EU')])
+
+    def test_increment_seeds_a_missing_counter_instead_of_creating_it(self):
+        self.collection.find_one_and_update.return_value = None
+        with mock.patch.object(inventory, 'get_available', return_value=5):
+            self.assertEqual(inventory.increment_stock('p1', 'EU', 2), 5)
+        self.assertNotIn('upsert', self.collection.find_one_and_update.call_args.kwargs)
+        self.seed_missing.assert_called_once_with([('p1', 'EU')])
+
+    def test_counters_are_loaded_in_one_query(self):
+        self.collection.find.return_value = [{'_id': 'p1:EU', 'available': 2}]
+        counters = inventory.load_counters({'p1:EU': ('p1', 'EU'), 'p2:EU': ('p2', 'EU')})
+        self.assertEqual(counters, {'p1:EU': 2})
+        self.collection.find.assert_called_once()
+        self.seed_missing.assert_called_once_with([('p2', 'EU')])
+
+
+    def test_reconcile_only_overwrites_the_value_it_read(self):
+        self.collection.find.return_value = [{'_id': 'p1:EU', 'available': 5}, {'_id': 'p2:EU', 'available': 3}]
+        self.collection.bulk_write.return_value.matched_count = 0
+        digital_keys = mock.Mock()
+        digital_keys.aggregate.return_value = [
+            {'_id': {'product_id': 'p1', 'region': 'EU'}, 'available': 5},
+            {'_id': {'product_id': 'p3', 'region': 'EU'}, 'available': 2},
+        ]
+        with mock.patch.object(inventory, 'get_db', return_value={'digital_keys': digital_keys}):
+            self.assertEqual(inventory.reconcile(sync_product_stock=False), (2, 1))
+        (updates,), (seeds,) = (call[0] for call in self.collection.bulk_write.call_args_list)
+        # p1 is unchanged, p2 has no keys left but a concurrent $inc wins
+        self.assertEqual([(u._filter, u._doc['$set']['available']) for u in updates], [({'_id': 'p2:EU', 'available': 3}, 0)])
+        self.assertEqual([(u._filter, u._upsert) for u in seeds], [({'_id': 'p3:EU'}, True)])
+        self.assertIn('$setOnInsert', seeds[0]._doc)
+
+class BulkUpdateGuardTests(SimpleTestCase):
+    def test_default_listing_filter_matches_the_catalog(self):
+        self.assertTrue(bulk_update.matches_catalog(bulk_update.build_query({})))
+
+    def test_narrowed_filters_do_not(self):
+        self.assertFalse(bulk_update.matches_catalog(bulk_update.build_query({'category': 'RPG'})))
+        self.assertFalse(bulk_update.matches_catalog(bulk_update.build_query({'archived': 'true'})))
+
+    def test_empty_filter_is_refused_without_all(self):
+        with mock.patch.object(bulk_update, 'get_db') as get_db:
+            with self.assertRaises(bulk_update.BulkUpdateError):
+                bulk_update.bulk_update({}, {'featured': True})
+        get_db.assert_not_called()
+
+    def test_empty_filter_updates_everything_with_all(self):
+        with mock.patch.object(bulk_update, 'get_db') as get_db:
+            get_db.return_value['products'].update_many.return_value = mock.Mock(matched_count=2, modified_count=1)
+            self.assertEqual(bulk_update.bulk_update({}, {'featured': True}, allow_all=True), (2, 1))
+
+    def test_empty_patch_is_refused(self):
+        with self.assertRaises(bulk_update.BulkUpdateError):
+            bulk_update.build_update({'title': 'x'})
+
+
+class CatalogFallbackTests(SimpleTestCase):
+    """The ORM catalog path only covers MongoDB errors, not bugs in the native reads"""
+
+    def request(self, path):
+        from rest_framework.test import APIRequestFactory
+        from .views import ProductViewSet
+
+        view = ProductViewSet.as_view({'get': 'list'} if path == '/' else {'get': 'featured'})
+        return view(APIRequestFactory().get(path))
+
+    def test_programming_errors_are_not_swallowed(self):
+        from utils import repository
+
+        for path, target in (('/', 'list_products'), ('/featured/all/', 'sample_products')):
+            with self.subTest(path=path), mock.patch.object(repository, target, side_effect=KeyError('price')):
+                with self.assertRaises(KeyError):
+                    self.request(path)
+
+
+class CatalogImportExportTests(SimpleTestCase):
+    HEADER = b'sku,title,price,productType,platform,category\n'
+
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        patcher = mock.patch.object(catalog_io, 'get_collection', return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_undecodable_feed_is_reported_not_raised(self):
+        lines = io.TextIOWrapper(io.BytesIO(self.HEADER + b'A,\xff\xfe,1,GAME,PC,Action\n'), encoding='utf-8', newline='')
+        report = catalog_io.import_products(catalog_io.read_rows(lines, 'csv'))
+        self.assertTrue(report['aborted'])
+        self.assertEqual(report['errors'][-1]['row'], 1)
+        self.assertIn('Unreadable feed', report['errors'][-1]['errors'][0])
+
+    def test_malformed_csv_is_reported_not_raised(self):
+        oversized = 'A,' + 'x' * 200000 + ',1,GAME,PC,Action\n'
+        report = catalog_io.import_products(catalog_io.read_rows([self.HEADER.decode(), oversized], 'csv'))
+        self.assertTrue(report['aborted'])
+        self.assertEqual(report['rows'], 0)
+
+    def test_export_skips_archived_unless_asked(self):
+        db = mock.MagicMock()
+        with mock.patch.object(catalog_io, 'get_db', return_value=db):
+            list(catalog_io.export_products('csv'))
+            self.assertEqual(db.__getitem__.return_value.find.call_args[0][0], {'archived_at': None})
+            list(catalog_io.export_products('csv', include_archived=True))
+            self.assertEqual(db.__getitem__.return_value.find.call_args[0][0], {})
@@ -4,7 +4,10 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Avg, Count
+from pymongo.errors import PyMongoError
 from .models import Product, Review
+from .inventory import get_available_map
+from utils import repository
 from .serializers import ProductSerializer, ProductListSerializer, ReviewSerializer, ReviewListSerializer, get_product_id_from_instance
 import django_filters
 
@@ -36,6 +39,24 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             return ProductListSerializer
         return ProductSerializer
 
+    def get_serializer_context(self):
+        """Pass the key inventory counters loaded for this request to the serializer"""
+        context = super().get_serializer_context()
+        key_inventory = getattr(self, 'key_inventory', None)
+        if key_inventory is not None:
+            context['key_inventory'] = key_inventory
+        return context
+
+    def load_key_inventory(self, products):
+        """Load available-key counters for the products about to be serialized (one query)"""
+        try:
+            self.key_inventory = get_available_map(products)
+        except Exception as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f'Error loading key inventory counters: {e}', exc_info=True)
+            self.key_inventory = None
+
     def get_object(self):
         """
         Override get_object to handle MongoDB ObjectId lookups properly.
@@ -164,6 +185,23 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     
     def list(self, request, *args, **kwargs):
         """Override list to return custom response format"""
+        # Native catalog read (no SQL translation, no serializer pass); the
+        # ORM path below only serves requests while MongoDB errors, so bugs
+        # in the repository still surface as errors
+        try:
+            products_data, pagination = repository.list_products(request.query_params)
+            return Response({
+                'success': True,
+                'data': {
+                    'products': products_data,
+                    'pagination': pagination
+                }
+            })
+        except PyMongoError as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f'Native product list failed, falling back to the ORM: {e}', exc_info=True)
+        
         # Get the base queryset with price filters already applied
         base_queryset = self.get_queryset()
         
@@ -236,6 +274,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             start = (page - 1) * limit
             end = start + limit
             paginated_products = all_products_list[start:end]
+            self.load_key_inventory(paginated_products)
             
             # Serialize with error handling
             import logging
@@ -402,6 +441,21 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to return custom response format"""
+        from bson import ObjectId
+        lookup_value = str(self.kwargs.get(self.lookup_url_kwarg or self.lookup_field, ''))
+        if ObjectId.is_valid(lookup_value):
+            # Native single-document read with live stock
+            product = repository.get_product(lookup_value)
+            if product is None or product['isActive'] is False:
+                return Response({
+                    'success': False,
+                    'message': 'Product not found'
+                }, status=status.HTTP_404_NOT_FOUND)
+            return Response({
+                'success': True,
+                'data': {'product': product}
+            })
+        
         instance = self.get_object()
         
         # Check if product is active - use same workaround as list method
@@ -419,6 +473,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
             logger = logging.getLogger(__name__)
             logger.warning(f'Error checking is_active for product {getattr(instance, "id", "unknown")}: {e}')
         
+        self.load_key_inventory([instance])
         serializer = self.get_serializer(instance)
         return Response({
             'success': True,
@@ -428,6 +483,17 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'], url_path='featured/all')
     def featured(self, request):
         """Get random featured products from database"""
+        try:
+            # Sampled in MongoDB instead of loading the whole catalog
+            return Response({
+                'success': True,
+                'data': {'products': repository.sample_products(10)}
+            })
+        except PyMongoError as e:
+            import logging
+            logger = logging.getLogger(__name__)
+            logger.error(f'Native featured sample failed, falling back to the ORM: {e}', exc_info=True)
+        
         queryset = self.get_queryset()
         # Filter active products - use same workaround as list method
         active_products = []
@@ -450,6 +516,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         # Get random sample
         import random
         products = random.sample(active_products, min(10, len(active_products)))
+        self.load_key_inventory(products)
         
         # Serialize with error handling
         try:
@@ -483,6 +550,7 @@ class ProductViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = self.get_queryset().filter(platform=platform)
         # Filter active products
         active_products = [p for p in queryset if p.is_active]
+        self.load_key_inventory(active_products)
         serializer = self.get_serializer(active_products, many=True)
         return Response({
             'success': True,
@@ -656,44 +724,9 @@ class ReviewViewSet(viewsets.ModelViewSet):
         stats = {}
         if product_id:
             try:
-                # Try to get reviews for this product with multiple lookup methods
-                review_queryset = Review.objects.all()
-                
-                # Try filtering with different methods
-                try:
-                    review_queryset = review_queryset.filter(product_id=product_id)
-                except (ValueError, TypeError):
-                    try:
-                        review_queryset = review_queryset.filter(product_id=str(product_id))
-                    except Exception:
-                        try:
-                            from bson import ObjectId
-                            if ObjectId.is_valid(str(product_id)):
-                                review_queryset = review_queryset.filter(product_id=ObjectId(str(product_id)))
-                        except (ImportError, ValueError, TypeError):
-                            review_queryset = Review.objects.none()
-                
-                # Convert to list for manual aggregation (djongo doesn't support all aggregate functions)
-                reviews_list = list(review_queryset)
-                
-                if reviews_list:
-                    # Calculate average rating manually
-                    total_rating = sum(r.rating for r in reviews_list)
-                    stats['average_rating'] = total_rating / len(reviews_list)
-                    stats['total_reviews'] = len(reviews_list)
-                    
-                    # Calculate rating distribution manually
-                    rating_distribution = {}
-                    for review in reviews_list:
-                        rating = review.rating
-                        rating_distribution[rating] = rating_distribution.get(rating, 0) + 1
-                    stats['rating_distribution'] = rating_distribution
-                else:
-                    stats['average_rating'] = 0
-                    stats['total_reviews'] = 0
-                    stats['rating_distribution'] = {}
-                    
-            except Exception as e:
+                # One native aggregation instead of loading every review
+                stats = repository.review_stats(product_id)
+            except PyMongoError as e:
                 import logging
                 logger = logging.getLogger(__name__)
                 logger.error(f'Error calculating review stats: {e}', exc_info=True)
@@ -715,9 +748,8 @@ class ReviewViewSet(viewsets.ModelViewSet):
         page_num = max(1, page_num)
         limit_num = max(1, min(100, limit_num))
         
-        # Convert queryset to list for manual pagination
-        reviews_list = list(queryset)
-        total_count = len(reviews_list)
+        # Count and page in MongoDB: the ordering is a native sort on a review index
+        total_count = queryset.count()
         total_pages = (total_count + limit_num - 1) // limit_num if limit_num > 0 else 1
         
         # Ensure page doesn't exceed total pages
@@ -726,7 +758,7 @@ class ReviewViewSet(viewsets.ModelViewSet):
         # Calculate pagination slice
         start = (page_num - 1) * limit_num
         end = start + limit_num
-        paginated_reviews = reviews_list[start:end]
+        paginated_reviews = list(queryset[start:end])
         
         # Serialize paginated reviews
         serializer = self.get_serializer(paginated_reviews, many=True)
@@ -0,0 +1,67 @@
+"""
+Django admin helpers for very large collections (digital keys, orders, reviews)
+
+The default changelist runs an exact ``count()`` for the paginator and
+another for "show all", fetches foreign keys one row at a time and builds
+filter choices with DISTINCT queries. On collections with millions of
+documents each of those is a collection scan under djongo.
+"""
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from utils.mongo import get_db
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the unfiltered total from collection metadata
+    (``estimated_document_count``) instead of counting documents. Filtered
+    changelists still get an exact count, which the filter's index keeps cheap.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            try:
+                return get_db()[self.object_list.model._meta.db_table].estimated_document_count()
+            except Exception:
+                pass
+        return super().count
+
+
+class StaticChoicesFilter(admin.SimpleListFilter):
+    """List filter with fixed choices, so no DISTINCT query builds the sidebar"""
+    choices = ()
+
+    def lookups(self, request, model_admin):
+        return self.choices
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        return queryset.filter(**{self.parameter_name: value})
+
+
+class LargeCollectionAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for large collections: estimated page counts, no "show all"
+    count, and foreign keys in ``list_prefetch_related`` loaded with one
+    ``$in`` query per relation for the whole page.
+
+    ``list_select_related`` is an empty tuple rather than the default False:
+    with False the changelist joins every foreign key in ``list_display``,
+    which djongo turns into a ``$lookup`` per row.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    list_select_related = ()
+    list_prefetch_related = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.list_prefetch_related:
+            queryset = queryset.prefetch_related(*self.list_prefetch_related)
+        return queryset
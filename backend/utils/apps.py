@@ -0,0 +1,7 @@
+from django.apps import AppConfig
+
+
+class UtilsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'utils'
+    verbose_name = 'Shared utilities and management commands'
@@ -0,0 +1,164 @@
+"""
+Per-request database instrumentation (``DB_INSTRUMENTATION``).
+
+``DBInstrumentationMiddleware`` counts, for each request:
+
+- MongoDB commands and their server round-trip time, from pymongo command
+  monitoring (djongo and native queries alike)
+- ORM queries and the time spent executing them, from
+  ``connection.execute_wrapper`` (includes djongo's SQL translation, so it
+  overlaps the Mongo time)
+
+Every response gets a ``Server-Timing`` header, requests slower than
+``SLOW_REQUEST_MS`` are logged to the ``slow_requests`` logger, and totals
+are kept per view (per process) for the admin ``db-stats`` endpoint.
+
+When ``DB_INSTRUMENTATION`` is off the middleware removes itself at startup
+and no pymongo listener is registered, so requests pay nothing.
+"""
+import contextvars
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from pymongo import monitoring
+
+slow_logger = logging.getLogger('slow_requests')
+
+_current = contextvars.ContextVar('db_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('mongo_commands', 'mongo_seconds', 'orm_queries', 'orm_seconds')
+
+    def __init__(self):
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.orm_queries = 0
+        self.orm_seconds = 0.0
+
+
+class MongoTimingListener(monitoring.CommandListener):
+    """Adds each command's round trip to the current request's stats"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.mongo_commands += 1
+            stats.mongo_seconds += event.duration_micros / 1e6
+
+    failed = succeeded
+
+
+def time_orm_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` that times ORM queries for the current request"""
+    stats = _current.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if stats is not None:
+            stats.orm_queries += 1
+            stats.orm_seconds += time.perf_counter() - start
+
+
+class ViewStats:
+    """Per-process request and database totals per view"""
+
+    def __init__(self):
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def record(self, view, seconds, stats):
+        with self._lock:
+            totals = self._views.get(view)
+            if totals is None:
+                totals = self._views[view] = {
+                    'requests': 0, 'seconds': 0.0, 'maxSeconds': 0.0, 'mongoCommands': 0,
+                    'mongoSeconds': 0.0, 'ormQueries': 0, 'ormSeconds': 0.0,
+                }
+            totals['requests'] += 1
+            totals['seconds'] += seconds
+            totals['maxSeconds'] = max(totals['maxSeconds'], seconds)
+            totals['mongoCommands'] += stats.mongo_commands
+            totals['mongoSeconds'] += stats.mongo_seconds
+            totals['ormQueries'] += stats.orm_queries
+            totals['ormSeconds'] += stats.orm_seconds
+
+    def snapshot(self):
+        """Per-view averages, most Mongo time first"""
+        with self._lock:
+            views = {view: dict(totals) for view, totals in self._views.items()}
+        rows = []
+        for view, totals in views.items():
+            requests = totals['requests']
+            rows.append({
+                'view': view,
+                'requests': requests,
+                'avgMs': round(totals['seconds'] * 1000 / requests, 2),
+                'maxMs': round(totals['maxSeconds'] * 1000, 2),
+                'avgMongoCommands': round(totals['mongoCommands'] / requests, 2),
+                'avgMongoMs': round(totals['mongoSeconds'] * 1000 / requests, 2),
+                'avgOrmQueries': round(totals['ormQueries'] / requests, 2),
+                'avgOrmMs': round(totals['ormSeconds'] * 1000 / requests, 2),
+                'totalMongoMs': round(totals['mongoSeconds'] * 1000, 2),
+            })
+        return sorted(rows, key=lambda row: row['totalMongoMs'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route or match._func_path
+
+
+class DBInstrumentationMiddleware:
+    def __init__(self, get_response):
+        if not settings.DB_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        from utils import mongo_monitoring
+
+        self.get_response = get_response
+        mongo_monitoring.subscribe(MongoTimingListener())
+        # Clients opened before this (e.g. by startup checks) aren't monitored
+        mongo_monitoring.reconnect()
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(time_orm_query):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        seconds = time.perf_counter() - start
+
+        response['Server-Timing'] = (
+            f'mongo;dur={stats.mongo_seconds * 1000:.1f};desc="{stats.mongo_commands} commands", '
+            f'orm;dur={stats.orm_seconds * 1000:.1f};desc="{stats.orm_queries} queries", '
+            f'total;dur={seconds * 1000:.1f}'
+        )
+        view = view_name(request)
+        view_stats.record(view, seconds, stats)
+        if seconds * 1000 >= settings.SLOW_REQUEST_MS:
+            slow_logger.warning(
+                f'{request.method} {request.get_full_path()} ({view}) -> {response.status_code} '
+                f'in {seconds * 1000:.0f}ms: {stats.mongo_commands} Mongo commands '
+                f'({stats.mongo_seconds * 1000:.0f}ms), {stats.orm_queries} ORM queries '
+                f'({stats.orm_seconds * 1000:.0f}ms)'
+            )
+        return response
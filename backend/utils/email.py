@@ -4,6 +4,7 @@ Email utilities for sending digital keys
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
+from utils import prometheus, tracing
 
 
 def send_digital_keys_email(to_email, order_id, keys):
@@ -55,14 +56,15 @@ def send_digital_keys_email(to_email, order_id, keys):
     </html>
     """
     
-    send_mail(
-        subject=f'Your Digital Keys - Order #{order_id}',
-        message='',
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[to_email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+    with prometheus.external_call('smtp', 'send_mail'), tracing.span('smtp send_mail'):
+        send_mail(
+            subject=f'Your Digital Keys - Order #{order_id}',
+            message='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[to_email],
+            html_message=html_message,
+            fail_silently=False,
+        )
 
 
 def send_order_confirmation_email(to_email, order_id, total):
@@ -96,12 +98,13 @@ def send_order_confirmation_email(to_email, order_id, total):
     </html>
     """
     
-    send_mail(
-        subject=f'Order Confirmation - Order #{order_id}',
-        message='',
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=[to_email],
-        html_message=html_message,
-        fail_silently=False,
-    )
+    with prometheus.external_call('smtp', 'send_mail'), tracing.span('smtp send_mail'):
+        send_mail(
+            subject=f'Order Confirmation - Order #{order_id}',
+            message='',
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[to_email],
+            html_message=html_message,
+            fail_silently=False,
+        )
 
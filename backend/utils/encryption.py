@@ -5,6 +5,7 @@ from cryptography.fernet import Fernet
 from django.conf import settings
 import base64
 import hashlib
+from utils import tracing
 
 
 def get_encryption_key():
@@ -22,6 +23,7 @@ def get_encryption_key():
     return base64.urlsafe_b64encode(key_bytes)
 
 
+@tracing.traced('encryption encrypt_key')
 def encrypt_key(plain_key):
     """Encrypt a digital key"""
     f = Fernet(get_encryption_key())
@@ -29,6 +31,7 @@ def encrypt_key(plain_key):
     return encrypted.decode()
 
 
+@tracing.traced('encryption decrypt_key')
 def decrypt_key(encrypted_key):
     """Decrypt a digital key"""
     f = Fernet(get_encryption_key())
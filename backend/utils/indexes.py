@@ -0,0 +1,166 @@
+"""
+Declared MongoDB indexes and their reconciliation (see ``ensure_indexes``).
+
+With ``ENFORCE_SCHEMA: False`` djongo doesn't guarantee that the models'
+indexes exist (migrations may be stale or faked, and djongo builds
+descending index columns under a mangled field name). Some indexes can't be
+declared on a model at all: TTL, partial, text. The specs come from:
+
+- every model's ``Meta.indexes``, unique constraints, ``unique`` and
+  ``db_index`` fields and integer primary key
+- a model's ``mongo_indexes`` (pymongo ``IndexModel``\\s Meta can't express)
+- ``INDEXES`` of the modules in ``INDEX_MODULES`` (natively managed
+  collections; ``COLLECTION`` names the collection)
+- ``utils.ordering.SORT_INDEXES``
+
+Indexes are matched by their fields, in order, and options (unique, partial
+filter, TTL). Key directions are ignored: MongoDB walks an index both ways
+and the queries here only sort on the trailing fields.
+"""
+from importlib import import_module
+from django.apps import apps
+from django.db import connection, models
+from pymongo import IndexModel
+
+INDEX_MODULES = [
+    'accounts.refresh_tokens',
+    'admin_panel.metrics',
+    'orders.redemptions',
+    'orders.reservations',
+    'payments.intents',
+    'products.catalog_io',
+    'products.inventory',
+]
+
+OPTIONS = ('unique', 'partialFilterExpression', 'expireAfterSeconds')
+
+
+def _column(model, name):
+    return model._meta.get_field(name).column
+
+
+def model_indexes(model):
+    """IndexModels for what ``model`` declares"""
+    opts = model._meta
+    table = opts.db_table
+    schema_editor = connection.schema_editor()
+    specs = []
+
+    for index in opts.indexes:
+        keys = [
+            (_column(model, name.lstrip('-')), -1 if name.startswith('-') else 1)
+            for name in index.fields
+        ]
+        specs.append(IndexModel(keys, name=index.name))
+
+    unique_sets = [list(fields) for fields in opts.unique_together]
+    unique_sets += [
+        list(constraint.fields) for constraint in opts.constraints
+        if isinstance(constraint, models.UniqueConstraint) and constraint.fields and constraint.condition is None
+    ]
+    for fields in unique_sets:
+        columns = [_column(model, name) for name in fields]
+        specs.append(IndexModel(
+            [(column, 1) for column in columns], unique=True,
+            name=schema_editor._create_index_name(table, columns, suffix='_uniq')
+        ))
+
+    for field in opts.local_fields:
+        column = field.column
+        if field.primary_key:
+            if column != '_id':
+                specs.append(IndexModel(column, unique=True, name='__primary_key__'))
+        elif field.unique:
+            specs.append(IndexModel(
+                column, unique=True, name=schema_editor._create_index_name(table, [column], suffix='_uniq')
+            ))
+        elif field.db_index:
+            specs.append(IndexModel(column, name=schema_editor._create_index_name(table, [column])))
+
+    specs.extend(getattr(model, 'mongo_indexes', ()))
+    return specs
+
+
+def declared_indexes():
+    """``{collection: [IndexModel, ...]}`` for every index the code relies on"""
+    from utils.ordering import SORT_INDEXES, index_name
+
+    declared = {}
+    for model in apps.get_models(include_auto_created=True):
+        if model._meta.managed and not model._meta.proxy:
+            declared.setdefault(model._meta.db_table, []).extend(model_indexes(model))
+    for path in INDEX_MODULES:
+        module = import_module(path)
+        declared.setdefault(module.COLLECTION, []).extend(module.INDEXES)
+    for table, patterns in SORT_INDEXES.items():
+        declared.setdefault(table, []).extend(IndexModel(keys, name=index_name(keys)) for keys in patterns)
+    return declared
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def signature(document):
+    """Fields and options of an index (spec ``IndexModel.document`` or ``list_indexes()`` entry)"""
+    key = document['key']
+    if '_fts' in key:
+        fields = ('$text',) + tuple(sorted(document.get('weights', {})))
+    elif 'text' in key.values():
+        fields = ('$text',) + tuple(sorted(field for field, kind in key.items() if kind == 'text'))
+    else:
+        fields = tuple(key)
+    options = tuple(
+        (option, bool(document.get(option)) if option == 'unique' else _freeze(document.get(option)))
+        for option in OPTIONS
+    )
+    return fields, options
+
+
+def diff(specs, existing):
+    """
+    Compare declared ``specs`` (IndexModels) with ``existing`` index documents.
+    Returns ``(missing, conflicting, extra)``: specs with no index on their
+    fields, ``(spec, index)`` pairs where an index has the spec's fields but
+    other options, or the spec's name but other fields, and indexes nothing
+    declares.
+    """
+    existing = [index for index in existing if index['name'] != '_id_']
+    by_name = {index['name']: index for index in existing}
+    by_fields = {}
+    for index in existing:
+        by_fields.setdefault(signature(index)[0], []).append(index)
+
+    missing, conflicting, matched = [], [], set()
+    seen = set()
+    for spec in specs:
+        fields, options = signature(spec.document)
+        if (fields, options) in seen:
+            continue
+        seen.add((fields, options))
+        candidates = by_fields.get(fields, [])
+        same = [index for index in candidates if signature(index)[1] == options]
+        if same:
+            matched.update(index['name'] for index in same)
+        elif candidates:
+            conflicting.append((spec, candidates[0]))
+            matched.update(index['name'] for index in candidates)
+        elif spec.document['name'] in by_name:
+            conflicting.append((spec, by_name[spec.document['name']]))
+            matched.add(spec.document['name'])
+        else:
+            missing.append(spec)
+
+    extra = [index for index in existing if index['name'] not in matched]
+    return missing, conflicting, extra
+
+
+def create(collection, spec):
+    """Build ``spec`` on ``collection`` in the background. Returns the index name."""
+    document = dict(spec.document)
+    keys = list(document.pop('key').items())
+    return collection.create_index(keys, background=True, **document)
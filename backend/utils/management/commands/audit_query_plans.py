@@ -0,0 +1,196 @@
+"""
+Management command to audit the MongoDB query plans behind the hot
+endpoints. Each endpoint runs in-process against the current (seeded)
+database with command monitoring on; every query it sends is then run
+through explain (executionStats) and the report flags collection scans and
+high docs-examined/returned ratios, with the round trips per endpoint.
+
+Read-only: key allocation is audited through its claim filter as a find, so
+no key is taken.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+# Commands that can be explained; everything else only counts as a round trip
+EXPLAINABLE = ('find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete')
+# Command fields explain rejects or that belong to the session
+SESSION_FIELDS = ('lsid', 'txnNumber', 'autocommit', 'startTransaction')
+
+
+class QueryCapture:
+    """Command listener that records the commands sent while ``active``"""
+
+    def __init__(self):
+        self.active = False
+        self.commands = []
+
+    def started(self, event):
+        if self.active:
+            self.commands.append((event.database_name, event.command_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def plan_stats(explain):
+    """``(stages, docs_examined, keys_examined, returned)`` of an explain result's winning plans"""
+    stages = []
+    totals = {'docs': 0, 'keys': 0, 'returned': 0}
+
+    def walk(node):
+        if isinstance(node, dict):
+            if isinstance(node.get('stage'), str):
+                stages.append(node['stage'])
+            stats = node.get('executionStats')
+            if isinstance(stats, dict) and 'totalDocsExamined' in stats:
+                totals['docs'] += stats.get('totalDocsExamined', 0)
+                totals['keys'] += stats.get('totalKeysExamined', 0)
+                totals['returned'] += stats.get('nReturned', 0)
+            for key, value in node.items():
+                # executionStages repeats the winning plan
+                if key not in ('rejectedPlans', 'allPlansExecution', 'executionStages'):
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    return stages, totals['docs'], totals['keys'], totals['returned']
+
+
+class Command(BaseCommand):
+    help = 'Explain every MongoDB query the hot endpoints send and flag collection scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', help='Only this endpoint (repeatable)')
+        parser.add_argument(
+            '--ratio',
+            type=float,
+            default=10,
+            help='Flag queries examining more than this many documents per document returned (default: 10)',
+        )
+        parser.add_argument('--verbose', action='store_true', help='List every query, not only flagged ones')
+
+    def endpoints(self):
+        """``{name: callable}`` for the hot paths, bound to sample data from the database"""
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from django.contrib.auth import get_user_model
+        from orders.models import Order
+        from orders.views import OrderViewSet
+        from payments.pricing import price_cart, PricingError
+        from products.models import Product
+        from products.views import ProductViewSet, ReviewViewSet
+        from utils import repository
+        from utils.mongo import get_db
+
+        product = next((p for p in Product.objects.all()[:50] if p.is_active is not False), None)
+        if product is None:
+            raise CommandError('No active products found; seed the database first')
+        order = Order.objects.first()
+        user = order.user if order else get_user_model().objects.first()
+        factory = APIRequestFactory()
+        product_id = str(product.pk)
+        word = (product.title.split() or [''])[0]
+
+        def get(view, actions, params=None, authenticate=False, **kwargs):
+            request = factory.get('/', params or {})
+            if authenticate and user is not None:
+                force_authenticate(request, user=user)
+            return lambda: view.as_view(actions)(request, **kwargs)
+
+        def pricing():
+            try:
+                price_cart([{'productId': product_id, 'quantity': 1}])
+            except PricingError:
+                pass
+
+        def key_allocation():
+            claim = repository.claim_filter(product_id, product.region)
+            list(get_db()[repository.DIGITAL_KEYS].find(claim, {'id': 1}).limit(1))
+
+        return {
+            'catalog_list': get(ProductViewSet, {'get': 'list'}, {'limit': 12}),
+            'catalog_search': get(ProductViewSet, {'get': 'list'}, {'search': word, 'ordering': 'price'}),
+            'catalog_detail': get(ProductViewSet, {'get': 'retrieve'}, pk=product_id),
+            'catalog_featured': get(ProductViewSet, {'get': 'featured'}),
+            'catalog_platform': get(ProductViewSet, {'get': 'by_platform'}, platform=product.platform),
+            'reviews': get(ReviewViewSet, {'get': 'list'}, {'product': product_id}),
+            'orders': get(OrderViewSet, {'get': 'list'}, authenticate=True),
+            'checkout_pricing': pricing,
+            'key_allocation': key_allocation,
+        }
+
+    def explain(self, client, database, command):
+        command = {key: value for key, value in command.items() if not key.startswith('$') and key not in SESSION_FIELDS}
+        return client[database].command('explain', command, verbosity='executionStats')
+
+    def handle(self, *args, **options):
+        from pymongo.errors import PyMongoError
+        from utils import mongo_monitoring
+        from utils.mongo import get_client
+
+        capture = QueryCapture()
+        mongo_monitoring.subscribe(capture)
+        mongo_monitoring.reconnect()
+
+        endpoints = self.endpoints()
+        names = options['endpoint'] or list(endpoints)
+        unknown = set(names) - set(endpoints)
+        if unknown:
+            raise CommandError(f'Unknown endpoint(s): {", ".join(sorted(unknown))}. Choose from {", ".join(endpoints)}')
+
+        client = get_client()
+        flagged_total = 0
+        self.stdout.write('🔎 Auditing query plans...\n')
+        for name in names:
+            capture.commands = []
+            capture.active = True
+            try:
+                endpoints[name]()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'{name}: failed: {e}'))
+            finally:
+                capture.active = False
+
+            lines = []
+            collscans = flagged = 0
+            docs_total = returned_total = 0
+            for database, command_name, command in capture.commands:
+                if command_name not in EXPLAINABLE:
+                    continue
+                collection = command.get(command_name)
+                try:
+                    stages, docs, keys, returned = plan_stats(self.explain(client, database, command))
+                except PyMongoError as e:
+                    lines.append(self.style.ERROR(f'    {command_name} {collection}: explain failed: {e}'))
+                    continue
+                docs_total += docs
+                returned_total += returned
+                is_collscan = 'COLLSCAN' in stages
+                high_ratio = docs > options['ratio'] * max(returned, 1)
+                collscans += is_collscan
+                flagged += is_collscan or high_ratio
+                if is_collscan or high_ratio or options['verbose']:
+                    query = command.get('filter', command.get('query', command.get('pipeline', '')))
+                    text = (
+                        f'    {command_name} {collection} [{" > ".join(reversed(stages))}] '
+                        f'docs {docs} keys {keys} returned {returned} {str(query)[:160]}'
+                    )
+                    lines.append(self.style.WARNING(text) if is_collscan or high_ratio else text)
+
+            flagged_total += flagged
+            summary = (
+                f'{name}: {len(capture.commands)} round trip(s), {collscans} COLLSCAN(s), '
+                f'docs examined/returned {docs_total}/{returned_total}'
+            )
+            self.stdout.write(self.style.WARNING(summary) if flagged else self.style.SUCCESS(summary))
+            for line in lines:
+                self.stdout.write(line)
+
+        mongo_monitoring.unsubscribe(capture)
+        if flagged_total:
+            self.stdout.write(self.style.WARNING(f'\n⚠️  {flagged_total} flagged quer(ies)'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✓ No collection scans or high examine ratios'))
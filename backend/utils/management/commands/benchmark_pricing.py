@@ -0,0 +1,95 @@
+"""
+Management command to benchmark the shared cart pricing engine
+"""
+from django.core.management.base import BaseCommand
+from decimal import Decimal
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cart pricing for 1-, 10- and 100-line carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=1000,
+            help='Number of pricing runs per cart size (default: 1000)',
+        )
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='1,10,100',
+            help='Comma-separated cart sizes to benchmark (default: 1,10,100)',
+        )
+        parser.add_argument(
+            '--db',
+            action='store_true',
+            help='Load products from the database on every run (measures the $in query too)',
+        )
+
+    def build_products(self, count):
+        """Build unsaved in-memory products so the benchmark needs no database"""
+        from bson import ObjectId
+        from products.models import Product
+
+        products = {}
+        for i in range(count):
+            product = Product(
+                _id=ObjectId(),
+                title=f'Benchmark product {i}',
+                price=Decimal(random.randint(500, 9999)) / 100,
+                discount=random.choice([0, 0, 10, 25]),
+                stock=1000,
+                is_active=True,
+            )
+            products[str(product.pk)] = product
+        return products
+
+    def load_db_products(self, count):
+        from products.models import Product
+
+        products = {}
+        for product in Product.objects.all()[:count]:
+            if product.is_active is not False:
+                products[str(product.pk)] = product
+        return products
+
+    def handle(self, *args, **options):
+        from payments.pricing import price_cart
+
+        iterations = max(1, options['iterations'])
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        use_db = options['db']
+
+        self.stdout.write(self.style.SUCCESS('\n=== Cart Pricing Benchmark ===\n'))
+        self.stdout.write(f'Mode: {"database ($in query per run)" if use_db else "in-memory products"}')
+        self.stdout.write(f'Iterations per size: {iterations}\n')
+
+        for size in sizes:
+            products = self.load_db_products(size) if use_db else self.build_products(size)
+            if len(products) < size:
+                self.stdout.write(self.style.WARNING(
+                    f'  {size:>4} lines: skipped (only {len(products)} active products available)'
+                ))
+                continue
+
+            items = [{'productId': product_id, 'quantity': random.randint(1, 3)} for product_id in products]
+            loaded = None if use_db else products
+
+            # Warm up once so one-off import/cache costs don't skew the numbers
+            price_cart(items, products=loaded)
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                price_cart(items, products=loaded)
+            elapsed = time.perf_counter() - start
+
+            per_cart_us = elapsed / iterations * 1_000_000
+            per_line_us = per_cart_us / size
+            self.stdout.write(
+                f'  {size:>4} lines: {per_cart_us:10.1f} µs/cart  {per_line_us:8.2f} µs/line'
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark complete'))
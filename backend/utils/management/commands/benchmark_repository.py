@@ -0,0 +1,105 @@
+"""
+Management command to compare ORM (djongo) and native (utils.repository)
+latency for the hot read paths: catalog page, product detail, review stats
+and the available-key lookup used at fulfillment. Read-only.
+"""
+from django.core.management.base import BaseCommand, CommandError
+import statistics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ORM vs native pymongo latency per hot endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Runs per path (default: 200)',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=12,
+            help='Catalog page size (default: 12)',
+        )
+
+    def measure(self, func, iterations):
+        func()  # Warm up (connections, imports)
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def handle(self, *args, **options):
+        from products.models import Product, Review
+        from products.serializers import ProductListSerializer, ProductSerializer
+        from products.inventory import get_available_map
+        from orders.models import DigitalKey
+        from utils import repository
+        from utils.mongo import get_db
+
+        iterations = max(1, options['iterations'])
+        limit = options['limit']
+
+        product = Product.objects.first()
+        if product is None:
+            raise CommandError('No products found; seed the database first')
+        product_id = str(product.pk)
+
+        def orm_catalog():
+            products = [p for p in Product.objects.all().order_by('-created_at') if p.is_active is not False][:limit]
+            ProductListSerializer(products, many=True, context={'key_inventory': get_available_map(products)}).data
+
+        def native_catalog():
+            repository.list_products({'limit': str(limit)})
+
+        def orm_detail():
+            instance = Product.objects.get(pk=product.pk)
+            ProductSerializer(instance, context={'key_inventory': get_available_map([instance])}).data
+
+        def native_detail():
+            repository.get_product(product_id)
+
+        def orm_review_stats():
+            reviews = list(Review.objects.filter(product_id=product.pk))
+            if reviews:
+                sum(review.rating for review in reviews) / len(reviews)
+
+        def native_review_stats():
+            repository.review_stats(product_id)
+
+        def orm_keys():
+            list(DigitalKey.objects.filter(
+                product=product, is_used=False, order__isnull=True, region=product.region
+            )[:1])
+
+        def native_keys():
+            get_db()[repository.DIGITAL_KEYS].find_one(
+                {'product_id': product.pk, 'region': product.region, 'is_used': False, 'order_id': None},
+                {'id': 1, 'encrypted_key': 1}
+            )
+
+        paths = [
+            ('catalog page', orm_catalog, native_catalog),
+            ('product detail', orm_detail, native_detail),
+            ('review stats', orm_review_stats, native_review_stats),
+            ('key lookup', orm_keys, native_keys),
+        ]
+
+        self.stdout.write(self.style.SUCCESS('\n=== ORM vs native latency ===\n'))
+        self.stdout.write(f'Iterations per path: {iterations}\n')
+        self.stdout.write(f'  {"path":<16} {"ORM p50":>10} {"ORM p95":>10} {"native p50":>11} {"native p95":>11} {"speedup":>8}')
+        for name, orm, native in paths:
+            orm_p50, orm_p95 = self.measure(orm, iterations)
+            native_p50, native_p95 = self.measure(native, iterations)
+            speedup = orm_p50 / native_p50 if native_p50 else float('inf')
+            self.stdout.write(
+                f'  {name:<16} {orm_p50:8.2f}ms {orm_p95:8.2f}ms {native_p50:9.2f}ms {native_p95:9.2f}ms {speedup:7.1f}x'
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark complete'))
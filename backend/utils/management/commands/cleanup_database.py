@@ -65,6 +65,12 @@ class Command(BaseCommand):
             'digital_keys',
             'promo_codes',
             'users',
+            'stock_reservations',  # Checkout stock holds (orders.reservations)
+            'payment_intent_keys',  # Checkout idempotency keys (payments.intents)
+            'key_inventory',  # Available-key counters per product/region (products.inventory)
+            'promo_redemptions',  # Promo code redemption ledger (orders.redemptions)
+            'dashboard_metrics',  # Admin dashboard totals and time series (admin_panel.metrics)
+            'refresh_tokens',  # Hashed refresh token sessions (accounts.refresh_tokens)
             
             # Many-to-many relationship collections
             # PromoCode.applicable_products creates this collection
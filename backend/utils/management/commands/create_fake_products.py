@@ -319,6 +319,10 @@ class Command(BaseCommand):
                         self.stdout.write(self.style.WARNING(f'⚠️  Could not create key for {product.title}: {e}'))
         
         self.stdout.write(self.style.SUCCESS(f'✅ Created {total_keys} digital keys'))
+        
+        # Keys were created through the ORM, so rebuild the available-key counters
+        from products.inventory import reconcile
+        reconcile()
         self.stdout.write(self.style.SUCCESS('\n🎉 Fake products created successfully!'))
         self.stdout.write(f'\n📊 Summary:')
         self.stdout.write(f'   - Total products: {len(created_products)}')
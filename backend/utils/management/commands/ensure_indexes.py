@@ -0,0 +1,79 @@
+"""
+Management command to build the MongoDB indexes declared in code
+(utils.indexes): diffs every collection's specs against list_indexes(),
+builds missing indexes in the background and reports indexes that differ
+from their spec or that nothing declares. Indexes are only dropped with
+--rebuild, and only those that conflict with a spec.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Create missing MongoDB indexes declared by models and native collections; report extras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report, do not create indexes')
+        parser.add_argument('--collection', action='append', help='Only this collection (repeatable)')
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Drop indexes that conflict with a spec (other options, or its name on other fields) and build the spec',
+        )
+
+    def handle(self, *args, **options):
+        from pymongo.errors import PyMongoError
+        from utils import indexes
+        from utils.mongo import get_db
+
+        if settings.DATABASES['default']['ENGINE'] != 'djongo':
+            self.stdout.write('Not using MongoDB, nothing to do')
+            return
+
+        db = get_db()
+        declared = indexes.declared_indexes()
+        names = options['collection'] or sorted(declared)
+        created = failed = 0
+
+        self.stdout.write('🔎 Checking MongoDB indexes...')
+        for name in names:
+            collection = db[name]
+            try:
+                existing = list(collection.list_indexes())
+            except PyMongoError as e:
+                self.stdout.write(self.style.ERROR(f'  {name}: could not list indexes: {e}'))
+                failed += 1
+                continue
+
+            missing, conflicting, extra = indexes.diff(declared.get(name, []), existing)
+            if options['rebuild'] and not options['dry_run']:
+                for spec, index in conflicting:
+                    self.stdout.write(f'  {name}: dropping {index["name"]} to rebuild {spec.document["name"]}')
+                    collection.drop_index(index['name'])
+                missing += [spec for spec, _ in conflicting]
+                conflicting = []
+            for spec in missing:
+                keys = dict(spec.document['key'])
+                if options['dry_run']:
+                    self.stdout.write(f'  {name}: missing {spec.document["name"]} {keys}')
+                    continue
+                try:
+                    indexes.create(collection, spec)
+                    created += 1
+                    self.stdout.write(self.style.SUCCESS(f'  {name}: created {spec.document["name"]} {keys}'))
+                except PyMongoError as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'  {name}: could not create {spec.document["name"]}: {e}'))
+            for spec, index in conflicting:
+                self.stdout.write(self.style.WARNING(
+                    f'  {name}: {index["name"]} differs from spec {spec.document["name"]} '
+                    f'(run with --rebuild to replace it)'
+                ))
+            for index in extra:
+                self.stdout.write(self.style.WARNING(f'  {name}: extra index {index["name"]} {dict(index["key"])}'))
+
+        summary = f'✓ Checked {len(names)} collection(s), created {created} index(es)'
+        if failed:
+            self.stdout.write(self.style.ERROR(f'{summary}, {failed} failure(s)'))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,30 @@
+"""
+Management command to stream the product catalog out as CSV or JSONL,
+in the same columns import_products reads. Archived products are left out
+unless --include-archived is given.
+"""
+from django.core.management.base import BaseCommand
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Export the product catalog as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file-type', choices=['csv', 'jsonl'], default='csv')
+        parser.add_argument('--output', default='-', help='Output file (default: stdout)')
+        parser.add_argument('--include-archived', action='store_true', help='Also export archived products')
+
+    def handle(self, *args, **options):
+        from products import catalog_io
+
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            for batch in catalog_io.export_products(options['file_type'], include_archived=options['include_archived']):
+                output.write(batch)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if output is not sys.stdout:
+            self.stdout.write(self.style.SUCCESS(f'✓ Exported products to {options["output"]}'))
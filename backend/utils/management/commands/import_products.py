@@ -0,0 +1,58 @@
+"""
+Management command to upsert products by SKU from a CSV or JSONL supplier feed.
+The feed is stream-parsed and written with chunked bulk_write upserts.
+"""
+from django.core.management.base import BaseCommand, CommandError
+import sys
+import time
+
+
+class Command(BaseCommand):
+    help = 'Import (upsert by SKU) products from a CSV or JSONL feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file, or - for stdin')
+        parser.add_argument('--file-type', choices=['csv', 'jsonl'], help='Feed format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per bulk_write (default: 1000)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the feed without writing')
+
+    def handle(self, *args, **options):
+        from products import catalog_io
+
+        path = options['path']
+        fmt = options['file_type'] or catalog_io.detect_format(path, default=None)
+        if fmt is None:
+            raise CommandError('Could not tell the feed format from the file name; pass --file-type')
+
+        source = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        start = time.perf_counter()
+        try:
+            self.stdout.write(f'📦 Importing products from {path} ({fmt})...')
+            report = catalog_io.import_products(
+                catalog_io.read_rows(source, fmt),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+            )
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        elapsed = time.perf_counter() - start
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(
+                f'  Row {error["row"]} (sku={error["sku"]}): {"; ".join(error["errors"])}'
+            ))
+        skipped = report['invalid'] + report['failed']
+        if skipped > len(report['errors']):
+            self.stdout.write(self.style.WARNING(
+                f'  ... and {skipped - len(report["errors"])} more skipped row(s)'
+            ))
+
+        if report['aborted']:
+            self.stdout.write(self.style.ERROR('  The feed could not be read further; rows after the error were not imported'))
+
+        prefix = '(dry run) ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {prefix}{report["rows"]} row(s) in {elapsed:.1f}s: {report["created"]} created, '
+            f'{report["updated"]} updated, {report["invalid"]} invalid, {report["failed"]} failed'
+        ))
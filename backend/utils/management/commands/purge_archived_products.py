@@ -0,0 +1,35 @@
+"""
+Management command to hard-delete products archived more than N days ago,
+with batched native delete_many calls per collection. Sold keys and order
+items are kept; products they reference stay archived.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+
+
+class Command(BaseCommand):
+    help = 'Hard-delete archived products and their unsold keys, reviews and promo links'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days',
+            type=int,
+            default=30,
+            help='Only purge products archived at least this many days ago (default: 30)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Documents per delete_many (default: 5000)')
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of products to purge')
+
+    def handle(self, *args, **options):
+        from products import archival
+
+        older_than = timezone.now() - timedelta(days=options['older_than_days'])
+        self.stdout.write(f'🗑️  Purging products archived before {older_than:%Y-%m-%d %H:%M}...')
+        examined, totals = archival.purge(older_than, batch_size=options['batch_size'], limit=options['limit'])
+
+        for collection, count in totals.items():
+            self.stdout.write(f'  {collection}: {count} deleted')
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Purged {totals.get("products", 0)} of {examined} archived product(s)'
+        ))
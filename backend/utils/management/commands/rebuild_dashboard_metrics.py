@@ -0,0 +1,32 @@
+"""
+Management command to recompute the admin dashboard totals and hourly/daily
+time series from the users and orders collections. Safe to run on a live
+store: documents incremented while it counts keep their live values.
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the incrementally maintained admin dashboard metrics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-missing', action='store_true',
+            help='Only rebuild if the totals have never been built (run at startup)'
+        )
+
+    def handle(self, *args, **options):
+        from admin_panel import metrics
+
+        if options['if_missing'] and metrics.is_built():
+            self.stdout.write('Dashboard metrics already built')
+            return
+
+        self.stdout.write('📊 Rebuilding dashboard metrics...')
+        written, conflicts = metrics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✓ Rebuilt {written} metrics document(s)'))
+        if conflicts:
+            self.stdout.write(self.style.WARNING(
+                f'  {len(conflicts)} document(s) were updated during the rebuild and kept their live values; '
+                f'rerun to recount them: {", ".join(map(str, conflicts))}'
+            ))
@@ -0,0 +1,27 @@
+"""
+Management command to rebuild the per-(product, region) key inventory counters
+from the digital_keys collection with a single aggregation.
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Recompute available-key counters from digital_keys'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--skip-product-stock',
+            action='store_true',
+            help='Do not refresh the legacy products.stock field',
+        )
+
+    def handle(self, *args, **options):
+        from products import inventory
+
+        self.stdout.write('🔑 Reconciling key inventory counters...')
+        counters, skipped = inventory.reconcile(sync_product_stock=not options['skip_product_stock'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Reconciled {counters} (product, region) counter(s)'))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'  {skipped} counter(s) changed while reconciling and kept their live value; rerun to recount them'
+            ))
@@ -0,0 +1,24 @@
+"""
+Management command to release expired checkout stock reservations.
+Run it periodically (e.g. every minute from cron) so abandoned checkouts
+return their stock even when nobody else is checking out.
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Release expired stock reservations and return their stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=10000,
+            help='Maximum number of reservations to release in one run (default: 10000)',
+        )
+
+    def handle(self, *args, **options):
+        from orders import reservations
+
+        released = reservations.release_expired(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Released {released} expired reservation(s)'))
@@ -184,6 +184,10 @@ class Command(BaseCommand):
         
         self.stdout.write(self.style.SUCCESS(f'✅ Created {total_keys} digital keys'))
         
+        # Keys were created through the ORM, so rebuild the available-key counters
+        from products.inventory import reconcile
+        reconcile()
+        
         # Create promo codes
         self.stdout.write('🎟️  Creating promo codes...')
         
@@ -0,0 +1,78 @@
+"""
+Direct MongoDB access for operations the djongo ORM can't express
+(atomic conditional updates, TTL indexes, bulk writes) and for hot read
+paths that skip djongo's SQL translation (utils.repository)
+"""
+import threading
+from django.conf import settings
+from django.db import connection
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide pymongo client for native queries, with its own pool of
+    ``MONGO_MAX_POOL_SIZE`` connections.
+    """
+    global _client
+    if _client is None:
+        from pymongo import MongoClient
+
+        with _client_lock:
+            if _client is None:
+                options = dict(settings.DATABASES['default'].get('CLIENT', {}))
+                options.setdefault('maxPoolSize', settings.MONGO_MAX_POOL_SIZE)
+                options.setdefault('connect', False)
+                _client = MongoClient(**options)
+    return _client
+
+
+def close_client():
+    """Close the shared client; the next get_client() opens a new one"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_db():
+    """Return the pymongo Database for the default database, on the shared client"""
+    return get_client()[settings.DATABASES['default']['NAME']]
+
+
+def allocate_ids(table, count):
+    """
+    Reserve ``count`` consecutive auto-increment IDs for a djongo table.
+
+    djongo keeps AutoField sequences in the ``__schema__`` collection; rows
+    inserted natively (e.g. with insert_many) must take their IDs from the
+    same sequence so the ORM can still load them. Returns a range of IDs.
+    """
+    from pymongo import ReturnDocument
+
+    schema = get_db()['__schema__'].find_one_and_update(
+        {'name': table, 'auto': {'$exists': True}},
+        {'$inc': {'auto.seq': count}},
+        return_document=ReturnDocument.AFTER
+    )
+    if schema is None:
+        raise ValueError(f'No auto-increment sequence found for table {table}')
+    last = schema['auto']['seq']
+    return range(last - count + 1, last + 1)
+
+
+def model_document(instance, exclude_pk=True):
+    """
+    Build the MongoDB document the ORM would insert for an unsaved model
+    instance (column names, auto_now values, db-prepared field values).
+    """
+    document = {}
+    for field in instance._meta.concrete_fields:
+        if exclude_pk and field.primary_key:
+            continue
+        value = field.pre_save(instance, add=True)
+        document[field.column] = field.get_db_prep_save(value, connection)
+    return document
@@ -0,0 +1,75 @@
+"""
+pymongo command monitoring shared by the diagnostics that need it.
+
+pymongo only sends events to listeners registered before a client is
+created, and builds an event for every command once any listener exists.
+``install()`` therefore registers a single dispatcher, only when something
+asks for it, and ``subscribe()`` adds listeners to it at any time.
+``reconnect()`` drops the clients already open (djongo's and the shared
+native one) so the next query goes through a monitored client.
+"""
+import threading
+from pymongo import monitoring
+
+
+class CommandDispatcher(monitoring.CommandListener):
+    """Forwards command events to the current subscribers"""
+
+    def __init__(self):
+        self.subscribers = ()
+        self._lock = threading.Lock()
+
+    def add(self, listener):
+        with self._lock:
+            self.subscribers = self.subscribers + (listener,)
+
+    def remove(self, listener):
+        with self._lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not listener)
+
+    def started(self, event):
+        for listener in self.subscribers:
+            listener.started(event)
+
+    def succeeded(self, event):
+        for listener in self.subscribers:
+            listener.succeeded(event)
+
+    def failed(self, event):
+        for listener in self.subscribers:
+            listener.failed(event)
+
+
+dispatcher = CommandDispatcher()
+_installed = False
+
+
+def install():
+    """Register the dispatcher with pymongo (once). Affects clients created afterwards."""
+    global _installed
+    if not _installed:
+        monitoring.register(dispatcher)
+        _installed = True
+
+
+def reconnect():
+    """Close open MongoDB clients so the next query opens a monitored one"""
+    from django.db import connections
+    from utils.mongo import close_client
+
+    connections.close_all()
+    try:
+        import djongo.database
+        djongo.database.clients.clear()
+    except ImportError:
+        pass
+    close_client()
+
+
+def subscribe(listener):
+    install()
+    dispatcher.add(listener)
+
+
+def unsubscribe(listener):
+    dispatcher.remove(listener)
@@ -0,0 +1,20 @@
+"""
+Client address helpers shared by the login throttle and request tracing.
+"""
+import ipaddress
+from django.conf import settings
+
+_trusted_networks = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES]
+
+
+def is_trusted_proxy(address):
+    """Whether ``address`` (a REMOTE_ADDR) is in TRUSTED_PROXIES"""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_networks)
+
+
+def from_trusted_proxy(request):
+    return is_trusted_proxy(request.META.get('REMOTE_ADDR', ''))
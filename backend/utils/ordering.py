@@ -0,0 +1,130 @@
+"""
+Server-side ordering for djongo queries.
+
+The views' ``ordering_fields`` (products: ``created_at``, ``price``; reviews:
+``created_at``, ``rating``) are served by the indexes in ``SORT_INDEXES``.
+``imset_ecommerce.djongo_patch`` uses this module to translate an ORDER BY
+that djongo can't parse into a native sort instead of dropping it, and to
+hint the matching index on sorted ``find`` queries so MongoDB walks the
+index (and stops at LIMIT) rather than sorting the filtered set in memory.
+
+A hint is only given when the index's equality prefix is the whole filter.
+With any other condition the planner may know a more selective index, so the
+choice is left to it. The indexes are built by ``ensure_indexes``; this
+module only reads which of them exist.
+"""
+import logging
+import re
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Key patterns per collection. An index serves a sort when its leading keys
+# are equality-filtered and the remaining keys are the sort fields (in the
+# index's directions or all reversed).
+SORT_INDEXES = {
+    'products': [
+        [('created_at', -1)],
+        [('price', 1)],
+    ],
+    'reviews': [
+        [('product_id', 1), ('created_at', -1)],
+        [('product_id', 1), ('rating', 1)],
+        [('created_at', -1)],
+        [('rating', 1)],
+    ],
+}
+
+SortColumn = namedtuple('SortColumn', 'table column field order')
+
+_ORDER_BY = re.compile(r'\s+ORDER\s+BY\s+(.+?)(?=\s+LIMIT\s|\s+OFFSET\s|\s*$)', re.IGNORECASE | re.DOTALL)
+_ORDER_COLUMN = re.compile(r'^(?:"?(\w+)"?\.)?"?(\w+)"?(?:\s+(ASC|DESC))?$', re.IGNORECASE)
+
+_sort_indexes = {}
+
+
+def index_name(keys):
+    return 'sort_' + '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+def split_order_by(sql):
+    """
+    ``(columns, sql_without_order_by)`` for a SELECT whose ORDER BY lists
+    plain columns, where columns are ``[(table or None, column, 1 | -1)]``.
+    Returns None if there is no ORDER BY or it orders by anything else.
+    """
+    match = _ORDER_BY.search(sql)
+    if match is None:
+        return None
+    columns = []
+    for part in match.group(1).split(','):
+        column = _ORDER_COLUMN.match(part.strip())
+        if column is None:
+            return None
+        table, name, direction = column.groups()
+        columns.append((table, name, -1 if (direction or '').upper() == 'DESC' else 1))
+    return columns, sql[:match.start()] + sql[match.end():]
+
+
+def equality_fields(query_filter):
+    """
+    Fields a djongo ``find`` filter pins to a single value, or None if it
+    has any other condition
+    """
+    fields = set()
+    for key, value in (query_filter or {}).items():
+        if key == '$and':
+            for clause in value:
+                clause_fields = equality_fields(clause)
+                if clause_fields is None:
+                    return None
+                fields |= clause_fields
+        elif not key.startswith('$') and (not isinstance(value, dict) or set(value) == {'$eq'}):
+            fields.add(key)
+        else:
+            return None
+    return fields
+
+
+def sort_hint(indexes, query_filter, sort):
+    """
+    Key pattern among ``indexes`` that serves ``sort`` (``[(field, 1 | -1)]``)
+    and whose leading keys are exactly the fields ``query_filter`` pins, or
+    None.
+    """
+    equal = equality_fields(query_filter)
+    if equal is None:
+        return None
+    for keys in indexes:
+        prefix, tail = keys[:len(keys) - len(sort)], keys[len(keys) - len(sort):]
+        if len(tail) != len(sort) or {field for field, _ in prefix} != equal:
+            continue
+        if [field for field, _ in tail] != [field for field, _ in sort]:
+            continue
+        if all(a == b for (_, a), (_, b) in zip(tail, sort)) or all(a == -b for (_, a), (_, b) in zip(tail, sort)):
+            return keys
+    return None
+
+
+def sort_indexes(db, table):
+    """
+    Key patterns of the existing indexes on ``table`` that have the fields of
+    one of its ``SORT_INDEXES``, read once per process. Only these are ever
+    hinted, so a missing index can't turn into failing queries.
+    """
+    if table not in _sort_indexes:
+        from pymongo.errors import PyMongoError
+
+        wanted = {tuple(field for field, _ in keys) for keys in SORT_INDEXES.get(table, [])}
+        found = []
+        if wanted:
+            try:
+                for index in db[table].index_information().values():
+                    keys = [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+                            for field, direction in index['key']]
+                    if tuple(field for field, _ in keys) in wanted:
+                        found.append(keys)
+            except PyMongoError as e:
+                logger.warning(f'Could not check sort indexes on {table}: {e}')
+        _sort_indexes[table] = found
+    return _sort_indexes[table]
@@ -0,0 +1,141 @@
+"""
+On-demand request profiling (``PROFILING_ENABLED``).
+
+An admin adds ``?__profile=cprofile`` (or ``pyinstrument``) to any request
+to profile it; ``PROFILE_SAMPLE_RATE`` additionally profiles that share of
+all requests with cProfile. Reports go to ``PROFILE_DIR`` as ``.prof``
+(cProfile, for pstats/snakeviz) or ``.html`` (pyinstrument), only the newest
+``PROFILE_KEEP`` are kept, and the response names its report in an
+``X-Profile`` header. Admins list and download reports at
+``/api/admin/profiles/``.
+
+pyinstrument is optional; without it ``pyinstrument`` requests fall back to
+cProfile. When profiling is off the middleware removes itself at startup.
+"""
+import cProfile
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+QUERY_FLAG = '__profile'
+MODES = ('cprofile', 'pyinstrument')
+EXTENSIONS = ('.prof', '.html')
+REPORT_NAME = re.compile(r'^[\w.-]+\.(prof|html)$')
+
+
+def requested_by_admin(request):
+    """Whether the request is authenticated (JWT) as an admin"""
+    from accounts.authentication import CachedJWTAuthentication
+    from rest_framework.exceptions import APIException
+
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return result is not None and result[0].role == 'admin'
+
+
+def report_name(request, extension):
+    path = re.sub(r'\W+', '_', request.path).strip('_')[:60] or 'root'
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+    return f'{stamp}-{request.method}-{path}{extension}'
+
+
+def prune():
+    """Delete all but the newest PROFILE_KEEP reports"""
+    for entry in recent_profiles()[settings.PROFILE_KEEP:]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, entry['name']))
+        except OSError:
+            pass
+
+
+def recent_profiles():
+    """Reports in PROFILE_DIR, newest first"""
+    try:
+        entries = list(os.scandir(settings.PROFILE_DIR))
+    except FileNotFoundError:
+        return []
+    reports = []
+    for entry in entries:
+        if entry.is_file() and entry.name.endswith(EXTENSIONS):
+            stat = entry.stat()
+            reports.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'createdAt': datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+                'format': 'cprofile' if entry.name.endswith('.prof') else 'pyinstrument',
+            })
+    return sorted(reports, key=lambda report: report['name'], reverse=True)
+
+
+def profile_path(name):
+    """Path of the report ``name`` in PROFILE_DIR, or None if there is no such report"""
+    if not REPORT_NAME.match(name or ''):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def run_cprofile(get_response, request):
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler per process (concurrent request)
+        return get_response(request), None
+    try:
+        response = get_response(request)
+    finally:
+        profiler.disable()
+    name = report_name(request, '.prof')
+    profiler.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+    return response, name
+
+
+def run_pyinstrument(get_response, request):
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        return run_cprofile(get_response, request)
+
+    profiler = Profiler()
+    profiler.start()
+    try:
+        response = get_response(request)
+    finally:
+        profiler.stop()
+    name = report_name(request, '.html')
+    with open(os.path.join(settings.PROFILE_DIR, name), 'w') as f:
+        f.write(profiler.output_html())
+    return response, name
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+
+    def __call__(self, request):
+        mode = request.GET.get(QUERY_FLAG)
+        if mode is not None:
+            if mode not in MODES or not requested_by_admin(request):
+                mode = None
+        elif settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            mode = 'cprofile'
+        if mode is None:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        runner = run_pyinstrument if mode == 'pyinstrument' else run_cprofile
+        response, name = runner(self.get_response, request)
+        if name is not None:
+            response['X-Profile'] = f'{name}; dur={(time.perf_counter() - start) * 1000:.1f}'
+            prune()
+        return response
@@ -0,0 +1,210 @@
+"""
+Prometheus metrics (``METRICS_ENABLED``), served at ``/api/metrics``.
+
+- ``http_requests_total`` / ``http_request_duration_seconds``: every request
+  by method, URL route (the pattern, not the path) and status code
+- ``cache_requests_total``: hits and misses of the in-process caches (promo
+  codes, JWT user snapshots)
+- ``external_call_duration_seconds``: Stripe API calls and outgoing mail
+- ``stripe_webhooks_total`` / ``stripe_webhooks_in_progress``: webhook
+  deliveries by event type and the ones being handled right now
+- ``key_pool_available`` / ``key_pools_empty`` (per region),
+  ``key_pool_lowest_available`` (the ``METRICS_LOW_STOCK_SERIES`` lowest
+  product pools) and ``stock_reservations_held``: read from
+  ``key_inventory`` and ``stock_reservations`` when the endpoint is scraped,
+  so the series count doesn't grow with the catalog
+
+With several worker processes, set ``PROMETHEUS_MULTIPROC_DIR`` to a
+directory shared by the workers and emptied on start (docker-entrypoint.sh
+does this); every process then writes its samples to memory-mapped files
+there and a scrape of any worker returns the sum. Under gunicorn, call
+``child_exit`` from the ``child_exit`` server hook so the in-progress gauge
+drops the samples of dead workers.
+
+Scrapes must send ``Authorization: Bearer <METRICS_TOKEN>``; enabling
+metrics without a token is a configuration error, since the endpoint would
+publish stock levels and traffic to anyone who can reach the backend port.
+
+When ``METRICS_ENABLED`` is off the middleware removes itself at startup,
+the helpers below return immediately and ``/api/metrics`` is a 404.
+"""
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+ENABLED = settings.METRICS_ENABLED
+
+# Anything else is counted as 'other', so clients can't invent label values
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by route and status', ['method', 'route', 'status'],
+)
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route'],
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'In-process cache lookups', ['cache', 'result'],
+)
+EXTERNAL_CALL_DURATION = Histogram(
+    'external_call_duration_seconds', 'Latency of calls to Stripe and the mail server',
+    ['service', 'operation', 'outcome'],
+)
+WEBHOOKS = Counter(
+    'stripe_webhooks_total', 'Stripe webhook deliveries by event type', ['event'],
+)
+WEBHOOKS_IN_PROGRESS = Gauge(
+    'stripe_webhooks_in_progress', 'Stripe webhooks being handled', multiprocess_mode='livesum',
+)
+
+
+def method_name(request):
+    return request.method if request.method in METHODS else 'other'
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Unmatched paths share one label so scanners can't blow up the series count
+        return 'unresolved'
+    return match.route or match.view_name or 'unknown'
+
+
+def cache_lookup(cache, hit):
+    """Count a hit or miss of one of the in-process caches"""
+    if ENABLED:
+        CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+@contextmanager
+def external_call(service, operation):
+    """Time a call to an external service (``outcome`` is ``ok`` or ``error``)"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        EXTERNAL_CALL_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def webhook(event_type):
+    """Count a webhook delivery and track it as in progress while handled"""
+    if not ENABLED:
+        yield
+        return
+    WEBHOOKS.labels(event_type).inc()
+    WEBHOOKS_IN_PROGRESS.inc()
+    try:
+        yield
+    finally:
+        WEBHOOKS_IN_PROGRESS.dec()
+
+
+class InventoryCollector:
+    """
+    Key pool and reservation levels, read from MongoDB at scrape time.
+
+    The counters are summed per region by the server (a handful of rows);
+    only the lowest pools get a per-product series, read through the
+    ``available`` index.
+    """
+
+    def collect(self):
+        from orders import reservations
+        from products import inventory
+
+        pool = GaugeMetricFamily(
+            'key_pool_available', 'Unused keys per region', labels=['region'],
+        )
+        empty = GaugeMetricFamily(
+            'key_pools_empty', 'Products with no unused keys left, per region', labels=['region'],
+        )
+        lowest = GaugeMetricFamily(
+            'key_pool_lowest_available', 'Unused keys of the products closest to selling out',
+            labels=['product_id', 'region'],
+        )
+        held = GaugeMetricFamily(
+            'stock_reservations_held', 'Checkouts holding keys while waiting for their payment webhook',
+        )
+        if settings.DATABASES['default']['ENGINE'] == 'djongo':
+            counters = inventory.get_collection()
+            for row in counters.aggregate([{'$group': {
+                '_id': '$region',
+                'available': {'$sum': '$available'},
+                'empty': {'$sum': {'$cond': [{'$lte': ['$available', 0]}, 1, 0]}},
+            }}]):
+                pool.add_metric([str(row['_id'])], row['available'])
+                empty.add_metric([str(row['_id'])], row['empty'])
+            if settings.METRICS_LOW_STOCK_SERIES > 0:
+                for counter in counters.find(
+                    {}, {'product_id': 1, 'region': 1, 'available': 1}
+                ).sort('available', 1).limit(settings.METRICS_LOW_STOCK_SERIES):
+                    lowest.add_metric([str(counter.get('product_id')), str(counter.get('region'))], counter.get('available', 0))
+            held.add_metric([], reservations.get_collection().count_documents({'status': reservations.HELD}))
+        yield pool
+        yield empty
+        yield lowest
+        yield held
+
+
+def scrape_registry():
+    """Registry for one scrape: every worker's samples plus the inventory gauges"""
+    registry = CollectorRegistry()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry.register(REGISTRY)
+    registry.register(InventoryCollector())
+    return registry
+
+
+def metrics_view(request):
+    """Prometheus text exposition; requires ``Bearer METRICS_TOKEN``"""
+    if not ENABLED:
+        raise Http404
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+        return HttpResponse(status=401)
+    return HttpResponse(generate_latest(scrape_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+def child_exit(server, worker):
+    """gunicorn ``child_exit`` hook: drop a dead worker's live gauge samples"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        if not settings.METRICS_TOKEN:
+            raise ImproperlyConfigured('METRICS_ENABLED requires METRICS_TOKEN')
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            method, route = method_name(request), route_name(request)
+            REQUESTS.labels(method, route, str(status)).inc()
+            REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - start)
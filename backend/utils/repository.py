@@ -0,0 +1,302 @@
+"""
+Native MongoDB repository for hot read paths.
+
+Catalog reads, review statistics and key allocation run here as native
+pymongo queries on the shared client (``utils.mongo.get_client``) instead of
+going through Django's SQL compiler and djongo's SQL-to-Mongo translation.
+Results are plain dicts already in the API's shape, so views return them
+without a DRF serializer pass.
+
+The ORM stays the source of truth for writes other than key allocation;
+``benchmark_repository`` compares both paths.
+"""
+import json
+import re
+from bson import ObjectId
+from django.utils import timezone
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+from utils.mongo import get_db
+
+PRODUCTS = 'products'
+REVIEWS = 'reviews'
+DIGITAL_KEYS = 'digital_keys'
+
+# Prices are stored in base currency and shown converted (see ProductSerializer)
+DISPLAY_PRICE_FACTOR = 3.2
+
+# Query parameter -> products column, for equality filters (as ProductViewSet)
+FILTER_FIELDS = {
+    'product_type': 'product_type',
+    'productType': 'product_type',
+    'platform': 'platform',
+    'category': 'category',
+    'region': 'region',
+}
+ORDERING_FIELDS = {'created_at', 'price'}
+DEFAULT_ORDERING = '-created_at'
+
+PRODUCT_PROJECTION = {
+    'title': 1, 'description': 1, 'price': 1, 'product_type': 1, 'platform': 1, 'region': 1,
+    'category': 1, 'images': 1, 'is_digital': 1, 'is_active': 1, 'featured': 1, 'discount': 1,
+    'created_at': 1,
+}
+# The detail view also returns the SKU (ProductSerializer)
+PRODUCT_DETAIL_PROJECTION = dict(PRODUCT_PROJECTION, sku=1)
+
+
+def _object_id(value):
+    return value if isinstance(value, ObjectId) else ObjectId(str(value))
+
+
+def _number(value):
+    if value is None:
+        return 0.0
+    if hasattr(value, 'to_decimal'):
+        value = value.to_decimal()
+    return float(value)
+
+
+def _images(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return []
+    return value or []
+
+
+def _datetime(value):
+    """ISO 8601 like DRF's DateTimeField (stored datetimes are naive UTC)"""
+    if value is None:
+        return None
+    text = value.isoformat()
+    return text[:-6] + 'Z' if text.endswith('+00:00') else (text if value.tzinfo else text + 'Z')
+
+
+def product_dict(document, available=None, detail=False):
+    """
+    Product document -> API representation (same keys as ProductListSerializer,
+    or as ProductSerializer with ``detail``)
+    """
+    representation = {'_id': str(document['_id'])}
+    if detail:
+        representation['sku'] = document.get('sku')
+    representation.update({
+        'title': document.get('title'),
+        'description': document.get('description', ''),
+        'price': _number(document.get('price')) * DISPLAY_PRICE_FACTOR,
+        'productType': document.get('product_type'),
+        'platform': document.get('platform'),
+        'region': document.get('region', 'Global'),
+        'category': document.get('category'),
+        'images': _images(document.get('images')),
+        'isDigital': document.get('is_digital', True),
+        'isActive': document.get('is_active', True),
+        'stock': available if available is not None else document.get('stock', 0),
+        'featured': document.get('featured', False),
+        'discount': document.get('discount', 0),
+        'createdAt': _datetime(document.get('created_at')),
+    })
+    return representation
+
+
+def available_keys_map(documents):
+    """Key inventory counters for product documents, in one $in query: ``{str(_id): available}``"""
+    from products.inventory import counter_id, load_counters
+
+    pairs = {
+        counter_id(document['_id'], document.get('region', 'Global')): (document['_id'], document.get('region', 'Global'))
+        for document in documents
+    }
+    if not pairs:
+        return {}
+    counters = load_counters(pairs)
+    return {str(product_id): counters.get(key, 0) for key, (product_id, _) in pairs.items()}
+
+
+def _parse_bool(value):
+    value = str(value).strip().lower()
+    if value in ('true', '1', 'yes'):
+        return True
+    if value in ('false', '0', 'no'):
+        return False
+    return None
+
+
+def catalog_query(params, text=False):
+    """
+    MongoDB filter for the public catalog parameters (active, unarchived
+    products only). With ``text``, search terms use the products text index
+    (whole words) instead of substring matching.
+    """
+    query = {'is_active': {'$ne': False}, 'archived_at': None}
+    for param, column in FILTER_FIELDS.items():
+        value = params.get(param)
+        if value:
+            query[column] = value
+
+    featured = _parse_bool(params.get('featured', ''))
+    if featured is not None:
+        query['featured'] = featured
+
+    # Displayed prices are stored prices x3.2
+    price = {}
+    for param, operator in (('minPrice', '$gte'), ('maxPrice', '$lte')):
+        try:
+            value = float(str(params.get(param, '')).strip())
+        except ValueError:
+            continue
+        if value >= 0 and (operator == '$gte' or value > 0):
+            price[operator] = value / DISPLAY_PRICE_FACTOR
+    if price:
+        query['price'] = price
+
+    # Like DRF's SearchFilter: every term must match the title or description
+    terms = str(params.get('search', '')).replace('"', ' ').split()
+    if terms and text:
+        # Quoted, so every term is required
+        query['$text'] = {'$search': ' '.join(f'"{term}"' for term in terms)}
+    elif terms:
+        query['$and'] = [
+            {'$or': [
+                {'title': {'$regex': re.escape(term), '$options': 'i'}},
+                {'description': {'$regex': re.escape(term), '$options': 'i'}},
+            ]}
+            for term in terms
+        ]
+    return query
+
+
+def catalog_sort(ordering):
+    """Sort spec for DRF-style ``ordering`` (``-created_at,price``); ``_id`` breaks ties"""
+    sort = []
+    for part in (ordering or DEFAULT_ORDERING).split(','):
+        part = part.strip()
+        if part.lstrip('-') in ORDERING_FIELDS:
+            sort.append((part.lstrip('-'), -1 if part.startswith('-') else 1))
+    if not sort:
+        sort = [('created_at', -1)]
+    sort.append(('_id', sort[0][1]))
+    return sort
+
+
+def list_products(params, default_limit=12):
+    """
+    One page of the public catalog for request ``params``. Returns
+    ``(products, pagination)`` with products as API dicts.
+    """
+    try:
+        page = max(1, int(params.get('page', '1')))
+        limit = max(1, min(100, int(params.get('limit', str(default_limit)))))
+    except (ValueError, TypeError):
+        page, limit = 1, default_limit
+
+    collection = get_db()[PRODUCTS]
+    query = catalog_query(params, text=True)
+    try:
+        total = collection.count_documents(query)
+    except OperationFailure:
+        # Text index not built yet
+        total = 0
+    if not total and '$text' in query:
+        # No whole-word match (e.g. a partial word while typing): substring search
+        query = catalog_query(params)
+        total = collection.count_documents(query)
+    pages = (total + limit - 1) // limit
+    page = min(page, pages) if pages > 0 else 1
+
+    documents = list(
+        collection.find(query, PRODUCT_PROJECTION)
+        .sort(catalog_sort(params.get('ordering')))
+        .skip((page - 1) * limit)
+        .limit(limit)
+    )
+    available = available_keys_map(documents)
+    products = [product_dict(document, available.get(str(document['_id']))) for document in documents]
+    return products, {'page': page, 'limit': limit, 'total': total, 'pages': pages}
+
+
+def get_product(product_id):
+    """One product as a detail API dict (ProductSerializer shape, live stock), or None"""
+    if not ObjectId.is_valid(str(product_id)):
+        return None
+    document = get_db()[PRODUCTS].find_one({'_id': _object_id(product_id)}, PRODUCT_DETAIL_PROJECTION)
+    if document is None:
+        return None
+    return product_dict(document, available_keys_map([document]).get(str(document['_id'])), detail=True)
+
+
+def sample_products(size=10):
+    """``size`` random active products (server-side $sample) as API dicts"""
+    documents = list(get_db()[PRODUCTS].aggregate([
+        {'$match': catalog_query({})},
+        {'$sample': {'size': size}},
+        {'$project': PRODUCT_PROJECTION},
+    ]))
+    available = available_keys_map(documents)
+    return [product_dict(document, available.get(str(document['_id']))) for document in documents]
+
+
+def review_stats(product_id):
+    """Average rating, review count and rating distribution for a product, in one aggregation"""
+    stats = {'average_rating': 0, 'total_reviews': 0, 'rating_distribution': {}}
+    if not ObjectId.is_valid(str(product_id)):
+        return stats
+
+    total = 0
+    rating_sum = 0
+    for bucket in get_db()[REVIEWS].aggregate([
+        {'$match': {'product_id': _object_id(product_id)}},
+        {'$group': {'_id': '$rating', 'count': {'$sum': 1}}},
+    ]):
+        stats['rating_distribution'][bucket['_id']] = bucket['count']
+        total += bucket['count']
+        rating_sum += bucket['_id'] * bucket['count']
+
+    if total:
+        stats['average_rating'] = rating_sum / total
+        stats['total_reviews'] = total
+    return stats
+
+
+def claim_filter(product_id, region):
+    """Unused, unassigned keys of a product in a region (served by DigitalKey's ``unused_keys`` index)"""
+    return {'product_id': _object_id(product_id), 'region': region, 'is_used': False, 'order_id': None}
+
+
+def claim_keys(product_id, region, quantity, user_id=None):
+    """
+    Atomically claim up to ``quantity`` unused, unassigned keys. Each key is
+    taken with its own find_one_and_update, so concurrent fulfillments can
+    never hand out the same key. Returns ``[{'id': ..., 'encrypted_key': ...}]``.
+    """
+    collection = get_db()[DIGITAL_KEYS]
+    now = timezone.now()
+    claimed = []
+    for _ in range(quantity):
+        key = collection.find_one_and_update(
+            claim_filter(product_id, region),
+            {'$set': {'is_used': True, 'used_at': now, 'user_id': user_id}},
+            projection={'id': 1, 'encrypted_key': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if key is None:
+            break
+        claimed.append({'id': key['id'], 'encrypted_key': key['encrypted_key']})
+    return claimed
+
+
+def release_keys(key_ids):
+    """Put claimed keys back (e.g. when a line can't be fulfilled in full)"""
+    if key_ids:
+        get_db()[DIGITAL_KEYS].update_many(
+            {'id': {'$in': list(key_ids)}, 'order_id': None},
+            {'$set': {'is_used': False, 'used_at': None, 'user_id': None}}
+        )
+
+
+def assign_keys(key_ids, order_id):
+    """Attach claimed keys to their order with one update"""
+    if key_ids:
+        get_db()[DIGITAL_KEYS].update_many({'id': {'$in': list(key_ids)}}, {'$set': {'order_id': order_id}})
@@ -0,0 +1,79 @@
+from unittest import mock
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db import connections
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from djongo.base import DatabaseWrapper
+from djongo.sql2mongo.query import Query
+from orders.models import DigitalKey, Order
+from products.models import Product, Review
+from .admin import LargeCollectionAdmin
+from .prometheus import InventoryCollector
+
+
+class LargeCollectionAdminTests(SimpleTestCase):
+    def changelist_queryset(self, model):
+        model_admin = admin.site._registry[model]
+        self.assertIsInstance(model_admin, LargeCollectionAdmin)
+        # Only the queryset step of ChangeList, which needs no database
+        changelist = ChangeList.__new__(ChangeList)
+        changelist.list_select_related = model_admin.list_select_related
+        changelist.list_display = model_admin.list_display
+        changelist.lookup_opts = model._meta
+        return model_admin, changelist.apply_select_related(model_admin.get_queryset(RequestFactory().get('/')))
+
+    def test_foreign_keys_are_prefetched_not_joined(self):
+        for model in (Order, DigitalKey, Review):
+            with self.subTest(model=model.__name__):
+                model_admin, queryset = self.changelist_queryset(model)
+                self.assertIs(queryset.query.select_related, False)
+                self.assertEqual(queryset._prefetch_related_lookups, tuple(model_admin.list_prefetch_related))
+
+
+class DjongoSortedQueryTests(SimpleTestCase):
+    """Queries as djongo (with imset_ecommerce.djongo_patch) translates them; no server needed"""
+
+    def translate(self, queryset):
+        settings_dict = dict(connections['default'].settings_dict, ENGINE='djongo', NAME='test', CLIENT={})
+        sql, params = queryset.query.get_compiler(connection=DatabaseWrapper(settings_dict, alias='djongo')).as_sql()
+        query = Query(mock.MagicMock(), mock.MagicMock(), mock.MagicMock(), sql, params)._query
+        return query.where.to_mongo()['filter'], query.order.to_mongo()['sort']
+
+    def test_active_catalog_sorted_by_newest(self):
+        self.assertEqual(
+            self.translate(Product.objects.filter(is_active=True).order_by('-created_at')),
+            ({'is_active': {'$eq': True}}, [('created_at', -1)]),
+        )
+
+    def test_inactive_products_sorted_by_price(self):
+        self.assertEqual(
+            self.translate(Product.objects.filter(is_active=False).order_by('price')),
+            ({'is_active': {'$eq': False}}, [('price', 1)]),
+        )
+
+    def test_product_reviews_sorted_by_newest(self):
+        self.assertEqual(
+            self.translate(Review.objects.filter(product_id=1).order_by('-created_at')),
+            ({'product_id': {'$eq': 1}}, [('created_at', -1)]),
+        )
+
+
+class InventoryCollectorTests(SimpleTestCase):
+    """Scrapes export per-region totals and a capped number of product series"""
+
+    @override_settings(METRICS_LOW_STOCK_SERIES=2)
+    def test_series_do_not_grow_with_the_catalog(self):
+        counters = mock.MagicMock()
+        counters.aggregate.return_value = [{'_id': 'EU', 'available': 12, 'empty': 1}]
+        counters.find.return_value.sort.return_value.limit.return_value = [
+            {'product_id': 'p1', 'region': 'EU', 'available': 0},
+            {'product_id': 'p2', 'region': 'EU', 'available': 1},
+        ]
+        databases = {'default': dict(connections['default'].settings_dict, ENGINE='djongo')}
+        with override_settings(DATABASES=databases), \
+                mock.patch('products.inventory.get_collection', return_value=counters), \
+                mock.patch('orders.reservations.get_collection'):
+            families = {family.name: family.samples for family in InventoryCollector().collect()}
+        self.assertEqual([sample.labels for sample in families['key_pool_available']], [{'region': 'EU'}])
+        self.assertEqual(len(families['key_pool_lowest_available']), 2)
+        counters.find.return_value.sort.return_value.limit.assert_called_once_with(2)
@@ -0,0 +1,235 @@
+"""
+Request tracing (``TRACING_ENABLED``) exported to a JSONL file.
+
+``TracingMiddleware`` starts a trace for a sample of requests
+(``TRACE_SAMPLE_RATE``) and opens a span around the view. A sampled W3C
+``traceparent`` header is only followed from ``TRUSTED_PROXIES``; anyone
+else could use it to trace every request. Inside a trace, ``span()`` and
+``traced()`` time Stripe calls, outgoing mail and key encryption, and a
+pymongo listener adds one span per Mongo command (djongo and native).
+Checkout stores the trace ID in the PaymentIntent metadata, so the webhook
+that fulfills the order records its spans in the checkout's trace.
+
+Spans are buffered per trace and appended to ``TRACE_FILE`` (one JSON object
+per span) in a single write when the trace ends. Once the file reaches
+``TRACE_FILE_MAX_MB`` it is moved to ``TRACE_FILE.1`` (replacing the previous
+one), so traces take at most twice that on disk. Sampled responses carry an
+``X-Trace-Id`` header. When tracing is off the middleware removes itself at
+startup, ``traced()`` returns the function unchanged and ``span()`` and
+``trace()`` return immediately.
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from pymongo import monitoring
+from utils.network import from_trusted_proxy
+
+ENABLED = settings.TRACING_ENABLED
+
+_current = contextvars.ContextVar('trace_span', default=None)
+_export_lock = threading.Lock()
+
+
+def new_id(bytes_count):
+    return os.urandom(bytes_count).hex()
+
+
+class Trace:
+    """Finished spans of one trace, written out when its root span ends"""
+    __slots__ = ('trace_id', 'spans')
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'start', 'attributes')
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.span_id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.attributes = attributes or {}
+
+    def finish(self, duration_ms=None, error=None):
+        if duration_ms is None:
+            duration_ms = (time.time() - self.start) * 1000
+        record = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentId': self.parent_id,
+            'name': self.name,
+            'start': self.start,
+            'durationMs': round(duration_ms, 3),
+            'attributes': self.attributes,
+        }
+        if error is not None:
+            record['error'] = f'{type(error).__name__}: {error}'
+        self.trace.spans.append(record)
+
+
+def export(spans):
+    """Append the spans of a finished trace to TRACE_FILE, rotating it when full"""
+    if not spans:
+        return
+    lines = ''.join(json.dumps(span, default=str) + '\n' for span in spans)
+    with _export_lock:
+        with open(settings.TRACE_FILE, 'a') as f:
+            f.write(lines)
+            full = f.tell() >= settings.TRACE_FILE_MAX_MB * 1024 * 1024
+        if full:
+            os.replace(settings.TRACE_FILE, f'{settings.TRACE_FILE}.1')
+
+
+def current_trace_id():
+    """ID of the trace being recorded, or None outside a sampled trace"""
+    span = _current.get()
+    return span.trace.trace_id if span is not None else None
+
+
+@contextmanager
+def trace(name, trace_id=None, parent_id=None, **attributes):
+    """
+    Start a new trace (or continue ``trace_id`` from another request) with a
+    root span. A new trace is only recorded for a ``TRACE_SAMPLE_RATE`` sample;
+    a continued one always is. Yields the root span, or None if not sampled.
+    """
+    if not ENABLED or (trace_id is None and random.random() >= settings.TRACE_SAMPLE_RATE):
+        token = _current.set(None)
+        try:
+            yield None
+        finally:
+            _current.reset(token)
+        return
+
+    root = Span(Trace(trace_id or new_id(16)), name, parent_id, attributes)
+    token = _current.set(root)
+    error = None
+    try:
+        yield root
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        root.finish(error=error)
+        try:
+            export(root.trace.spans)
+        except OSError as e:
+            print(f'Error exporting trace {root.trace.trace_id}: {e}')
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a block as a child of the current span (no-op outside a sampled trace)"""
+    parent = _current.get() if ENABLED else None
+    if parent is None:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current.set(child)
+    error = None
+    try:
+        yield child
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        child.finish(error=error)
+
+
+def traced(name):
+    """Decorator form of ``span()``; returns the function unchanged when tracing is off"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class MongoSpanListener(monitoring.CommandListener):
+    """One span per Mongo command sent inside a sampled trace"""
+
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        parent = _current.get()
+        if parent is not None:
+            collection = event.command.get(event.command_name)
+            attributes = {'db.name': event.database_name}
+            if isinstance(collection, str):
+                attributes['db.collection'] = collection
+            self._pending[event.request_id] = Span(
+                parent.trace, f'mongo {event.command_name}', parent.span_id, attributes
+            )
+
+    def succeeded(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        if pending is not None:
+            pending.finish(event.duration_micros / 1000)
+
+    def failed(self, event):
+        pending = self._pending.pop(event.request_id, None)
+        if pending is not None:
+            pending.attributes['error'] = str(event.failure.get('errmsg', event.failure))
+            pending.finish(event.duration_micros / 1000)
+
+
+def parse_traceparent(header):
+    """``(trace_id, parent_id)`` from a sampled W3C traceparent header, else None"""
+    parts = (header or '').split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return (parts[1], parts[2]) if flags & 1 else None
+
+
+class TracingMiddleware:
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        from utils import mongo_monitoring
+
+        self.get_response = get_response
+        mongo_monitoring.subscribe(MongoSpanListener())
+        # Clients opened before this (e.g. by startup checks) aren't monitored
+        mongo_monitoring.reconnect()
+
+    def __call__(self, request):
+        trace_id = parent_id = None
+        if from_trusted_proxy(request):
+            trace_id, parent_id = parse_traceparent(request.headers.get('traceparent')) or (None, None)
+        with trace(f'{request.method} {request.path}', trace_id, parent_id) as root:
+            response = self.get_response(request)
+            if root is not None:
+                match = getattr(request, 'resolver_match', None)
+                if match is not None:
+                    root.name = f'{request.method} {match.view_name or match.route}'
+                root.attributes.update({
+                    'http.method': request.method,
+                    'http.path': request.path,
+                    'http.status': response.status_code,
+                })
+                response['X-Trace-Id'] = root.trace.trace_id
+        return response